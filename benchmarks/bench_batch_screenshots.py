@@ -0,0 +1,98 @@
+"""批量截图性能对比 - 逐张进程 vs 单次解码"""
+import sys
+from pathlib import Path
+import argparse
+import shutil
+import subprocess
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+
+# 配置日志（只显示汇总结果）
+logger.remove()
+logger.add(
+    sink=lambda msg: print(msg, end=""),
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+    level="WARNING",
+    colorize=False
+)
+
+# 对比渲染本身，不使用产物缓存
+settings.media_cache_enabled = False
+
+
+def make_synthetic_video(output_path: Path, duration: int, size: str = "1920x1080") -> None:
+    """使用lavfi testsrc2生成合成测试视频（稀疏关键帧，模拟YouTube下载）"""
+    if output_path.exists():
+        return
+
+    print(f"生成合成视频: {duration}秒 {size} -> {output_path}")
+    cmd = [
+        "ffmpeg",
+        "-f", "lavfi",
+        "-i", f"testsrc2=size={size}:rate=30",
+        "-t", str(duration),
+        "-c:v", "libx264",
+        "-preset", "ultrafast",
+        "-g", "300",
+        "-pix_fmt", "yuv420p",
+        "-y",
+        str(output_path)
+    ]
+    subprocess.run(cmd, capture_output=True, check=True)
+
+
+def run_once(video_path: str, timestamps: list, output_dir: Path, single_pass: bool) -> float:
+    """运行一次批量截图，返回耗时（秒）"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    processor = MediaProcessor()
+    start = time.perf_counter()
+    paths = processor.batch_process_screenshots(
+        video_path=video_path,
+        timestamps=timestamps,
+        output_dir=str(output_dir),
+        single_pass=single_pass
+    )
+    elapsed = time.perf_counter() - start
+
+    assert len(paths) == len(timestamps), f"截图数量不符: {len(paths)}/{len(timestamps)}"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量截图性能对比")
+    parser.add_argument("--duration", type=int, default=1800, help="合成视频时长（秒）")
+    parser.add_argument("--count", type=int, default=40, help="截图数量")
+    parser.add_argument("--spacing", type=float, default=8.0, help="相邻截图间隔（秒）")
+    parser.add_argument("--workdir", default="./output/bench", help="工作目录")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    video_path = workdir / f"synthetic_{args.duration}s.mp4"
+    make_synthetic_video(video_path, args.duration)
+
+    # 关键时刻按固定间隔分布（间隔超过分组阈值时单次解码会退化为逐组seek）
+    first = min(60.0, args.duration / 10)
+    timestamps = [round(first + args.spacing * i, 3) for i in range(args.count)]
+    assert timestamps[-1] < args.duration, "时间戳超出视频时长"
+
+    per_process = run_once(str(video_path), timestamps, workdir / "per_process", single_pass=False)
+    single_pass = run_once(str(video_path), timestamps, workdir / "single_pass", single_pass=True)
+
+    print(f"\n视频时长: {args.duration}秒, 截图数量: {args.count}, 间隔: {args.spacing}秒")
+    print(f"  逐张进程: {per_process:.2f}秒 ({per_process / args.count * 1000:.0f} ms/张)")
+    print(f"  单次解码: {single_pass:.2f}秒 ({single_pass / args.count * 1000:.0f} ms/张)")
+    print(f"  加速比:   {per_process / single_pass:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""MP4片段提取性能对比 - 输出端seek重新编码 / 输入端seek重新编码 / 流复制 / 智能剪辑"""
+import sys
+from pathlib import Path
+import argparse
+import shutil
+import subprocess
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+from benchmarks.bench_batch_screenshots import make_synthetic_video
+
+# 配置日志（只显示汇总结果）
+logger.remove()
+logger.add(
+    sink=lambda msg: print(msg, end=""),
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+    level="WARNING",
+    colorize=False
+)
+
+# 对比剪辑本身，不使用产物缓存
+settings.media_cache_enabled = False
+
+
+def reencode_clip(video_path: str, start_time: float, duration: float, output_path: str, input_seek: bool) -> None:
+    """convert_for_wechat 原来的重新编码参数（input_seek=False 即 -ss 位于 -i 之后）"""
+    seek = ["-ss", str(start_time)]
+    cmd = [
+        "ffmpeg",
+        *(seek if input_seek else []),
+        "-i", video_path,
+        *([] if input_seek else seek),
+        "-t", str(duration),
+        "-vf", "scale=480:-1",
+        "-c:v", "libx264",
+        "-preset", "medium",
+        "-crf", "28",
+        "-pix_fmt", "yuv420p",
+        "-an",
+        "-y",
+        output_path
+    ]
+    subprocess.run(cmd, capture_output=True, check=True)
+
+
+def timed(func, *args, **kwargs) -> float:
+    """执行并返回耗时（秒）"""
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MP4片段提取性能对比")
+    parser.add_argument("--duration", type=int, default=1200, help="合成视频时长（秒）")
+    parser.add_argument("--positions", default="63.4,603.4,1103.4", help="片段起点（秒，逗号分隔）")
+    parser.add_argument("--clip", type=float, default=10.0, help="片段时长（秒）")
+    parser.add_argument("--workdir", default="./output/bench", help="工作目录")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    video_path = workdir / f"synthetic_{args.duration}s.mp4"
+    make_synthetic_video(video_path, args.duration)
+
+    output_dir = workdir / "clips"
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    processor = MediaProcessor()
+    # 关键帧索引只构建一次，不计入单个片段耗时
+    processor.wrapper.keyframe_index(str(video_path))
+
+    print(f"\n视频时长: {args.duration}秒, 片段时长: {args.clip}秒")
+    print(f"{'起点(s)':>8} {'输出端seek':>12} {'输入端seek':>12} {'流复制':>10} {'智能剪辑':>10}")
+
+    for start_time in [float(value) for value in args.positions.split(",")]:
+        name = f"{start_time:.0f}"
+        output_seek = timed(
+            reencode_clip, str(video_path), start_time, args.clip,
+            str(output_dir / f"{name}_output_seek.mp4"), input_seek=False
+        )
+        input_seek = timed(
+            reencode_clip, str(video_path), start_time, args.clip,
+            str(output_dir / f"{name}_input_seek.mp4"), input_seek=True
+        )
+        copy = timed(
+            processor.extract_clip, str(video_path), start_time, args.clip,
+            output_path=str(output_dir / f"{name}_copy.mp4")
+        )
+        exact = timed(
+            processor.extract_clip, str(video_path), start_time, args.clip,
+            output_path=str(output_dir / f"{name}_exact.mp4"), exact=True
+        )
+        print(f"{start_time:>8.1f} {output_seek:>11.2f}s {input_seek:>11.2f}s {copy:>9.2f}s {exact:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""解码后端性能对比 - FFmpeg子进程 vs PyAV进程内解码（50个时间戳）"""
+import sys
+from pathlib import Path
+import argparse
+import shutil
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+from benchmarks.bench_batch_screenshots import make_synthetic_video
+
+# 配置日志（只显示汇总结果）
+logger.remove()
+logger.add(
+    sink=lambda msg: print(msg, end=""),
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+    level="WARNING",
+    colorize=False
+)
+
+# 对比解码本身，不使用产物缓存
+settings.media_cache_enabled = False
+
+
+def run_once(video_path: str, timestamps: list, output_dir: Path, backend: str, single_pass: bool) -> float:
+    """运行一次批量截图，返回耗时（秒）"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    processor = MediaProcessor(backend=backend)
+    start = time.perf_counter()
+    paths = processor.batch_process_screenshots(
+        video_path=video_path,
+        timestamps=timestamps,
+        output_dir=str(output_dir),
+        single_pass=single_pass
+    )
+    elapsed = time.perf_counter() - start
+
+    assert len(paths) == len(timestamps), f"截图数量不符: {len(paths)}/{len(timestamps)}"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解码后端性能对比")
+    parser.add_argument("--duration", type=int, default=1200, help="合成视频时长（秒）")
+    parser.add_argument("--count", type=int, default=50, help="时间戳数量")
+    parser.add_argument("--spacings", default="2,20", help="相邻时间戳间隔（秒，逗号分隔，每个间隔一组工作负载）")
+    parser.add_argument("--workdir", default="./output/bench", help="工作目录")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    video_path = workdir / f"synthetic_{args.duration}s.mp4"
+    make_synthetic_video(video_path, args.duration)
+
+    modes = [
+        ("FFmpeg逐张进程", "ffmpeg", False),
+        ("FFmpeg单次解码", "ffmpeg", True),
+        ("PyAV进程内", "pyav", True),
+    ]
+
+    print(f"\n视频时长: {args.duration}秒, 时间戳数量: {args.count}")
+    print(f"{'间隔(s)':>8} " + " ".join(f"{name:>14}" for name, _, _ in modes))
+
+    for spacing in [float(value) for value in args.spacings.split(",")]:
+        first = min(30.0, args.duration / 10)
+        timestamps = [round(first + spacing * i + 0.37, 3) for i in range(args.count)]
+        assert timestamps[-1] < args.duration, "时间戳超出视频时长"
+
+        timings = [
+            run_once(str(video_path), timestamps, workdir / f"backend_{backend}_{single_pass}", backend, single_pass)
+            for _, backend, single_pass in modes
+        ]
+        print(
+            f"{spacing:>8.1f} "
+            + " ".join(f"{elapsed:>12.2f}秒" for elapsed in timings)
+        )
+        print(
+            f"{'ms/张':>8} "
+            + " ".join(f"{elapsed / args.count * 1000:>12.0f}ms" for elapsed in timings)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""GIF调色板性能对比 - 两步法（调色板PNG） vs 单滤镜图合并调色板"""
+import sys
+from pathlib import Path
+import argparse
+import hashlib
+import shutil
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+from benchmarks.bench_batch_screenshots import make_synthetic_video
+
+# 配置日志（只显示汇总结果）
+logger.remove()
+logger.add(
+    sink=lambda msg: print(msg, end=""),
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+    level="WARNING",
+    colorize=False
+)
+
+# 对比渲染本身，不使用产物缓存
+settings.media_cache_enabled = False
+
+
+def file_digest(path: str) -> str:
+    """计算文件SHA1"""
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def run_once(video_path: str, clips: list, output_dir: Path, fused: bool) -> tuple:
+    """生成一组GIF，返回 (耗时列表, 输出路径列表)"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    processor = MediaProcessor()
+    timings = []
+    paths = []
+
+    for i, (start_time, duration) in enumerate(clips, 1):
+        start = time.perf_counter()
+        path = processor.generate_gif(
+            video_path=video_path,
+            start_time=start_time,
+            duration=duration,
+            output_path=str(output_dir / f"gif_{i:02d}.gif"),
+            fused_palette=fused
+        )
+        timings.append(time.perf_counter() - start)
+        paths.append(path)
+
+    # 两步法不应残留调色板文件，合并法不应产生
+    assert not list(output_dir.glob("*_palette.png")), "残留调色板临时文件"
+    return timings, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIF调色板性能对比")
+    parser.add_argument("--duration", type=int, default=600, help="合成视频时长（秒）")
+    parser.add_argument("--count", type=int, default=5, help="GIF数量")
+    parser.add_argument("--clip", type=float, default=10.0, help="每个GIF时长（秒）")
+    parser.add_argument("--workdir", default="./output/bench", help="工作目录")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    video_path = workdir / f"synthetic_{args.duration}s.mp4"
+    make_synthetic_video(video_path, args.duration)
+
+    step = (args.duration - args.clip) / (args.count + 1)
+    clips = [(round(step * (i + 1), 3), args.clip) for i in range(args.count)]
+
+    two_step, two_step_paths = run_once(str(video_path), clips, workdir / "gif_two_step", fused=False)
+    fused, fused_paths = run_once(str(video_path), clips, workdir / "gif_fused", fused=True)
+
+    identical = sum(
+        1 for a, b in zip(two_step_paths, fused_paths) if file_digest(a) == file_digest(b)
+    )
+
+    print(f"\nGIF数量: {args.count}, 每个时长: {args.clip}秒")
+    print(f"{'#':>3} {'两步法(s)':>10} {'合并(s)':>10} {'节省(s)':>10} {'两步法KB':>10} {'合并KB':>10}")
+    for i, (a, b) in enumerate(zip(two_step, fused)):
+        size_a = Path(two_step_paths[i]).stat().st_size / 1024
+        size_b = Path(fused_paths[i]).stat().st_size / 1024
+        print(f"{i + 1:>3} {a:>10.2f} {b:>10.2f} {a - b:>10.2f} {size_a:>10.0f} {size_b:>10.0f}")
+
+    saved = (sum(two_step) - sum(fused)) / args.count
+    print(f"\n平均每个GIF节省: {saved:.2f}秒 ({saved / (sum(two_step) / args.count) * 100:.0f}%)")
+    print(f"字节完全一致: {identical}/{args.count}")
+
+
+if __name__ == "__main__":
+    main()
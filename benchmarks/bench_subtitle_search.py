@@ -0,0 +1,214 @@
+"""字幕搜索性能对比 - 逐关键词grep vs 字幕索引，逐关键词扫描 vs Aho-Corasick，逐个min vs 向量化最近时间查询"""
+import sys
+from pathlib import Path
+import argparse
+import itertools
+import random
+import re
+import subprocess
+import time
+import tracemalloc
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from src.content_analyzer import SubtitleIndex, TimestampExtractor
+from src.content_analyzer.keyword_matcher import KeywordMatcher
+from src.content_analyzer.rolling_captions import compact_subtitle, compacted_path
+from src.content_analyzer.subtitle_index import seconds_to_vtt_time
+
+# 配置日志（只显示汇总结果）
+logger.remove()
+logger.add(
+    sink=lambda msg: print(msg, end=""),
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+    level="WARNING",
+    colorize=False
+)
+
+FILLER = (
+    "so now we are going to look at the track and the way you ride it you want to keep "
+    "your speed up through the section and stay loose on the bike all the time"
+).split()
+
+# 每个技术的关键词（与NotebookLMHelper提取的关键词规模相当）
+TECHNIQUES = [
+    {"name": "Front Brake", "keywords": ["front brake", "braking", "stopping power", "lever", "two fingers", "lock"]},
+    {"name": "Body Position", "keywords": ["body position", "weight back", "elbows up", "head up", "grip", "knees"]},
+    {"name": "Rear Brake", "keywords": ["rear brake", "slide", "traction", "back wheel", "foot", "drag"]},
+    {"name": "Cornering", "keywords": ["corner", "rut", "berm", "lean", "inside line", "exit"]},
+    {"name": "Jumping", "keywords": ["jump", "take off", "landing", "lip", "throttle", "absorb"]},
+    {"name": "Whoops", "keywords": ["whoops", "skim", "momentum", "rhythm", "stand up", "suspension"]},
+    {"name": "Starts", "keywords": ["start", "gate", "clutch", "holeshot", "launch", "second gear"]},
+    {"name": "Sand", "keywords": ["sand", "float", "roost", "steering", "arm pump", "commit"]},
+]
+
+
+def make_auto_subtitle(output_path: Path, hours: float, seed: int = 0) -> None:
+    """
+    生成YouTube自动字幕风格的VTT（滚动字幕：每行在2-3个重叠cue中重复出现，带逐词<c>时间标签）
+    """
+    if output_path.exists():
+        return
+
+    print(f"生成自动字幕: {hours}小时 -> {output_path}")
+    rng = random.Random(seed)
+    phrases = [keyword for technique in TECHNIQUES for keyword in technique["keywords"]]
+    lines = ["WEBVTT", "Kind: captions", "Language: en", ""]
+
+    t = 0.0
+    previous = ""
+    end_time = hours * 3600
+    while t < end_time:
+        words = rng.sample(FILLER, 6)
+        if rng.random() < 0.15:
+            words.insert(rng.randrange(len(words)), rng.choice(phrases))
+        duration = rng.uniform(2.0, 3.5)
+        step = duration / len(words)
+
+        tagged = words[0] + "".join(
+            f"<{seconds_to_vtt_time(t + step * k)}><c> {word}</c>" for k, word in enumerate(words[1:], 1)
+        )
+        plain = " ".join(words)
+
+        # 带时间标签的cue（上一行 + 正在出现的新行）
+        lines.append(f"{seconds_to_vtt_time(t)} --> {seconds_to_vtt_time(t + duration)} align:start position:0%")
+        lines.extend([previous or " ", tagged, ""])
+        # 10毫秒的过渡cue（新行完整出现）
+        lines.append(f"{seconds_to_vtt_time(t + duration)} --> {seconds_to_vtt_time(t + duration + 0.01)} align:start position:0%")
+        lines.extend([plain, " ", ""])
+
+        previous = plain
+        t += duration + 0.01
+
+    output_path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def legacy_search_keywords(subtitle_path: str, keywords: list) -> list:
+    """原来的 TimestampExtractor.search_keywords：每个关键词一次grep，再重读整个文件向上查找时间戳"""
+    pattern = r'(\d{2}:\d{2}:\d{2}\.\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2}\.\d{3})'
+    matches = []
+    for keyword in keywords:
+        result = subprocess.run(
+            ["grep", "-i", "-n", keyword, subtitle_path],
+            capture_output=True, text=True, check=False, encoding="utf-8", errors="ignore"
+        )
+        lines = Path(subtitle_path).read_text(encoding="utf-8").split("\n")
+        for line in result.stdout.split("\n"):
+            if not line.strip():
+                continue
+            line_num = int(line.split(":")[0])
+            for i in range(line_num - 1, max(0, line_num - 5), -1):
+                match = re.search(pattern, lines[i].strip())
+                if match:
+                    matches.append((keyword, match.group(1), match.group(2)))
+                    break
+    return matches
+
+
+def extra_keywords(count: int) -> list:
+    """生成count个不在字幕中的两词关键词（模拟更长的关键词表）"""
+    sides = ["left", "right", "rear", "front", "upper", "lower", "inner", "outer", "spare", "stock"]
+    parts = ["peg", "grip", "fork", "shock", "bar", "pad", "hub", "rim", "seat", "tank", "pipe", "chain",
+             "spoke", "lever", "clamp", "axle", "boot", "glove", "visor", "strap", "mount", "plate"]
+    return [f"{a} {b}s" for a, b in itertools.islice(itertools.product(sides, parts), count)]
+
+
+def peak_memory(func) -> tuple:
+    """执行func，返回 (结果, Python分配的峰值内存MB)"""
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕关键词搜索性能对比")
+    parser.add_argument("--hours", type=float, default=3.0, help="字幕时长（小时）")
+    parser.add_argument("--workdir", default="./output/bench", help="工作目录")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    subtitle_path = workdir / f"auto_subs_{args.hours:g}h.vtt"
+    make_auto_subtitle(subtitle_path, args.hours)
+
+    size_mb = subtitle_path.stat().st_size / 1024 / 1024
+    keyword_count = sum(len(technique["keywords"]) for technique in TECHNIQUES)
+    print(f"\n{subtitle_path.name}: {size_mb:.1f}MB, {len(TECHNIQUES)}个技术, {keyword_count}个关键词")
+    print(f"{'方式':<28}{'耗时(s)':>10}")
+
+    start = time.perf_counter()
+    for technique in TECHNIQUES:
+        legacy_search_keywords(str(subtitle_path), technique["keywords"])
+    print(f"{'逐关键词grep+重读文件':<28}{time.perf_counter() - start:>10.3f}")
+
+    start = time.perf_counter()
+    index = SubtitleIndex.from_file(str(subtitle_path))
+    print(f"{'解析索引（一次）':<28}{time.perf_counter() - start:>10.3f}   {len(index)}个cue")
+
+    # 整个文件读入再切分 vs 逐行流式解析：峰值内存
+    _, whole_peak = peak_memory(lambda: SubtitleIndex.parse(subtitle_path.read_text(encoding="utf-8")))
+    _, stream_peak = peak_memory(lambda: SubtitleIndex.from_file(str(subtitle_path)))
+    print(f"{'解析峰值内存(MB)':<28}{'整文件':>6} {whole_peak:.1f} / 流式 {stream_peak:.1f}")
+
+    compacted_path(str(subtitle_path)).unlink(missing_ok=True)
+    start = time.perf_counter()
+    compact_index = SubtitleIndex.from_file(compact_subtitle(str(subtitle_path)))
+    print(f"{'滚动字幕压缩+解析':<28}{time.perf_counter() - start:>10.3f}   {len(compact_index)}个cue")
+
+    compacted_path(str(subtitle_path)).unlink(missing_ok=True)
+    extractor = TimestampExtractor()
+    start = time.perf_counter()
+    results = extractor.extract_all_techniques(TECHNIQUES, str(subtitle_path))
+    print(f"{'extract_all_techniques(含压缩)':<28}{time.perf_counter() - start:>10.3f}")
+
+    start = time.perf_counter()
+    extractor.extract_all_techniques(TECHNIQUES, str(subtitle_path))
+    print(f"{'extract_all_techniques(已缓存)':<28}{time.perf_counter() - start:>10.3f}")
+    print(f"找到时间戳: {sum(1 for result in results if result['timestamp'])}/{len(results)}")
+
+    # 滚动字幕中每行重复出现，压缩后重复匹配消失
+    matcher = KeywordMatcher.for_techniques(TECHNIQUES)
+    print(f"去重前匹配数: 原字幕 {len(matcher.match_cues(index))}, 压缩后 {len(matcher.match_cues(compact_index))}")
+
+    # 关键词数量增加时：逐关键词扫描随关键词线性增长，自动机扫描只与文本长度有关
+    base = [keyword for technique in TECHNIQUES for keyword in technique["keywords"]]
+    print(f"\n{'关键词数':>8}{'逐关键词扫描(s)':>18}{'Aho-Corasick(s)':>18}")
+    for count in (len(base), 100, 200):
+        keywords = base + extra_keywords(count - len(base))
+
+        start = time.perf_counter()
+        for keyword in keywords:
+            index.search(keyword)
+        per_keyword = time.perf_counter() - start
+
+        start = time.perf_counter()
+        KeywordMatcher(keywords).match_cues(index)
+        automaton = time.perf_counter() - start
+        print(f"{count:>8}{per_keyword:>18.3f}{automaton:>18.3f}")
+
+    # 批量解析偏好时间：逐个 min(abs) 遍历所有cue vs 排序一次后 searchsorted
+    rng = random.Random(1)
+    cues = [index.cue(i) for i in range(len(index))]
+    print(f"\n{'时间点数':>8}{'逐个min(s)':>14}{'向量化(s)':>14}")
+    for count in (10, 100, 500):
+        times = [rng.uniform(0, args.hours * 3600) for _ in range(count)]
+
+        start = time.perf_counter()
+        expected = [min(range(len(cues)), key=lambda i: abs(cues[i]["mid_seconds"] - t)) for t in times]
+        per_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        nearest = index.nearest(times)
+        vectorized = time.perf_counter() - start
+
+        assert nearest.tolist() == expected
+        print(f"{count:>8}{per_time:>14.3f}{vectorized:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
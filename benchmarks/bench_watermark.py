@@ -0,0 +1,153 @@
+"""水印性能对比 - 逐帧drawtext/逐帧栅格化 vs 预渲染叠加层（单文件/批量/进程内混合）"""
+import sys
+from pathlib import Path
+import argparse
+import shutil
+import subprocess
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+from src.media_processor.watermark_overlay import WatermarkOverlayCache
+from src.models.video import WatermarkSpec
+from benchmarks.bench_batch_screenshots import make_synthetic_video
+
+# 配置日志（只显示汇总结果）
+logger.remove()
+logger.add(
+    sink=lambda msg: print(msg, end=""),
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+    level="WARNING",
+    colorize=False
+)
+
+# 对比水印本身，不使用产物缓存
+settings.media_cache_enabled = False
+
+
+def has_drawtext() -> bool:
+    """FFmpeg是否编译了drawtext滤镜（需要libfreetype）"""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True)
+    return " drawtext " in result.stdout
+
+
+def rasterize_each_frame(image, watermark: WatermarkSpec):
+    """原来的 pyav_backend.draw_watermark：每帧加载字体、整帧RGBA图层上绘制文字后合成"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = ImageFont.load_default(size=watermark.font_size)
+    overlay = Image.new("RGBA", image.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+    left, top, right, bottom = draw.textbbox((0, 0), watermark.text, font=font)
+    x, y = 10, image.height - (bottom - top) - 10
+    draw.text((x - left, y - top), watermark.text, font=font, fill=(255, 255, 255, int(255 * watermark.opacity)))
+    return Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+
+
+def load_frames(gif_paths: list) -> list:
+    """解码GIF的全部帧（RGB）"""
+    from PIL import Image, ImageSequence
+
+    frames = []
+    for gif_path in gif_paths:
+        with Image.open(gif_path) as gif:
+            frames.extend(frame.convert("RGB") for frame in ImageSequence.Iterator(gif))
+    return frames
+
+
+def run_each(processor: MediaProcessor, cmds: list, repeat: int) -> float:
+    """依次执行命令，重复repeat轮取最快一轮的耗时（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for cmd in cmds:
+            processor.wrapper.run_command(cmd)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="水印性能对比")
+    parser.add_argument("--count", type=int, default=6, help="GIF数量")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个GIF时长（秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="FFmpeg方式重复轮数（取最快）")
+    parser.add_argument("--workdir", default="./output/bench", help="工作目录")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    video_path = workdir / "synthetic_300s.mp4"
+    make_synthetic_video(video_path, 300)
+
+    gif_dir = workdir / "watermark"
+    shutil.rmtree(gif_dir, ignore_errors=True)
+    gif_dir.mkdir(parents=True)
+
+    processor = MediaProcessor(max_workers=1)
+    gif_paths = [
+        processor.generate_gif(
+            str(video_path), 20.0 + i * 40, args.duration,
+            output_path=str(gif_dir / f"clip_{i}.gif"), fast=True
+        )
+        for i in range(args.count)
+    ]
+    frames = load_frames(gif_paths)
+    frame_count = len(frames)
+    watermark = processor.default_watermark()
+    overlays = WatermarkOverlayCache(cache_dir=str(gif_dir / "overlays"))
+    overlay_path = overlays.path(watermark, frames[0].width)
+    wrapper = processor.wrapper
+
+    def outputs(tag: str) -> list:
+        return [str(gif_dir / f"clip_{i}_{tag}.gif") for i in range(args.count)]
+
+    print(f"\n{args.count}个{args.duration:.0f}秒GIF, 共{frame_count}帧, 宽度{frames[0].width}")
+    print(f"{'方式':<24}{'总耗时(s)':>10}{'每帧(ms)':>10}{'水印每帧(ms)':>14}")
+
+    # 不加水印的重新编码作为基线，水印每帧成本 = (总耗时 - 基线) / 帧数
+    baseline = run_each(processor, [
+        [wrapper.ffmpeg_path, "-i", src, "-y", dst] for src, dst in zip(gif_paths, outputs("copy"))
+    ], args.repeat)
+
+    def report(name: str, elapsed: float, base: float = baseline) -> None:
+        per_frame = elapsed / frame_count * 1000
+        watermark_cost = (elapsed - base) / frame_count * 1000
+        print(f"{name:<24}{elapsed:>10.2f}{per_frame:>10.3f}{watermark_cost:>14.3f}")
+
+    report("FFmpeg 重新编码(基线)", baseline)
+
+    if has_drawtext():
+        report("FFmpeg drawtext 逐文件", run_each(processor, [
+            wrapper.watermark_command(src, dst, watermark.text)
+            for src, dst in zip(gif_paths, outputs("drawtext"))
+        ], args.repeat))
+    else:
+        print(f"{'FFmpeg drawtext 逐文件':<24}{'跳过（FFmpeg未编译drawtext）':>34}")
+
+    report("FFmpeg overlay 逐文件", run_each(processor, [
+        wrapper.watermark_command(src, dst, watermark.text, overlay_path=overlay_path)
+        for src, dst in zip(gif_paths, outputs("overlay"))
+    ], args.repeat))
+    report("FFmpeg overlay 批量", run_each(processor, [
+        wrapper.batch_watermark_command(gif_paths, outputs("batch"), overlay_path)
+    ], args.repeat))
+
+    # 进程内：帧已解码，只计水印本身
+    start = time.perf_counter()
+    for frame in frames:
+        rasterize_each_frame(frame, watermark)
+    report("进程内 逐帧栅格化", time.perf_counter() - start, base=0.0)
+
+    start = time.perf_counter()
+    for frame in frames:
+        overlays.blend(frame, watermark)
+    report("进程内 预渲染混合", time.perf_counter() - start, base=0.0)
+    print(f"叠加层渲染次数: {overlays.renders}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,17 @@ class Settings(BaseSettings):
     gif_fps: int = Field(default=10, env="GIF_FPS")
     gif_use_palette: bool = Field(default=True, env="GIF_USE_PALETTE")
     watermark_text: str = Field(default="FreeSoloDirtbike", env="WATERMARK_TEXT")
+    watermark_font: str = Field(default="", env="WATERMARK_FONT")  # 水印字体文件（TTF/OTF），为空时使用fontconfig解析的默认字体（Sans）
+    media_workers: int = Field(default=0, env="MEDIA_WORKERS")  # 并发FFmpeg任务数，0为自动
+    media_cpu_budget: int = Field(default=0, env="MEDIA_CPU_BUDGET")  # 可用CPU核数，0为全部
+    media_cache_enabled: bool = Field(default=True, env="MEDIA_CACHE_ENABLED")
+    media_cache_dir: str = Field(default="", env="MEDIA_CACHE_DIR")  # 为空时使用 {temp_dir}/media_cache
+    media_cache_max_mb: int = Field(default=2048, env="MEDIA_CACHE_MAX_MB")
+    media_backend: str = Field(default="ffmpeg", env="MEDIA_BACKEND")  # ffmpeg 或 pyav（进程内解码）
+    media_timeout: int = Field(default=600, env="MEDIA_TIMEOUT")  # 单条FFmpeg命令时限（秒），0为不限制
+    media_job_timeout: int = Field(default=1800, env="MEDIA_JOB_TIMEOUT")  # 单个批量任务时限（秒），0为不限制
+    fetch_timeout: int = Field(default=1800, env="FETCH_TIMEOUT")  # yt-dlp子进程时限（秒），0为不限制
+    fetch_workers: int = Field(default=4, env="FETCH_WORKERS")  # 异步下载时同时运行的yt-dlp进程数
 
     # ===== 内容生成配置 =====
     article_min_length: int = Field(default=5000, env="ARTICLE_MIN_LENGTH")
@@ -12,6 +12,10 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+from src.media_processor.resource_usage import track_resources
+from src.media_processor.subprocess_runner import runner
 
 # 配置日志
 logger.remove()
@@ -40,49 +44,42 @@ def convert_gif_to_mp4(gif_path: str, output_path: str) -> bool:
     ]
 
     try:
-        result = subprocess.run(cmd, capture_output=True, check=True)
+        result = runner.run(cmd, timeout=settings.media_timeout or None, operation="convert")
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
         logger.error(f"转换失败: {e}")
         return False
 
 def compress_gif(gif_path: str, output_path: str, target_size_mb: float = 1.8) -> bool:
-    """压缩GIF文件到指定大小以下"""
+    """压缩GIF文件到指定大小以下（低分辨率试编码估算体积，只正式编码一次）"""
     logger.info(f"压缩: {Path(gif_path).name} -> {target_size_mb}MB以下")
 
-    # 使用ffmpeg压缩，降低帧率和尺寸
-    cmd = [
-        'ffmpeg',
-        '-i', gif_path,
-        '-vf', 'fps=5,scale=320:-1',
-        '-f', 'gif',
-        output_path,
-        '-y'
-    ]
-
     try:
-        result = subprocess.run(cmd, capture_output=True, check=True)
-
-        # 检查文件大小
-        output_size = Path(output_path).stat().st_size / (1024 * 1024)
-        if output_size <= target_size_mb:
-            logger.success(f"  ✓ 压缩成功: {output_size:.1f} MB")
-            return True
-        else:
-            logger.warning(f"  ⚠ 文件仍然过大: {output_size:.1f} MB")
-            return False
-    except subprocess.CalledProcessError as e:
+        MediaProcessor().fit_gif_to_budget(
+            gif_path, output_path, max_bytes=int(target_size_mb * 1024 * 1024)
+        )
+    except Exception as e:
         logger.error(f"压缩失败: {e}")
         return False
 
+    # 检查文件大小
+    output_size = Path(output_path).stat().st_size / (1024 * 1024)
+    if output_size <= target_size_mb:
+        logger.success(f"  ✓ 压缩成功: {output_size:.1f} MB")
+        return True
+    else:
+        logger.warning(f"  ⚠ 文件仍然过大: {output_size:.1f} MB")
+        return False
+
 def extract_static_image(video_path: str, timestamp: float, output_path: str) -> bool:
     """从视频中提取静态图片"""
     logger.info(f"提取截图: {timestamp}秒")
 
+    # -ss 放在 -i 之前：输入端seek，不从头解码
     cmd = [
         'ffmpeg',
-        '-i', video_path,
         '-ss', str(timestamp),
+        '-i', video_path,
         '-vframes', '1',
         '-vf', 'scale=600:-1',
         '-q:v', '2',
@@ -91,9 +88,9 @@ def extract_static_image(video_path: str, timestamp: float, output_path: str) ->
     ]
 
     try:
-        result = subprocess.run(cmd, capture_output=True, check=True)
+        result = runner.run(cmd, timeout=settings.media_timeout or None, operation="screenshot")
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
         logger.error(f"提取失败: {e}")
         return False
 
@@ -110,6 +107,8 @@ def main():
     logger.info("微信公众号格式转换工具")
     logger.info("=" * 70)
 
+    processor = MediaProcessor()
+
     # 读取报告获取时间戳
     import re
     report_path = r"C:\Users\dbaa\Desktop\MotoStep\report_source\Mikuni HSR 42 真的值那 300 美金吗.txt"
@@ -142,26 +141,11 @@ def main():
 
             output_mp4 = str(wechat_dir / f"{i:02d}_{timestamp}s.mp4")
 
-            # 从原始视频提取10秒片段
+            # 从原始视频提取10秒片段（480px H.264，源已满足规格时流复制）
             logger.info(f"\n[{i}/{len(matches)}] {start} - {end}")
 
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,
-                '-ss', str(timestamp),
-                '-t', '10',
-                '-vf', 'scale=480:-1',
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '28',
-                '-pix_fmt', 'yuv420p',
-                '-an',
-                output_mp4,
-                '-y'
-            ]
-
             try:
-                subprocess.run(cmd, capture_output=True, check=True)
+                processor.extract_wechat_clip(video_path, timestamp, 10, output_path=output_mp4)
                 file_size = Path(output_mp4).stat().st_size / 1024
                 logger.success(f"  ✓ {Path(output_mp4).name} ({file_size:.0f} KB)")
                 mp4_files.append(output_mp4)
@@ -239,25 +223,11 @@ def main():
 
             logger.info(f"\n[{i}/{len(matches)}] {start} - {end}")
 
-            # 提取MP4
+            # 提取MP4（480px H.264）
             output_mp4 = str(wechat_dir / f"{i:02d}_{timestamp}s.mp4")
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,
-                '-ss', str(timestamp),
-                '-t', '10',
-                '-vf', 'scale=480:-1',
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '28',
-                '-pix_fmt', 'yuv420p',
-                '-an',
-                output_mp4,
-                '-y'
-            ]
 
             try:
-                subprocess.run(cmd, capture_output=True, check=True)
+                processor.extract_wechat_clip(video_path, timestamp, 10, output_path=output_mp4)
                 file_size = Path(output_mp4).stat().st_size / 1024
                 logger.success(f"  ✓ MP4: {file_size:.0f} KB")
                 mp4_files.append(output_mp4)
@@ -277,4 +247,5 @@ def main():
         logger.info(f"\n文件保存位置: {wechat_dir}")
 
 if __name__ == "__main__":
-    main()
+    with track_resources("convert_for_wechat", settings.log_dir):
+        main()
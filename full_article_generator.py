@@ -13,7 +13,11 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 from loguru import logger
-from src.media_processor import MediaProcessor
+from config import settings
+from src.media_processor import MediaProcessor, MediaJob
+from src.media_processor.jpeg_budget import WECHAT_IMAGE_MAX_BYTES
+from src.media_processor.processor import ARTICLE_RENDITIONS
+from src.media_processor.resource_usage import track_resources
 from datetime import datetime
 
 # 配置日志
@@ -90,14 +94,18 @@ def parse_full_report(report_path: str) -> dict:
     }
 
 def generate_all_media(video_path: str, sections: list, output_dir: Path) -> list:
-    """为所有时间戳生成媒体文件"""
+    """为所有时间戳生成媒体文件（并行执行，结果按段落顺序汇总）"""
     logger.info("\n" + "=" * 70)
     logger.info("生成媒体文件")
     logger.info("=" * 70)
 
     processor = MediaProcessor()
+    watermark = processor.default_watermark()
     media_files = {}
 
+    jobs = []
+    job_info = []
+
     for i, section in enumerate(sections, 1):
         if not section['has_timestamp']:
             continue
@@ -105,70 +113,72 @@ def generate_all_media(video_path: str, sections: list, output_dir: Path) -> lis
         timestamp = section['seconds']
         time_range = section['time_range']
 
-        logger.info(f"\n[{i}] {time_range}")
+        logger.info(f"[{i}] {time_range}")
+
+        # 报告中的时间常落在转场中，起点吸附到附近的镜头切换（镜头切换索引每个视频只检测一次）。
+        # 文件名仍用报告时间：convert_for_wechat 与 create_wechat_version 按报告时间查找媒体文件
+        start_time = processor.snap_to_scene(video_path, timestamp)
 
         # 偶数生成 GIF，奇数生成截图
         if i % 2 == 0:
-            # 生成 GIF
+            # 一次解码同时生成报告GIF、微信GIF（2MB以内）和MP4片段
             filename = f"{i:02d}_{timestamp}s.gif"
             output_path = str(output_dir / filename)
-            try:
-                temp_file = processor.generate_gif(
-                    video_path=video_path,
-                    start_time=timestamp,
-                    duration=10,  # 10秒GIF
-                    output_path=str(output_dir / f"temp_{filename}")
-                )
-
-                # 添加水印
-                watermarked = processor.add_watermark(
-                    media_path=temp_file,
-                    output_path=output_path
-                )
-
-                # 删除临时文件
-                Path(temp_file).unlink(missing_ok=True)
-
-                media_files[i] = {
-                    'path': output_path,
-                    'type': 'gif',
-                    'filename': filename
+            jobs.append(MediaJob(
+                kind="gif",
+                func=processor.generate_renditions,
+                kwargs={
+                    'video_path': video_path,
+                    'start_time': start_time,
+                    'duration': 10,  # 10秒GIF
+                    'renditions': ARTICLE_RENDITIONS,
+                    'output_paths': {
+                        'report': output_path,
+                        'wechat': str(output_dir / f"{i:02d}_{timestamp}s_wechat.gif"),
+                        'clip': str(output_dir / f"{i:02d}_{timestamp}s.mp4")
+                    },
+                    'watermark': watermark
                 }
-                logger.success(f"  ✓ GIF: {filename}")
-
-            except Exception as e:
-                logger.error(f"  ✗ GIF 失败: {e}")
+            ))
+            job_info.append((i, {'path': output_path, 'type': 'gif', 'filename': filename}))
         else:
-            # 生成截图
+            # 生成截图（不超过微信图片上限）
             filename = f"{i:02d}_{timestamp}s.jpg"
             output_path = str(output_dir / filename)
-            try:
-                temp_file = processor.extract_screenshot(
-                    video_path=video_path,
-                    timestamp=timestamp,
-                    output_path=str(output_dir / f"temp_{filename}")
-                )
-
-                # 添加水印
-                watermarked = processor.add_watermark(
-                    media_path=temp_file,
-                    output_path=output_path
-                )
-
-                # 删除临时文件
-                Path(temp_file).unlink(missing_ok=True)
-
-                media_files[i] = {
-                    'path': output_path,
-                    'type': 'image',
-                    'filename': filename
+            jobs.append(MediaJob(
+                kind="screenshot",
+                func=processor.extract_screenshot,
+                kwargs={
+                    'video_path': video_path,
+                    'timestamp': start_time,
+                    'output_path': output_path,
+                    'watermark': watermark,
+                    'max_bytes': WECHAT_IMAGE_MAX_BYTES  # 微信图片上限2MB
                 }
-                logger.success(f"  ✓ 截图: {filename}")
-
-            except Exception as e:
-                logger.error(f"  ✗ 截图失败: {e}")
+            ))
+            job_info.append((i, {'path': output_path, 'type': 'image', 'filename': filename}))
+
+    for (i, media), result in zip(job_info, processor.run_jobs(jobs)):
+        label = "GIF" if media['type'] == 'gif' else "截图"
+        if result.ok:
+            media_files[i] = media
+            logger.success(f"  ✓ {label}: {media['filename']}")
+        else:
+            logger.error(f"  ✗ {label}失败 [{i}]: {result.error}")
 
     logger.success(f"\n✓ 媒体生成完成: {len(media_files)} 个文件")
+    if processor.cache is not None:
+        stats = processor.cache.stats()
+        logger.info(f"  缓存命中: {stats['hits']}, 未命中: {stats['misses']}, 淘汰: {stats['evictions']}")
+    if processor.seek_plans:
+        decode_ahead = sum(plan["decode_ahead"] for plan in processor.seek_plans)
+        logger.info(f"  seek预解码: {len(processor.seek_plans)} 次, 共 {decode_ahead:.1f} 秒")
+    if processor.last_progress and processor.last_progress["jobs"]:
+        progress = processor.last_progress
+        logger.info(
+            f"  FFmpeg吞吐: {progress['jobs']} 个进程, {progress['frames']} 帧, "
+            f"平均 {progress['avg_fps']:.0f} fps / {progress['avg_speed']:.1f}x, 耗时 {progress['elapsed']:.1f} 秒"
+        )
     return media_files
 
 def generate_html_article(report_data: dict, media_files: dict, output_path: str):
@@ -619,4 +629,6 @@ def main():
         logger.info(f"  {idx:02d}. {media['filename']} ({size:.0f} KB)")
 
 if __name__ == "__main__":
-    main()
+    # 记录全部FFmpeg/ffprobe调用的资源用量，结束时输出汇总表
+    with track_resources("full_article", settings.log_dir):
+        main()
@@ -3,7 +3,6 @@ import sys
 from pathlib import Path
 import getpass
 import requests
-import subprocess
 import re
 
 # 添加项目根目录到Python路径
@@ -15,6 +14,9 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 from loguru import logger
+from config import settings
+from src.media_processor import MediaProcessor
+from src.media_processor.resource_usage import track_resources
 
 # 配置日志
 logger.remove()
@@ -63,7 +65,7 @@ class WeChatPublisher:
             return None
 
     def compress_gif(self, gif_path, output_path, target_size_mb=1.8):
-        """压缩 GIF 到指定大小以下"""
+        """压缩 GIF 到指定大小以下（试编码估算体积，只正式编码一次）"""
         logger.info(f"  压缩: {Path(gif_path).name}")
         original_size = Path(gif_path).stat().st_size / (1024 * 1024)
 
@@ -73,12 +75,10 @@ class WeChatPublisher:
             shutil.copy(gif_path, output_path)
             return True
 
-        # 使用 ffmpeg 压缩
-        cmd = ['ffmpeg', '-i', gif_path, '-vf', 'fps=8,scale=400:-1',
-               '-f', 'gif', output_path, '-y']
-
         try:
-            subprocess.run(cmd, capture_output=True, check=True)
+            MediaProcessor().fit_gif_to_budget(
+                gif_path, output_path, max_bytes=int(target_size_mb * 1024 * 1024)
+            )
             compressed_size = Path(output_path).stat().st_size / (1024 * 1024)
             logger.info(f"  压缩后: {compressed_size:.1f} MB")
             return compressed_size <= target_size_mb
@@ -90,8 +90,12 @@ class WeChatPublisher:
         filename = Path(file_path).name
         logger.info(f"  上传: {filename}")
 
-        # 如果是 GIF 且需要压缩
-        if compress_gif and file_path.lower().endswith('.gif'):
+        # 如果是 GIF 且需要压缩（已有一次解码生成的微信版时直接使用）
+        wechat_path = Path(file_path).with_name(f"{Path(file_path).stem}_wechat.gif")
+        if compress_gif and file_path.lower().endswith('.gif') and wechat_path.exists():
+            logger.info(f"  使用微信版: {wechat_path.name}")
+            upload_path = str(wechat_path)
+        elif compress_gif and file_path.lower().endswith('.gif'):
             temp_path = str(Path(file_path).parent / f"compressed_{filename}")
             if self.compress_gif(file_path, temp_path):
                 upload_path = temp_path
@@ -115,7 +119,7 @@ class WeChatPublisher:
                 logger.success(f"  ✓ 成功: {media_id}")
 
                 # 删除临时文件
-                if upload_path != file_path:
+                if upload_path != file_path and upload_path != str(wechat_path):
                     Path(upload_path).unlink(missing_ok=True)
 
                 return media_id
@@ -254,7 +258,9 @@ def main():
 
     if media_path.exists():
         # 获取所有 GIF 和图片文件
-        media_files = list(media_path.glob("*.gif")) + list(media_path.glob("*.jpg"))
+        media_files = [
+            f for f in media_path.glob("*.gif") if not f.stem.endswith("_wechat")
+        ] + list(media_path.glob("*.jpg"))
 
         if media_files:
             logger.info(f"\n找到 {len(media_files)} 个媒体文件")
@@ -297,4 +303,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with track_resources("push_to_wechat", settings.log_dir):
+        main()
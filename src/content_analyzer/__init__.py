@@ -1,6 +1,8 @@
 """内容分析模块"""
 from .analyzer import ContentAnalyzer
+from .keyword_matcher import KeywordMatcher
 from .notebooklm_helper import NotebookLMHelper
+from .subtitle_index import SubtitleIndex
 from .timestamp_extractor import TimestampExtractor
 
-__all__ = ['ContentAnalyzer', 'NotebookLMHelper', 'TimestampExtractor']
+__all__ = ['ContentAnalyzer', 'KeywordMatcher', 'NotebookLMHelper', 'SubtitleIndex', 'TimestampExtractor']
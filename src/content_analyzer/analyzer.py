@@ -1,7 +1,7 @@
 """内容分析模块 - ContentAnalyzer"""
 import sys
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from loguru import logger
 import json
 
@@ -9,6 +9,7 @@ import json
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.content_analyzer.notebooklm_helper import NotebookLMHelper
+from src.content_analyzer.subtitle_index import seconds_to_vtt_time
 from src.content_analyzer.timestamp_extractor import TimestampExtractor
 from src.models.video import VideoAnalysis, KeyMoment
 
@@ -38,7 +39,7 @@ class ContentAnalyzer:
 
         Args:
             report_path: NotebookLM报告路径（.txt）
-            subtitle_path: 字幕文件路径（.vtt）
+            subtitle_path: 字幕文件路径（.vtt 或 .srt）
             video_id: 视频ID
 
         Returns:
@@ -58,8 +59,11 @@ class ContentAnalyzer:
         logger.info("\n步骤2: 解析NotebookLM报告...")
         report_data = self.notebooklm_helper.parse_report(report_path)
 
-        # 步骤3: 提取时间戳
+        # 步骤3: 提取时间戳（字幕流式解析为索引，之后的搜索都在内存中完成）
         logger.info("\n步骤3: 提取技术时间戳...")
+        subtitle_index = self.timestamp_extractor.load_index(subtitle_path)
+        if not len(subtitle_index):
+            logger.warning(f"字幕中没有可识别的cue（支持WebVTT/SRT）: {subtitle_path}")
         techniques_with_timestamps = self.timestamp_extractor.extract_all_techniques(
             techniques=report_data["techniques"],
             subtitle_path=subtitle_path,
@@ -96,6 +100,7 @@ class ContentAnalyzer:
             metadata={
                 "total_techniques": len(techniques_with_timestamps),
                 "matched_timestamps": len(key_moments),
+                "subtitle_cues": len(subtitle_index),
                 "subtitle_language": self.subtitle_language,
                 "techniques": techniques_with_timestamps,
                 "report_path": report_path,
@@ -110,6 +115,47 @@ class ContentAnalyzer:
 
         return analysis
 
+    def snap_to_scenes(
+        self,
+        techniques: List[Dict],
+        snap: Callable[..., float],
+        tolerance: Optional[float] = None
+    ) -> int:
+        """
+        将技术时间段的起点吸附到最近的镜头切换（原地修改）
+
+        起点、终点、中点同时平移并重新生成 timestamp，原起点保存在 scene_snapped_from。
+
+        Args:
+            techniques: extract_all_techniques 返回的技术时间戳列表
+            snap: 吸附函数 snap(时间, 容差) -> 时间（如 SceneIndex.snap），容差内没有切点时返回原时间
+            tolerance: 吸附容差（秒，None时使用吸附函数的默认值）
+
+        Returns:
+            吸附的时间段数
+        """
+        count = 0
+        for tech in techniques:
+            start = tech.get("start_seconds")
+            if start is None:
+                continue
+
+            snapped = snap(start) if tolerance is None else snap(start, tolerance)
+            offset = snapped - start
+            if offset == 0:
+                continue
+
+            tech["scene_snapped_from"] = start
+            for key in ("start_seconds", "end_seconds", "mid_seconds"):
+                tech[key] += offset
+            if tech.get("timestamp"):
+                tech["timestamp"] = (
+                    f"{seconds_to_vtt_time(tech['start_seconds'])} --> {seconds_to_vtt_time(tech['end_seconds'])}"
+                )
+            logger.debug(f"  {tech['technique_name']}: 起点 {start:.2f}秒 -> {tech['start_seconds']:.2f}秒")
+            count += 1
+        return count
+
     def save_analysis(self, analysis: VideoAnalysis, output_path: str) -> None:
         """
         保存分析结果到JSON文件
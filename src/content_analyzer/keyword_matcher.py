@@ -0,0 +1,152 @@
+"""多关键词匹配器 - Aho-Corasick自动机，一次扫描找出所有关键词"""
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from src.content_analyzer.subtitle_index import SubtitleIndex
+
+
+class KeywordMatcher:
+    """
+    不区分大小写的多关键词匹配器（Aho-Corasick）
+
+    所有关键词（小写）构建为一个自动机，并预先展开失配链接得到完整的转移表，
+    扫描时每个字符只需一次字典查找，耗时与文本长度成正比、与关键词数量无关。
+    每个关键词可以附带所属技术，匹配结果同时标记关键词和技术。
+    """
+
+    def __init__(self, keywords: List[str], techniques: Optional[List[Optional[str]]] = None):
+        """
+        构建自动机
+
+        Args:
+            keywords: 关键词列表（空关键词被忽略）
+            techniques: 与关键词一一对应的技术名称（可选）
+        """
+        self.keywords = list(keywords)
+        self.techniques = list(techniques) if techniques is not None else [None] * len(self.keywords)
+        if len(self.techniques) != len(self.keywords):
+            raise ValueError("techniques 与 keywords 长度不一致")
+
+        # 关键词字典树：goto[状态][字符] -> 状态，outputs[状态] -> 以该状态结尾的关键词序号
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for pattern_id, keyword in enumerate(self.keywords):
+            needle = keyword.strip().lower()
+            if not needle:
+                continue
+            state = 0
+            for ch in needle:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(pattern_id)
+
+        # 按广度优先计算失配链接，同时展开为完整转移表（转移到根的项省略）
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            transitions = dict(delta[fail[state]])
+            for ch, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(ch, 0)
+                transitions[ch] = next_state
+                queue.append(next_state)
+            delta[state] = transitions
+
+        self._delta = delta
+        self._outputs: List[Tuple[int, ...]] = [tuple(sorted(output)) for output in outputs]
+
+    @classmethod
+    def for_techniques(cls, techniques: List[Dict]) -> "KeywordMatcher":
+        """
+        用所有技术的关键词构建一个匹配器
+
+        Args:
+            techniques: 技术列表（每个包含 name 和 keywords）
+
+        Returns:
+            KeywordMatcher对象，关键词按技术顺序排列
+        """
+        keywords, names = [], []
+        for technique in techniques:
+            for keyword in technique.get("keywords", []):
+                keywords.append(keyword)
+                names.append(technique.get("name"))
+        return cls(keywords, names)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find(self, text: str) -> List[int]:
+        """
+        找出文本中出现的关键词
+
+        Args:
+            text: 文本（不区分大小写）
+
+        Returns:
+            出现的关键词序号（升序，每个关键词只出现一次）
+        """
+        return self._scan(text.lower())
+
+    def _scan(self, lowered: str) -> List[int]:
+        """扫描已转为小写的文本"""
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        found = None
+        for ch in lowered:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                if found is None:
+                    found = set()
+                found.update(outputs[state])
+        return sorted(found) if found else []
+
+    def match_cues(self, index: SubtitleIndex) -> List[Tuple[int, int]]:
+        """
+        一次扫描全部cue
+
+        Args:
+            index: 字幕索引
+
+        Returns:
+            [(cue序号, 关键词序号)]，按cue顺序、同一cue内按关键词序号排列
+        """
+        results = []
+        for cue_id, text in enumerate(index.texts):
+            for pattern_id in self._scan(text.lower()):
+                results.append((cue_id, pattern_id))
+        return results
+
+    def search(self, index: SubtitleIndex, pairs: Optional[List[Tuple[int, int]]] = None) -> List[Dict]:
+        """
+        在字幕索引中搜索所有关键词
+
+        Args:
+            index: 字幕索引
+            pairs: 只转换这些 match_cues() 结果（默认扫描全部cue）
+
+        Returns:
+            匹配结果列表（按开始时间排序，同一时间按关键词顺序），每个结果为
+            SubtitleIndex.cue() 的字段加上：
+            - keyword: 匹配的关键词
+            - technique: 关键词所属技术（未指定时为None）
+        """
+        if pairs is None:
+            pairs = self.match_cues(index)
+
+        starts = index.starts.tolist()
+        matches = []
+        for cue_id, pattern_id in sorted(pairs, key=lambda pair: (starts[pair[0]], pair[1])):
+            match = index.cue(cue_id)
+            match["keyword"] = self.keywords[pattern_id]
+            match["technique"] = self.techniques[pattern_id]
+            matches.append(match)
+        return matches
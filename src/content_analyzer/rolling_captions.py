@@ -0,0 +1,210 @@
+"""滚动字幕压缩 - 把YouTube自动字幕的重复滚动cue合并为不重叠的干净cue，保留逐词时间"""
+import io
+import os
+import re
+import threading
+from itertools import chain, islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+from loguru import logger
+
+from src.content_analyzer.subtitle_index import (
+    INLINE_TAG, Cue, iter_cues, open_subtitle, seconds_to_vtt_time, vtt_time_to_seconds
+)
+
+# 压缩方式变化时递增，使旧的压缩文件失效
+COMPACT_VERSION = 1
+
+# 压缩文件头部的来源标记: "NOTE rolling-captions version=1 source_size=N source_mtime_ns=M"
+_SOURCE_NOTE = re.compile(r"NOTE rolling-captions version=(\d+) source_size=(\d+) source_mtime_ns=(\d+)")
+
+# 逐词时间标签 "<00:00:01.234>"
+_WORD_TIME = re.compile(r"<((?:\d+:)?\d{2}:\d{2}\.\d{3})>")
+
+# 判断是否为滚动字幕时检查的开头cue数（片头音乐等没有逐词标签）
+ROLLING_PROBE_CUES = 50
+
+
+def is_rolling(cues: Iterable[Cue]) -> bool:
+    """是否为YouTube滚动自动字幕（带 <c> 逐词标签）"""
+    return any("<c>" in line for cue in cues for line in cue.lines)
+
+
+def compacted_path(subtitle_path: str) -> Path:
+    """压缩文件路径（X.en.vtt -> X.en.compact.vtt）"""
+    path = Path(subtitle_path)
+    return path.with_name(f"{path.stem}.compact{path.suffix}")
+
+
+def read_header(lines: Iterator[str]) -> List[str]:
+    """读取VTT头部（第一个空行之前的行），之后的行留给 iter_cues"""
+    header = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            break
+        header.append(line)
+    return header
+
+
+def _words(raw: str, start: float) -> List[Tuple[float, str]]:
+    """
+    解析一行字幕的逐词时间
+
+    Args:
+        raw: 原始文本行（可能带 <时间><c> 词</c> 标签）
+        start: cue开始时间（标签前的词从这里开始）
+
+    Returns:
+        [(开始时间, 词)]
+    """
+    words = []
+    time = start
+    pieces = _WORD_TIME.split(raw)
+    # split结果为 [文本, 时间, 文本, 时间, 文本, ...]
+    for k, piece in enumerate(pieces):
+        if k % 2:
+            time = vtt_time_to_seconds(piece)
+            continue
+        for word in INLINE_TAG.sub("", piece).split():
+            words.append((time, word))
+    return words
+
+
+def compact_cues(cues: Iterable[Cue]) -> Iterator[Tuple[float, float, str]]:
+    """
+    压缩滚动字幕cue
+
+    YouTube自动字幕中每一行先带逐词标签出现在一个cue的第二行，随后在10毫秒的过渡cue
+    和下一个cue的第一行中重复出现。按出现顺序只保留每行第一次出现（与上一条输出行
+    文本相同的行跳过），每行成为一个cue：开始于第一个词，结束于下一行开始
+    （最后一行为原cue结束），逐词时间以WebVTT内联时间标签保留。
+    逐个消费输入，只暂存上一行。
+
+    Args:
+        cues: iter_cues() 产生的cue
+
+    Yields:
+        (开始时间, 结束时间, 带逐词时间标签的文本)
+    """
+    previous: Optional[Tuple[float, float, str, List[Tuple[float, str]]]] = None
+    for cue in cues:
+        for raw in cue.lines:
+            words = _words(raw, cue.start)
+            text = " ".join(word for _, word in words)
+            if not text or (previous is not None and previous[2] == text):
+                continue
+            if previous is not None:
+                yield _caption(previous, words[0][0])
+            previous = (words[0][0], cue.end, text, words)
+
+    if previous is not None:
+        yield _caption(previous, None)
+
+
+def _caption(
+    caption: Tuple[float, float, str, List[Tuple[float, str]]],
+    next_start: Optional[float]
+) -> Tuple[float, float, str]:
+    """确定一行的结束时间（不晚于下一行开始）并生成带逐词时间标签的文本"""
+    start, end, _, words = caption
+    if next_start is not None:
+        end = min(end, next_start)
+    end = max(end, start)
+
+    tagged = [words[0][1]]
+    for time, word in words[1:]:
+        # 时间标签必须在cue范围内
+        tagged.append(f"<{seconds_to_vtt_time(min(time, end))}>{word}" if time > start else word)
+    return start, end, " ".join(tagged)
+
+
+def write_compacted(out: TextIO, header: List[str], cues: Iterable[Cue], note: Optional[str] = None) -> int:
+    """
+    写出压缩后的VTT
+
+    Args:
+        out: 输出文本流
+        header: 原文件头部（为空时写 WEBVTT）
+        cues: 原始cue
+        note: 写在头部之后的NOTE行（可选）
+
+    Returns:
+        输出的cue数
+    """
+    out.write("\n".join(header or ["WEBVTT"]) + "\n")
+    if note:
+        out.write(f"\n{note}\n")
+    count = 0
+    for start, end, text in compact_cues(cues):
+        out.write(f"\n{seconds_to_vtt_time(start)} --> {seconds_to_vtt_time(end)}\n{text}\n")
+        count += 1
+    return count
+
+
+def compact_rolling_captions(content: str) -> str:
+    """
+    压缩滚动字幕文本（见 compact_cues）
+
+    Args:
+        content: 原始VTT内容
+
+    Returns:
+        压缩后的VTT内容（头部保留原文件的 Kind/Language 等行）
+    """
+    lines = iter(content.splitlines())
+    header = read_header(lines)
+    out = io.StringIO()
+    write_compacted(out, header, iter_cues(lines))
+    return out.getvalue()
+
+
+def _cached(path: Path, size: int, mtime_ns: int) -> bool:
+    """压缩文件是否存在且对应当前来源文件"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.read(1024)
+    except OSError:
+        return False
+    match = _SOURCE_NOTE.search(head)
+    return bool(match) and tuple(int(value) for value in match.groups()) == (COMPACT_VERSION, size, mtime_ns)
+
+
+def compact_subtitle(subtitle_path: str) -> str:
+    """
+    获取字幕的压缩版本（不是滚动字幕时返回原路径）
+
+    压缩结果保存在原文件旁（X.en.compact.vtt），头部记录来源文件的大小与修改时间，
+    来源文件未变化时直接复用。读写均为流式，只检查开头的cue判断是否为滚动字幕。
+
+    Args:
+        subtitle_path: 字幕文件路径（.vtt；SRT和普通字幕原样返回）
+
+    Returns:
+        供后续搜索使用的字幕文件路径
+    """
+    source = Path(subtitle_path)
+    stat = source.stat()
+    target = compacted_path(subtitle_path)
+    if _cached(target, stat.st_size, stat.st_mtime_ns):
+        return str(target)
+
+    with open_subtitle(subtitle_path) as f:
+        header = read_header(f)
+        if not header or not header[0].startswith("WEBVTT"):
+            return subtitle_path
+
+        cues = iter_cues(f)
+        probe = list(islice(cues, ROLLING_PROBE_CUES))
+        if not is_rolling(probe):
+            return subtitle_path
+
+        note = f"NOTE rolling-captions version={COMPACT_VERSION} source_size={stat.st_size} source_mtime_ns={stat.st_mtime_ns}"
+        # 先写临时文件再改名，并行任务不会读到写了一半的文件
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            count = write_compacted(out, header, chain(probe, cues), note)
+    os.replace(tmp_path, target)
+
+    logger.info(f"滚动字幕压缩: {source.name} -> {count}个cue")
+    return str(target)
@@ -0,0 +1,354 @@
+"""字幕索引 - 流式解析VTT/SRT字幕（只解析一次），关键词搜索在内存中完成"""
+import html
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, TextIO, Union
+
+import numpy as np
+
+# 时间戳行: VTT "00:02:02.719 --> 00:02:05.590"（小时可省略，后面可以跟cue设置），
+# SRT "00:02:02,719 --> 00:02:05,590"
+TIMESTAMP_PATTERN = re.compile(r'((?:\d+:)?\d{2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{2}:\d{2}[.,]\d{3})')
+
+# cue文本中的内联标签（逐词时间 <00:00:01.234>、<c>、<i> 等）
+INLINE_TAG = re.compile(r'<[^>]*>')
+
+
+def cue_text(line: str) -> str:
+    """去掉内联标签并还原HTML实体后的纯文本"""
+    if '<' in line:
+        line = INLINE_TAG.sub('', line)
+    if '&' in line:
+        line = html.unescape(line)
+    return ' '.join(line.split())
+
+
+def vtt_time_to_seconds(vtt_time: str) -> float:
+    """
+    将VTT时间戳转换为秒
+
+    Args:
+        vtt_time: VTT时间戳 "00:02:02.719"（或省略小时的 "02:02.719"、SRT的 "00:02:02,719"）
+
+    Returns:
+        秒数
+    """
+    time_part, ms_part = vtt_time.replace(',', '.').split('.')
+    parts = [int(part) for part in time_part.split(':')]
+    h, m, s = [0] * (3 - len(parts)) + parts
+
+    return h * 3600 + m * 60 + s + float(f"0.{ms_part}")
+
+
+def seconds_to_vtt_time(seconds: float) -> str:
+    """
+    将秒转换为VTT时间戳格式
+
+    Args:
+        seconds: 秒数
+
+    Returns:
+        VTT时间戳 "00:02:02.719"
+    """
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = seconds % 60
+
+    return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
+
+
+class Cue(NamedTuple):
+    """字幕cue（lines为原始文本行，可能带内联标签）"""
+    start: float
+    end: float
+    lines: List[str]
+
+
+def iter_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """
+    逐个读取字幕cue（WebVTT与SRT）
+
+    按行消费输入（文件句柄或行列表），只保留当前cue的文本行，内存占用与文件大小无关。
+    时间戳行之后直到空行（或下一个时间戳行）的行为cue文本；头部、NOTE/STYLE块、
+    cue标识和SRT序号行不在时间戳行之后，自然被跳过。只含空格的行属于cue文本
+    （YouTube滚动字幕用它占位），只有空行结束cue。
+
+    Args:
+        lines: 文本行（可以带换行符）
+
+    Yields:
+        Cue
+    """
+    start = end = None
+    text_lines: List[str] = []
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+        match = TIMESTAMP_PATTERN.search(line) if '-->' in line else None
+        if match:
+            if start is not None:
+                # 缺少空行分隔（如分隔行只含空格的SRT）：序号行被读成了上一个cue的文本
+                if text_lines and text_lines[-1].strip().isdigit():
+                    text_lines.pop()
+                yield Cue(start, end, text_lines)
+            start = vtt_time_to_seconds(match.group(1))
+            end = vtt_time_to_seconds(match.group(2))
+            text_lines = []
+        elif start is not None:
+            if line:
+                text_lines.append(line)
+            else:
+                yield Cue(start, end, text_lines)
+                start = None
+
+    if start is not None:
+        yield Cue(start, end, text_lines)
+
+
+def open_subtitle(subtitle_path: str) -> TextIO:
+    """以文本方式打开字幕文件（去掉UTF-8 BOM，忽略无法解码的字节）"""
+    return open(subtitle_path, 'r', encoding='utf-8-sig', errors='ignore')
+
+
+class NearestTimes:
+    """
+    最近时间查询
+
+    时间数组只排序一次，之后每批查询用 searchsorted 定位左右相邻值后向量比较。
+    距离相同时取原序号最小的元素，与 min(..., key=距离) 的结果一致。
+    可以给每个时间指定组号（如所属技术），查询时只在目标所在的组内比较：
+    排序键为 组号 * 组间距 + 时间，所有组仍只需一次 searchsorted。
+    """
+
+    def __init__(self, values: Sequence[float], groups: Optional[Sequence[int]] = None):
+        """
+        Args:
+            values: 时间数组（无需有序，不能为空）
+            groups: 每个时间所属的组号（可选，默认全部为0）
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            raise ValueError("没有可供查询的时间")
+        groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+
+        # 组间距大于组内时间跨度，查询时间先截断到 [最小值-1, 最大值+1]，不会越过相邻组
+        self._low = float(values.min())
+        self._high = float(values.max())
+        self._spacing = self._high - self._low + 4.0
+
+        order = np.lexsort((values, groups))
+        self._sorted = values[order]
+        self._groups = groups[order]
+        self._keys = self._key(self._sorted, self._groups)
+        # 每个排序位置所在的相同 (组, 取值) 段中，原序号最小的元素（lexsort稳定，为段首）
+        run_start = np.ones(len(values), dtype=bool)
+        run_start[1:] = (self._sorted[1:] != self._sorted[:-1]) | (self._groups[1:] != self._groups[:-1])
+        self._first = order[np.maximum.accumulate(np.where(run_start, np.arange(len(values)), 0))]
+
+    def _key(self, times: np.ndarray, groups: np.ndarray) -> np.ndarray:
+        """排序键（组号 * 组间距 + 组内偏移）"""
+        return (np.clip(times, self._low - 1.0, self._high + 1.0) - self._low) + groups * self._spacing
+
+    def __call__(
+        self,
+        targets: Union[float, Sequence[float]],
+        groups: Union[int, Sequence[int], None] = None
+    ) -> np.ndarray:
+        """
+        查询最近的元素
+
+        Args:
+            targets: 目标时间（标量或数组）
+            groups: 每个目标所在的组号（可选，默认0）
+
+        Returns:
+            最近元素的原序号（与targets形状相同，目标所在的组没有元素时为-1）
+        """
+        targets = np.asarray(targets, dtype=np.float64)
+        groups = np.broadcast_to(np.asarray(0 if groups is None else groups, dtype=np.int64), targets.shape)
+
+        last = len(self._sorted) - 1
+        pos = np.searchsorted(self._keys, self._key(targets, groups), side="left")
+        left = np.clip(pos - 1, 0, last)
+        right = np.clip(pos, 0, last)
+
+        # 距离用原始时间计算；相邻位置属于其他组时不参与比较
+        left_distance = np.where(self._groups[left] == groups, np.abs(self._sorted[left] - targets), np.inf)
+        right_distance = np.where(self._groups[right] == groups, np.abs(self._sorted[right] - targets), np.inf)
+        left_first, right_first = self._first[left], self._first[right]
+        nearest = np.where(
+            right_distance < left_distance, right_first,
+            np.where(left_distance < right_distance, left_first, np.minimum(left_first, right_first))
+        )
+        return np.where(np.isinf(np.minimum(left_distance, right_distance)), -1, nearest)
+
+
+class SubtitleIndex:
+    """
+    字幕cue索引
+
+    解析一次后以平行数组保存每个cue的开始/结束/中间时间（NumPy float64数组）和文本
+    （多行文本以空格连接、去掉内联标签）。只保存这一份文本，不保留原文件内容。
+    最近cue、时间点/窗口包含与重叠查询都通过 searchsorted 和向量运算完成，
+    时间参数可以是数组，一次调用解析一批时间。
+    """
+
+    def __init__(self, starts: List[float], ends: List[float], texts: List[str], path: Optional[str] = None):
+        """
+        初始化索引
+
+        Args:
+            starts: cue开始时间（秒），按文件顺序
+            ends: cue结束时间（秒）
+            texts: cue文本
+            path: 来源字幕文件路径（可选）
+        """
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.mids = (self.starts + self.ends) / 2
+        self.texts = texts
+        self.path = path
+
+        # 按开始时间排序的cue序号，以及该顺序下结束时间的前缀最大值：
+        # 前缀最大值单调不减，可以二分出"之前的cue都已结束"的位置
+        self._start_order = np.argsort(self.starts, kind="stable")
+        self._sorted_starts = self.starts[self._start_order]
+        self._max_ends = np.maximum.accumulate(self.ends[self._start_order]) if len(texts) else self.ends
+        self._nearest = NearestTimes(self.mids) if len(texts) else None
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_cues(cls, cues: Iterable[Cue], path: Optional[str] = None) -> "SubtitleIndex":
+        """
+        由cue序列建立索引（逐个消费，不需要完整文本）
+
+        Args:
+            cues: iter_cues() 产生的cue
+            path: 来源路径（可选）
+
+        Returns:
+            SubtitleIndex对象
+        """
+        starts: List[float] = []
+        ends: List[float] = []
+        texts: List[str] = []
+        for cue in cues:
+            starts.append(cue.start)
+            ends.append(cue.end)
+            texts.append(' '.join(text for text in map(cue_text, cue.lines) if text))
+        return cls(starts, ends, texts, path)
+
+    @classmethod
+    def parse(cls, content: str, path: Optional[str] = None) -> "SubtitleIndex":
+        """
+        解析VTT/SRT文本
+
+        Args:
+            content: 字幕文件内容
+            path: 来源路径（可选）
+
+        Returns:
+            SubtitleIndex对象
+        """
+        return cls.from_cues(iter_cues(content.splitlines()), path)
+
+    @classmethod
+    def from_file(cls, subtitle_path: str) -> "SubtitleIndex":
+        """
+        流式读取并解析字幕文件
+
+        Args:
+            subtitle_path: 字幕文件路径（.vtt 或 .srt）
+
+        Returns:
+            SubtitleIndex对象
+        """
+        with open_subtitle(subtitle_path) as f:
+            return cls.from_cues(iter_cues(f), subtitle_path)
+
+    def cue(self, i: int) -> Dict:
+        """
+        第i个cue的时间信息
+
+        Returns:
+            字典，包含 timestamp / text / start_seconds / end_seconds / mid_seconds
+        """
+        start, end = float(self.starts[i]), float(self.ends[i])
+        return {
+            "timestamp": f"{seconds_to_vtt_time(start)} --> {seconds_to_vtt_time(end)}",
+            "text": self.texts[i],
+            "start_seconds": start,
+            "end_seconds": end,
+            "mid_seconds": float(self.mids[i])
+        }
+
+    def nearest(self, times: Union[float, Sequence[float]]) -> Union[int, np.ndarray]:
+        """
+        中间时间最近的cue
+
+        Args:
+            times: 目标时间（秒），标量或数组（数组时一次解析全部）
+
+        Returns:
+            cue序号（times为数组时为序号数组）
+        """
+        if self._nearest is None:
+            raise ValueError("字幕索引为空")
+        result = self._nearest(times)
+        return int(result) if result.ndim == 0 else result
+
+    def containing(self, time: float) -> np.ndarray:
+        """
+        包含该时间点的cue（开始 <= time < 结束）
+
+        Returns:
+            cue序号数组（升序）
+        """
+        lo = np.searchsorted(self._max_ends, time, side="right")
+        hi = np.searchsorted(self._sorted_starts, time, side="right")
+        candidates = self._start_order[lo:hi]
+        return np.sort(candidates[self.ends[candidates] > time])
+
+    def overlapping(self, start: float, end: float) -> np.ndarray:
+        """
+        与时间窗口 [start, end) 重叠的cue（cue开始 < end 且 cue结束 > start）
+
+        Returns:
+            cue序号数组（升序）
+        """
+        lo = np.searchsorted(self._max_ends, start, side="right")
+        hi = np.searchsorted(self._sorted_starts, end, side="left")
+        candidates = self._start_order[lo:hi]
+        return np.sort(candidates[self.ends[candidates] > start])
+
+    def within(self, start: float, end: float) -> np.ndarray:
+        """
+        完全落在时间窗口 [start, end] 内的cue
+
+        Returns:
+            cue序号数组（升序）
+        """
+        lo = np.searchsorted(self._sorted_starts, start, side="left")
+        hi = np.searchsorted(self._sorted_starts, end, side="right")
+        candidates = self._start_order[lo:hi]
+        return np.sort(candidates[self.ends[candidates] <= end])
+
+    def search(self, keyword: str) -> List[Dict]:
+        """
+        搜索包含关键词的cue（不区分大小写的子串匹配）
+
+        Args:
+            keyword: 关键词
+
+        Returns:
+            匹配结果列表（按文件顺序），每个结果为 cue() 的字段加上 keyword
+        """
+        needle = keyword.lower()
+        matches = []
+        for i, text in enumerate(self.texts):
+            if needle in text.lower():
+                match = self.cue(i)
+                match["keyword"] = keyword
+                matches.append(match)
+        return matches
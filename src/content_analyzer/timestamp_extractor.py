@@ -1,22 +1,56 @@
-"""时间戳提取器 - 使用Grep搜索字幕文件"""
-import subprocess
-import re
+"""时间戳提取器 - 在解析一次的字幕索引中搜索关键词"""
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple, Union
+import numpy as np
 from loguru import logger
 
+from src.content_analyzer.keyword_matcher import KeywordMatcher
+from src.content_analyzer.rolling_captions import compact_subtitle
+from src.content_analyzer.subtitle_index import NearestTimes, SubtitleIndex, seconds_to_vtt_time, vtt_time_to_seconds
+
 
 class TimestampExtractor:
-    """使用Grep从VTT字幕文件中提取时间戳"""
+    """从字幕文件（WebVTT/SRT）中提取时间戳"""
+
+    def __init__(self):
+        """初始化提取器"""
+        # 字幕索引缓存：路径 -> ((大小, 修改时间), 索引)
+        self._indexes: Dict[str, Tuple[Tuple[int, int], SubtitleIndex]] = {}
 
-    def __init__(self, grep_path: str = "grep"):
+    def load_index(self, subtitle_path: str) -> SubtitleIndex:
         """
-        初始化提取器
+        获取字幕索引（每个文件只解析一次，文件变化后重新解析）
+
+        YouTube滚动自动字幕先压缩为不重叠的cue（见 compact_subtitle），索引建立在压缩结果上。
 
         Args:
-            grep_path: grep命令路径，Windows下需要安装Git Bash或使用findstr
+            subtitle_path: 字幕文件路径（.vtt 或 .srt）
+
+        Returns:
+            SubtitleIndex对象
         """
-        self.grep_path = grep_path
+        path = Path(subtitle_path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"字幕文件不存在: {subtitle_path}")
+
+        key = str(path.resolve())
+        version = (stat.st_size, stat.st_mtime_ns)
+        cached = self._indexes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        try:
+            source = compact_subtitle(subtitle_path)
+        except Exception as e:
+            logger.warning(f"滚动字幕压缩失败，使用原字幕: {e}")
+            source = subtitle_path
+
+        index = SubtitleIndex.from_file(source)
+        self._indexes[key] = (version, index)
+        logger.debug(f"字幕索引: {path.name} ({len(index)}个cue)")
+        return index
 
     def search_keywords(
         self,
@@ -27,7 +61,7 @@ class TimestampExtractor:
         在字幕文件中搜索关键词并提取时间戳
 
         Args:
-            subtitle_path: 字幕文件路径（.vtt格式）
+            subtitle_path: 字幕文件路径（.vtt 或 .srt）
             keywords: 关键词列表
 
         Returns:
@@ -41,21 +75,10 @@ class TimestampExtractor:
         """
         logger.info(f"在字幕中搜索{len(keywords)}个关键词...")
 
-        if not Path(subtitle_path).exists():
-            raise FileNotFoundError(f"字幕文件不存在: {subtitle_path}")
-
-        all_matches = []
+        index = self.load_index(subtitle_path)
 
-        for keyword in keywords:
-            try:
-                matches = self._grep_keyword(subtitle_path, keyword)
-                all_matches.extend(matches)
-            except Exception as e:
-                logger.warning(f"搜索关键词 '{keyword}' 失败: {e}")
-                continue
-
-        # 按时间排序
-        all_matches.sort(key=lambda x: x["start_seconds"])
+        # 所有关键词一次扫描，结果已按时间排序
+        all_matches = KeywordMatcher(keywords).search(index)
 
         # 去重（同一时间段的多个关键词合并）
         unique_matches = self._deduplicate_matches(all_matches)
@@ -63,199 +86,6 @@ class TimestampExtractor:
         logger.success(f"✓ 找到{len(unique_matches)}个匹配")
         return unique_matches
 
-    def _grep_keyword(self, subtitle_path: str, keyword: str) -> List[Dict]:
-        """
-        使用grep搜索单个关键词
-
-        Args:
-            subtitle_path: 字幕文件路径
-            keyword: 关键词
-
-        Returns:
-            匹配结果列表
-        """
-        matches = []
-
-        # Windows兼容性：使用findstr或grep
-        try:
-            # 尝试使用grep（Git Bash）
-            result = subprocess.run(
-                [self.grep_path, "-i", "-n", keyword, subtitle_path],
-                capture_output=True,
-                text=True,
-                check=False,
-                encoding='utf-8',
-                errors='ignore'
-            )
-
-            if result.returncode != 0:
-                # grep失败，尝试Python实现
-                return self._fallback_search(subtitle_path, keyword)
-
-            # 解析grep输出
-            grep_output = result.stdout
-            matches = self._parse_grep_output(subtitle_path, grep_output, keyword)
-
-        except FileNotFoundError:
-            # grep不可用，使用Python实现
-            logger.debug(f"grep不可用，使用Python搜索: {keyword}")
-            matches = self._fallback_search(subtitle_path, keyword)
-
-        return matches
-
-    def _parse_grep_output(
-        self,
-        subtitle_path: str,
-        grep_output: str,
-        keyword: str
-    ) -> List[Dict]:
-        """
-        解析grep输出，提取完整的时间戳和文本
-
-        Args:
-            subtitle_path: 字幕文件路径
-            grep_output: grep的stdout输出
-            keyword: 搜索的关键词
-
-        Returns:
-            匹配结果列表
-        """
-        matches = []
-
-        # 读取完整的字幕文件
-        subtitle_content = Path(subtitle_path).read_text(encoding='utf-8')
-        lines = subtitle_content.split('\n')
-
-        # grep输出格式: "行号:匹配的文本"
-        for line in grep_output.split('\n'):
-            if not line.strip():
-                continue
-
-            try:
-                # 提取行号
-                line_num = int(line.split(':')[0])
-
-                # 向上查找时间戳（VTT格式：时间戳在文本行之前）
-                timestamp_info = self._find_timestamp_for_line(lines, line_num)
-
-                if timestamp_info:
-                    # 提取匹配的文本
-                    matched_text = ':'.join(line.split(':')[1:]).strip()
-
-                    matches.append({
-                        "keyword": keyword,
-                        "timestamp": timestamp_info["timestamp"],
-                        "text": matched_text,
-                        "start_seconds": timestamp_info["start_seconds"],
-                        "end_seconds": timestamp_info["end_seconds"],
-                        "mid_seconds": timestamp_info["mid_seconds"]
-                    })
-
-            except (ValueError, IndexError) as e:
-                logger.debug(f"解析grep输出失败: {line}, 错误: {e}")
-                continue
-
-        return matches
-
-    def _find_timestamp_for_line(
-        self,
-        lines: List[str],
-        line_num: int
-    ) -> Optional[Dict]:
-        """
-        查找指定行对应的时间戳
-
-        Args:
-            lines: 字幕文件所有行
-            line_num: 文本行号
-
-        Returns:
-            时间戳信息字典
-        """
-        # VTT格式：时间戳在文本之前
-        # 向上搜索最近的时间戳行
-        for i in range(line_num - 1, max(0, line_num - 5), -1):
-            line = lines[i].strip()
-
-            # VTT时间戳格式: "00:02:02.719 --> 00:02:05.590"
-            timestamp_pattern = r'(\d{2}:\d{2}:\d{2}\.\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2}\.\d{3})'
-
-            match = re.search(timestamp_pattern, line)
-            if match:
-                start_time = match.group(1)
-                end_time = match.group(2)
-
-                start_seconds = self._vtt_time_to_seconds(start_time)
-                end_seconds = self._vtt_time_to_seconds(end_time)
-                mid_seconds = (start_seconds + end_seconds) / 2
-
-                return {
-                    "timestamp": f"{start_time} --> {end_time}",
-                    "start_seconds": start_seconds,
-                    "end_seconds": end_seconds,
-                    "mid_seconds": mid_seconds
-                }
-
-        return None
-
-    def _fallback_search(self, subtitle_path: str, keyword: str) -> List[Dict]:
-        """
-        备用搜索方法：纯Python实现（当grep不可用时）
-
-        Args:
-            subtitle_path: 字幕文件路径
-            keyword: 关键词
-
-        Returns:
-            匹配结果列表
-        """
-        matches = []
-
-        subtitle_content = Path(subtitle_path).read_text(encoding='utf-8')
-        lines = subtitle_content.split('\n')
-
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-
-            # 检查是否是时间戳行
-            timestamp_pattern = r'(\d{2}:\d{2}:\d{2}\.\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2}\.\d{3})'
-            timestamp_match = re.search(timestamp_pattern, line)
-
-            if timestamp_match:
-                # 获取后续的文本行
-                text_lines = []
-                j = i + 1
-                while j < len(lines) and lines[j].strip() and not re.match(timestamp_pattern, lines[j]):
-                    text_lines.append(lines[j].strip())
-                    j += 1
-
-                text = ' '.join(text_lines)
-
-                # 检查关键词是否在文本中（不区分大小写）
-                if keyword.lower() in text.lower():
-                    start_time = timestamp_match.group(1)
-                    end_time = timestamp_match.group(2)
-
-                    start_seconds = self._vtt_time_to_seconds(start_time)
-                    end_seconds = self._vtt_time_to_seconds(end_time)
-                    mid_seconds = (start_seconds + end_seconds) / 2
-
-                    matches.append({
-                        "keyword": keyword,
-                        "timestamp": f"{start_time} --> {end_time}",
-                        "text": text,
-                        "start_seconds": start_seconds,
-                        "end_seconds": end_seconds,
-                        "mid_seconds": mid_seconds
-                    })
-
-                i = j
-            else:
-                i += 1
-
-        return matches
-
     def _deduplicate_matches(self, matches: List[Dict]) -> List[Dict]:
         """
         去重：合并时间上重叠的匹配
@@ -307,12 +137,7 @@ class TimestampExtractor:
         Returns:
             秒数
         """
-        # 分割时:分:秒.毫秒
-        time_part, ms_part = vtt_time.split('.')
-        h, m, s = time_part.split(':')
-
-        total_seconds = int(h) * 3600 + int(m) * 60 + int(s) + float(f"0.{ms_part}")
-        return total_seconds
+        return vtt_time_to_seconds(vtt_time)
 
     def _seconds_to_vtt_time(self, seconds: float) -> str:
         """
@@ -324,16 +149,13 @@ class TimestampExtractor:
         Returns:
             VTT时间戳 "00:02:02.719"
         """
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = seconds % 60
-
-        return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
+        return seconds_to_vtt_time(seconds)
 
     def extract_timestamps_for_technique(
         self,
         technique: Dict,
-        subtitle_path: str
+        subtitle_path: str,
+        matches: Optional[List[Dict]] = None
     ) -> List[Dict]:
         """
         为特定技术提取所有相关时间戳
@@ -341,6 +163,7 @@ class TimestampExtractor:
         Args:
             technique: 技术信息字典（包含keywords字段）
             subtitle_path: 字幕文件路径
+            matches: 已匹配的结果（按时间排序、未去重，见 KeywordMatcher.search），默认在字幕中搜索
 
         Returns:
             时间戳列表
@@ -354,7 +177,10 @@ class TimestampExtractor:
         logger.info(f"为技术 '{technique.get('name')}' 提取时间戳...")
         logger.debug(f"  关键词: {keywords}")
 
-        matches = self.search_keywords(subtitle_path, keywords)
+        if matches is None:
+            matches = self.search_keywords(subtitle_path, keywords)
+        else:
+            matches = self._deduplicate_matches(matches)
 
         # 为每个匹配添加技术信息
         for match in matches:
@@ -367,7 +193,8 @@ class TimestampExtractor:
         self,
         technique: Dict,
         subtitle_path: str,
-        preferred_time: Optional[float] = None
+        preferred_time: Optional[float] = None,
+        matches: Optional[List[Dict]] = None
     ) -> Optional[Dict]:
         """
         为技术找到最佳时间戳
@@ -381,21 +208,19 @@ class TimestampExtractor:
             technique: 技术信息字典
             subtitle_path: 字幕文件路径
             preferred_time: 偏好的时间点（秒）
+            matches: 已匹配的结果（见 extract_timestamps_for_technique）
 
         Returns:
             最佳时间戳信息
         """
-        matches = self.extract_timestamps_for_technique(technique, subtitle_path)
+        matches = self.extract_timestamps_for_technique(technique, subtitle_path, matches)
 
         if not matches:
             return None
 
         if preferred_time is not None:
             # 选择最接近preferred_time的
-            best_match = min(
-                matches,
-                key=lambda m: abs(m["mid_seconds"] - preferred_time)
-            )
+            best_match = matches[int(self._nearest_matches(matches, preferred_time))]
             logger.info(f"  选择最接近{preferred_time}秒的时间戳: {best_match['mid_seconds']:.2f}秒")
         else:
             # 选择第一个（通常是最相关的）
@@ -404,6 +229,75 @@ class TimestampExtractor:
 
         return best_match
 
+    def find_best_timestamps(
+        self,
+        technique: Dict,
+        subtitle_path: str,
+        preferred_times: Sequence[float],
+        matches: Optional[List[Dict]] = None
+    ) -> List[Optional[Dict]]:
+        """
+        批量为多个偏好时间点选择最接近的时间戳（一次向量化查询）
+
+        Args:
+            technique: 技术信息字典
+            subtitle_path: 字幕文件路径
+            preferred_times: 偏好的时间点列表（秒）
+            matches: 已匹配的结果（见 extract_timestamps_for_technique）
+
+        Returns:
+            与preferred_times一一对应的最佳时间戳信息（没有匹配时全为None）
+        """
+        matches = self.extract_timestamps_for_technique(technique, subtitle_path, matches)
+        if not matches:
+            return [None] * len(preferred_times)
+        if not len(preferred_times):
+            return []
+
+        nearest = self._nearest_matches(matches, preferred_times)
+        logger.info(f"  为{len(preferred_times)}个时间点选择了{len(set(nearest.tolist()))}个时间戳")
+        return [matches[i] for i in nearest.tolist()]
+
+    def select_best_timestamps(
+        self,
+        technique_matches: List[List[Dict]],
+        preferred_times: Sequence[Optional[float]]
+    ) -> List[Optional[Dict]]:
+        """
+        为多个技术各选一个最佳时间戳（策略同 find_best_timestamp）
+
+        有偏好时间的技术在自己的匹配中选择中间时间最接近的：所有技术的匹配按技术分组
+        放进一个 NearestTimes，一次 searchsorted 完成；没有偏好时间的选择第一个匹配。
+
+        Args:
+            technique_matches: 每个技术的匹配结果（见 extract_timestamps_for_technique）
+            preferred_times: 与技术一一对应的偏好时间（秒，None表示没有）
+
+        Returns:
+            与技术一一对应的最佳时间戳信息（没有匹配时为None）
+        """
+        best: List[Optional[Dict]] = [matches[0] if matches else None for matches in technique_matches]
+        queried = [
+            k for k, (matches, preferred_time) in enumerate(zip(technique_matches, preferred_times))
+            if matches and preferred_time is not None
+        ]
+        if not queried:
+            return best
+
+        mids = [m["mid_seconds"] for k in queried for m in technique_matches[k]]
+        groups = [k for k in queried for _ in technique_matches[k]]
+        offsets = dict(zip(queried, np.cumsum([0] + [len(technique_matches[k]) for k in queried]).tolist()))
+        nearest = NearestTimes(mids, groups)([preferred_times[k] for k in queried], queried)
+
+        for k, position in zip(queried, nearest.tolist()):
+            best[k] = technique_matches[k][position - offsets[k]]
+        logger.info(f"一次查询为{len(queried)}个技术选择了最接近偏好时间的时间戳")
+        return best
+
+    def _nearest_matches(self, matches: List[Dict], preferred_times: Union[float, Sequence[float]]) -> np.ndarray:
+        """中间时间最接近各偏好时间的匹配序号（距离相同时取靠前的匹配）"""
+        return NearestTimes([m["mid_seconds"] for m in matches])(preferred_times)
+
     def extract_all_techniques(
         self,
         techniques: List[Dict],
@@ -429,23 +323,35 @@ class TimestampExtractor:
         """
         logger.info(f"批量提取{len(techniques)}个技术的时间戳...")
 
-        results = []
-
+        # 字幕只解析一次，所有技术的关键词一次扫描，匹配结果按技术分组
+        index = self.load_index(subtitle_path)
+        matcher = KeywordMatcher.for_techniques(techniques)
+        owners = [k for k, technique in enumerate(techniques) for _ in technique.get("keywords", [])]
+        grouped: List[List[Tuple[int, int]]] = [[] for _ in techniques]
+        for cue_id, pattern_id in matcher.match_cues(index):
+            grouped[owners[pattern_id]].append((cue_id, pattern_id))
+        logger.info(f"字幕索引: {len(index)}个cue，{len(matcher)}个关键词一次扫描")
+
+        # 每个技术的匹配结果与偏好时间
+        technique_matches: List[List[Dict]] = []
+        preferred_times: List[Optional[float]] = []
         for i, technique in enumerate(techniques, 1):
             logger.info(f"\n{i}. {technique.get('name')}")
+            technique_matches.append(self.extract_timestamps_for_technique(
+                technique, subtitle_path, matches=matcher.search(index, grouped[i - 1])
+            ))
 
             # 如果有关键时刻，尝试使用关键时刻作为首选时间
             preferred_time = None
             if key_moments and i <= len(key_moments):
                 preferred_time = key_moments[i - 1].get("seconds")
+            preferred_times.append(preferred_time)
 
-            # 提取时间戳
-            timestamp_info = self.find_best_timestamp(
-                technique,
-                subtitle_path,
-                preferred_time
-            )
+        # 所有技术的最佳时间戳一次向量化查询
+        best = self.select_best_timestamps(technique_matches, preferred_times)
 
+        results = []
+        for technique, timestamp_info in zip(techniques, best):
             if timestamp_info:
                 results.append({
                     "technique_name": technique.get("name"),
@@ -456,9 +362,9 @@ class TimestampExtractor:
                     "mid_seconds": timestamp_info["mid_seconds"],
                     "keywords_matched": timestamp_info.get("keywords", [timestamp_info["keyword"]])
                 })
-                logger.success(f"  ✓ 找到时间戳: {timestamp_info['mid_seconds']:.2f}秒")
+                logger.success(f"  ✓ {technique.get('name')}: {timestamp_info['mid_seconds']:.2f}秒")
             else:
-                logger.warning(f"  ✗ 未找到时间戳")
+                logger.warning(f"  ✗ {technique.get('name')}: 未找到时间戳")
                 # 仍然添加到结果，但没有时间戳
                 results.append({
                     "technique_name": technique.get("name"),
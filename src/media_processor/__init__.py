@@ -1,5 +1,7 @@
 """媒体处理模块"""
 from .ffmpeg_wrapper import FFmpegWrapper
+from .job_executor import MediaJob, MediaJobExecutor, MediaJobResult
 from .processor import MediaProcessor
+from .pyav_backend import PyAVDecoder
 
-__all__ = ['FFmpegWrapper', 'MediaProcessor']
+__all__ = ['FFmpegWrapper', 'MediaJob', 'MediaJobExecutor', 'MediaJobResult', 'MediaProcessor', 'PyAVDecoder']
@@ -0,0 +1,205 @@
+"""媒体产物缓存 - 按源视频指纹和渲染参数寻址"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from loguru import logger
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from config import settings
+
+# 渲染命令变化时递增，使旧缓存全部失效
+CACHE_VERSION = 1
+
+# 源视频指纹读取的头尾字节数
+_FINGERPRINT_SAMPLE_BYTES = 1024 * 1024
+
+
+class MediaArtifactCache:
+    """
+    媒体产物缓存（截图/GIF）
+
+    键 = 源视频指纹（大小 + 修改时间 + 头尾各1MB的SHA1）+ 完整渲染参数。
+    命中时直接复制缓存文件，不调用FFmpeg；缓存文件的修改时间作为LRU时钟，
+    总大小超过上限时淘汰最久未使用的文件。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录，默认 settings.media_cache_dir 或 {temp_dir}/media_cache
+            max_bytes: 缓存总大小上限（字节），默认 settings.media_cache_max_mb
+        """
+        if cache_dir is None:
+            cache_dir = settings.media_cache_dir or str(Path(settings.temp_dir) / "media_cache")
+        if max_bytes is None:
+            max_bytes = settings.media_cache_max_mb * 1024 * 1024
+
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[Tuple[str, int, int], str] = {}
+
+    def fingerprint(self, video_path: str) -> str:
+        """
+        计算源视频指纹（进程内按路径+大小+修改时间缓存）
+
+        Args:
+            video_path: 视频文件路径
+
+        Returns:
+            指纹字符串
+        """
+        path = Path(video_path)
+        stat = path.stat()
+        memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            cached = self._fingerprints.get(memo_key)
+        if cached:
+            return cached
+
+        digest = hashlib.sha1()
+        digest.update(str(stat.st_size).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read(_FINGERPRINT_SAMPLE_BYTES))
+            if stat.st_size > _FINGERPRINT_SAMPLE_BYTES * 2:
+                f.seek(-_FINGERPRINT_SAMPLE_BYTES, os.SEEK_END)
+                digest.update(f.read(_FINGERPRINT_SAMPLE_BYTES))
+
+        value = f"{stat.st_size}-{stat.st_mtime_ns}-{digest.hexdigest()}"
+        with self._lock:
+            self._fingerprints[memo_key] = value
+        return value
+
+    def make_key(self, video_path: str, kind: str, params: Dict) -> str:
+        """
+        生成缓存键
+
+        Args:
+            video_path: 源视频路径
+            kind: 产物类型 (screenshot/gif)
+            params: 渲染参数（需可JSON序列化）
+
+        Returns:
+            SHA256十六进制键
+        """
+        payload = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "source": self.fingerprint(video_path),
+                "kind": kind,
+                "params": params
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str, suffix: str) -> Path:
+        """缓存文件路径（按键前两位分目录）"""
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """
+        查询缓存，命中则复制到输出路径
+
+        Args:
+            key: 缓存键
+            output_path: 输出文件路径
+
+        Returns:
+            是否命中
+        """
+        entry = self._entry_path(key, Path(output_path).suffix)
+
+        if not entry.exists():
+            with self._lock:
+                self.misses += 1
+            return False
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry, output_path)
+        # 刷新修改时间，作为LRU使用记录
+        os.utime(entry)
+
+        with self._lock:
+            self.hits += 1
+        logger.debug(f"缓存命中: {Path(output_path).name}")
+        return True
+
+    def store(self, key: str, source_path: str) -> None:
+        """
+        将生成的产物写入缓存，并按大小上限淘汰
+
+        Args:
+            key: 缓存键
+            source_path: 刚生成的产物文件
+        """
+        entry = self._entry_path(key, Path(source_path).suffix)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        # 先写临时文件再替换，避免并发读到半截文件
+        tmp_path = entry.with_name(f"{entry.name}.{threading.get_ident()}.tmp")
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, entry)
+
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        按LRU淘汰缓存文件直到总大小不超过上限
+
+        Returns:
+            淘汰的文件数
+        """
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*"):
+            if not path.is_file() or path.name.endswith(".tmp"):
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self.evictions += removed
+        logger.debug(f"缓存淘汰{removed}个文件，当前{total / 1024 / 1024:.1f} MB")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取命中统计
+
+        Returns:
+            {hits, misses, evictions} 字典
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
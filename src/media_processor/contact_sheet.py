@@ -0,0 +1,162 @@
+"""视频联系表（雪碧图） - 一次解码按固定间隔抽帧拼图，预览与时间戳核对只需裁剪"""
+import json
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 索引结构或抽帧方式变化时递增，使旧的联系表失效
+SHEET_VERSION = 1
+
+# 默认参数：每10秒一帧，160px宽的缩略图，每张10x10（约16分钟视频一张）
+SHEET_INTERVAL = 10.0
+SHEET_TILE_WIDTH = 160
+SHEET_COLUMNS = 10
+SHEET_ROWS = 10
+SHEET_QUALITY = 3
+
+# 联系表目录中的文件
+INDEX_FILE = "index.json"
+FRAMES_FILE = "frames.txt"
+SHEET_PATTERN = "sheet_%03d.jpg"
+
+# 进程内保持打开的联系表图片数
+_OPEN_SHEETS = 4
+
+
+def sheet_dir(video_path: str) -> Path:
+    """联系表目录（视频旁的 {视频文件名}.sheets/）"""
+    path = Path(video_path)
+    return path.with_name(f"{path.name}.sheets")
+
+
+def select_expr(interval: float) -> str:
+    """
+    按间隔抽帧的select表达式
+
+    每个 [k*interval, (k+1)*interval) 区间取第一帧，即 k*interval 处的截图
+    （与输入端 -ss 取到的帧相同）；fps滤镜取的是区间边界附近的最后一帧，不用它。
+    """
+    return f"isnan(prev_selected_t)+gte(floor(t/{interval}),floor(prev_selected_t/{interval})+1)"
+
+
+def parse_frame_times(text: str) -> List[float]:
+    """
+    解析 metadata=mode=print 输出的帧时间
+
+    Args:
+        text: 输出文本（每帧一行 "frame:N pts:P pts_time:T"，后跟元数据行）
+
+    Returns:
+        帧时间列表（秒）
+    """
+    times = []
+    for line in text.splitlines():
+        if not line.startswith("frame:"):
+            continue
+        for field in line.split():
+            if field.startswith("pts_time:"):
+                times.append(float(field.split(":", 1)[1]))
+    return times
+
+
+class ContactSheetIndex:
+    """
+    联系表索引
+
+    index.json 记录源视频的大小/修改时间、抽帧参数、联系表文件列表，
+    以及每一帧的实际时间和在联系表中的位置（sheet序号, x, y）。
+    nearest/crop 按时间二分查找最近的帧，裁剪结果即该时刻的缩略预览。
+    """
+
+    def __init__(self, data: Dict, directory: Path):
+        """
+        初始化索引
+
+        Args:
+            data: index.json 内容
+            directory: 联系表目录
+        """
+        self.data = data
+        self.directory = Path(directory)
+        self.times: List[float] = [frame["time"] for frame in data["frames"]]
+        self._sheets: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["ContactSheetIndex"]:
+        """读取目录中的索引（不存在或损坏时为None）"""
+        try:
+            with open(Path(directory) / INDEX_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != SHEET_VERSION or not data.get("frames"):
+            return None
+        return cls(data, directory)
+
+    def save(self) -> None:
+        """写入 index.json（先写临时文件再改名）"""
+        path = self.directory / INDEX_FILE
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(path)
+
+    def matches(self, size: int, mtime_ns: int) -> bool:
+        """索引是否对应当前视频文件（大小与修改时间一致）"""
+        return self.data.get("size") == size and self.data.get("mtime_ns") == mtime_ns
+
+    @property
+    def interval(self) -> float:
+        """抽帧间隔（秒）"""
+        return self.data["params"]["interval"]
+
+    @property
+    def end_time(self) -> float:
+        """索引覆盖的结束时间（最后一帧所在区间的末尾）"""
+        return self.times[-1] + self.interval
+
+    def nearest(self, timestamp: float) -> Dict:
+        """
+        距离目标时间最近的帧
+
+        Args:
+            timestamp: 时间（秒）
+
+        Returns:
+            帧条目 {time, sheet, x, y}
+        """
+        pos = bisect_left(self.times, timestamp)
+        candidates = [i for i in (pos - 1, pos) if 0 <= i < len(self.times)]
+        index = min(candidates, key=lambda i: abs(self.times[i] - timestamp))
+        return self.data["frames"][index]
+
+    def crop(self, timestamp: float) -> Any:
+        """
+        裁剪出距离目标时间最近的缩略帧
+
+        Args:
+            timestamp: 时间（秒）
+
+        Returns:
+            PIL图像（RGB）
+        """
+        frame = self.nearest(timestamp)
+        width, height = self.data["tile_width"], self.data["tile_height"]
+        sheet = self._sheet(frame["sheet"])
+        return sheet.crop((frame["x"], frame["y"], frame["x"] + width, frame["y"] + height))
+
+    def _sheet(self, number: int) -> Any:
+        """读取联系表图片（进程内保留最近使用的几张）"""
+        from PIL import Image
+
+        with self._lock:
+            sheet = self._sheets.pop(number, None)
+            if sheet is None:
+                with Image.open(self.directory / self.data["sheets"][number]) as image:
+                    sheet = image.convert("RGB")
+            self._sheets[number] = sheet
+            while len(self._sheets) > _OPEN_SHEETS:
+                self._sheets.pop(next(iter(self._sheets)))
+        return sheet
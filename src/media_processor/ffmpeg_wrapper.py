@@ -1,6 +1,8 @@
 """FFmpeg命令封装"""
+import asyncio
+import io
 import subprocess
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 from loguru import logger
 import sys
@@ -8,6 +10,14 @@ import sys
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from config import settings
+from src.media_processor.contact_sheet import FRAMES_FILE, SHEET_PATTERN, select_expr
+from src.media_processor.keyframe_index import KeyframeIndex
+from src.media_processor.probe_cache import probe_cache
+from src.media_processor.scene_index import SCENES_FILE
+from src.media_processor.progress import FFmpegProgressParser, ProgressTracker
+from src.media_processor.subprocess_runner import runner
+from src.media_processor.watermark_overlay import overlay_position, resolve_watermark_font
+from src.models.video import RenditionSpec, WatermarkSpec
 
 
 class FFmpegWrapper:
@@ -17,13 +27,23 @@ class FFmpegWrapper:
         """初始化FFmpeg包装器"""
         self.ffmpeg_path = "ffmpeg"
         self.ffprobe_path = "ffprobe"
+        # 每个FFmpeg进程的线程数（并行执行时由MediaJobExecutor分配，None表示FFmpeg自动）
+        self.threads: Optional[int] = None
+        # 视频元数据缓存（与VideoFetcher共用）
+        self.probe_cache = probe_cache
+        # 单条命令时限（秒，0为不限制），超时后终止整个进程组
+        self.timeout: Optional[float] = settings.media_timeout or None
+        # 进度汇总（批量执行时由MediaProcessor设置），设置后每条FFmpeg命令都输出 -progress
+        self.progress: Optional[ProgressTracker] = None
 
     def screenshot_command(
         self,
         video_path: str,
         timestamp: float,
         output_path: str,
-        quality: int = 2
+        quality: int = 2,
+        watermark: Optional[WatermarkSpec] = None,
+        keyframe_only: bool = False
     ) -> List[str]:
         """
         生成截图命令
@@ -33,21 +53,269 @@ class FFmpegWrapper:
             timestamp: 时间戳（秒）
             output_path: 输出文件路径
             quality: JPG质量（1-31，越小越好）
+            watermark: 水印参数（可选，在同一次编码中绘制）
+            keyframe_only: 只解码关键帧（时间戳已吸附到关键帧时使用）
 
         Returns:
             FFmpeg命令列表
         """
-        cmd = [
-            self.ffmpeg_path,
+        cmd = [self.ffmpeg_path]
+        if keyframe_only:
+            cmd.extend(["-skip_frame", "nokey"])
+        cmd += [
             "-ss", str(timestamp),
             "-i", video_path,
             "-vframes", "1",
+        ]
+        if watermark is not None:
+            cmd.extend(["-vf", self.drawtext_filter(watermark)])
+        cmd.extend([
             "-q:v", str(quality),
             "-y",  # 覆盖输出文件
             output_path
+        ])
+        return cmd
+
+    def frame_command(
+        self,
+        video_path: str,
+        timestamp: float,
+        keyframe_only: bool = False
+    ) -> List[str]:
+        """
+        生成单帧解码命令（与 screenshot_command 取同一帧，以PPM格式输出到stdout）
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间戳（秒）
+            keyframe_only: 只解码关键帧（时间戳已吸附到关键帧时使用）
+
+        Returns:
+            FFmpeg命令列表
+        """
+        cmd = [self.ffmpeg_path]
+        if keyframe_only:
+            cmd.extend(["-skip_frame", "nokey"])
+        cmd += [
+            "-ss", str(timestamp),
+            "-i", video_path,
+            "-vframes", "1",
+            "-f", "image2pipe",
+            "-c:v", "ppm",
+            "-"
         ]
         return cmd
 
+    def read_frame(self, video_path: str, timestamp: float, keyframe_only: bool = False) -> Any:
+        """
+        解码一帧到内存（stdout为图像数据，不输出 -progress）
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间戳（秒）
+            keyframe_only: 只解码关键帧
+
+        Returns:
+            RGB帧（NumPy数组，形状 H x W x 3）
+        """
+        import numpy as np
+        from PIL import Image
+
+        cmd = self._with_thread_limit(self.frame_command(video_path, timestamp, keyframe_only))
+        result = runner.run(cmd, timeout=self.timeout, text=False, operation="screenshot")
+        if not result.stdout:
+            raise Exception(f"解码失败: {timestamp:.3f}秒没有视频帧")
+        with Image.open(io.BytesIO(result.stdout)) as image:
+            return np.asarray(image.convert("RGB"))
+
+    def multi_screenshot_command(
+        self,
+        video_path: str,
+        timestamps: List[float],
+        output_paths: List[str],
+        quality: int = 2,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> List[str]:
+        """
+        生成单进程多截图命令（一次解码输出多张截图）
+
+        以最早的时间戳为输入端seek点，向后解码一次，
+        通过split+trim为每个时间戳各取一帧输出到对应文件。
+
+        Args:
+            video_path: 视频文件路径
+            timestamps: 时间戳列表（秒，需已升序排列）
+            output_paths: 与时间戳一一对应的输出文件路径
+            quality: JPG质量（1-31，越小越好）
+            watermark: 水印参数（可选，只绘制在被选中的帧上）
+
+        Returns:
+            FFmpeg命令列表
+        """
+        if not timestamps or len(timestamps) != len(output_paths):
+            raise ValueError("时间戳与输出路径数量必须一致且不为空")
+
+        seek_point = timestamps[0]
+        count = len(timestamps)
+
+        # 每个分支裁掉seek点之后的偏移量，只放行一帧后立即结束该分支，
+        # 避免已完成的分支继续对后续帧做像素格式转换
+        drawtext = f",{self.drawtext_filter(watermark)}" if watermark is not None else ""
+        branches = [f"[0:v]split={count}" + "".join(f"[s{i}]" for i in range(count))]
+        for i, timestamp in enumerate(timestamps):
+            offset = max(0.0, timestamp - seek_point)
+            branches.append(
+                f"[s{i}]trim=start={offset:.3f},trim=end_frame=1,"
+                f"setpts=PTS-STARTPTS{drawtext}[o{i}]"
+            )
+        filter_complex = ";".join(branches)
+
+        cmd = [
+            self.ffmpeg_path,
+            "-ss", str(seek_point),
+            "-i", video_path,
+            "-filter_complex", filter_complex,
+        ]
+        for i, output_path in enumerate(output_paths):
+            cmd.extend([
+                "-map", f"[o{i}]",
+                "-frames:v", "1",
+                "-q:v", str(quality),
+                "-y",
+                output_path
+            ])
+        return cmd
+
+    @staticmethod
+    def chunk_timestamps(
+        timestamps: List[float],
+        max_gap: float = 10.0,
+        max_size: int = 16,
+        keyframes: Optional[KeyframeIndex] = None,
+        reseek_cost: float = 1.0
+    ) -> List[List[int]]:
+        """
+        将时间戳按时间顺序分组，供单进程多截图使用
+
+        有关键帧索引时：继续顺序解码的代价是相邻间隔，重新seek的代价是
+        下一个时间戳的预解码距离加上reseek_cost（进程启动/打开文件，折算为秒），
+        取代价小者。无索引时按max_gap（约一个GOP）判断。
+        每组数量不超过max_size，避免滤镜图过大。
+
+        Args:
+            timestamps: 时间戳列表（任意顺序）
+            max_gap: 无关键帧索引时组内相邻时间戳的最大间隔（秒）
+            max_size: 每组最多时间戳数量
+            keyframes: 关键帧索引（可选）
+            reseek_cost: 重新seek的固定开销（秒）
+
+        Returns:
+            分组列表，每组为原列表中的索引（组内按时间升序）
+        """
+        order = sorted(range(len(timestamps)), key=lambda i: timestamps[i])
+
+        chunks: List[List[int]] = []
+        for index in order:
+            if chunks and len(chunks[-1]) < max_size:
+                gap = timestamps[index] - timestamps[chunks[-1][-1]]
+                if keyframes is not None and len(keyframes):
+                    limit = keyframes.decode_ahead(timestamps[index]) + reseek_cost
+                else:
+                    limit = max_gap
+                if gap <= limit:
+                    chunks[-1].append(index)
+                    continue
+            chunks.append([index])
+        return chunks
+
+    @staticmethod
+    def merge_windows(
+        windows: List[Tuple[float, float]],
+        max_gap: float = 0.0,
+        max_size: int = 8
+    ) -> List[List[int]]:
+        """
+        将重叠（或间隔不超过max_gap）的时间窗口合并，供一次解码生成多个片段
+
+        Args:
+            windows: (start_time, duration) 列表（任意顺序）
+            max_gap: 允许合并的最大间隔（秒），0表示只合并重叠或相接的窗口
+            max_size: 每组最多窗口数量，避免滤镜图过大
+
+        Returns:
+            分组列表，每组为原列表中的索引（组内按开始时间升序）
+        """
+        order = sorted(range(len(windows)), key=lambda i: windows[i][0])
+
+        groups: List[List[int]] = []
+        group_end = 0.0
+        for index in order:
+            start, duration = windows[index]
+            if groups and len(groups[-1]) < max_size and start - group_end <= max_gap:
+                groups[-1].append(index)
+                group_end = max(group_end, start + duration)
+                continue
+            groups.append([index])
+            group_end = start + duration
+        return groups
+
+    def window_gif_command(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        windows: List[Tuple[float, float]],
+        output_paths: List[str],
+        width: int = 480,
+        fps: int = 10,
+        watermark: Optional[WatermarkSpec] = None,
+        colors: int = 256
+    ) -> List[str]:
+        """
+        生成合并窗口GIF命令（解码一次合并后的区间，split后按窗口trim出各个GIF）
+
+        每个分支的滤镜链与 gif_command 合并调色板模式一致，输出相同。
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 合并区间开始时间（秒）
+            duration: 合并区间时长（秒）
+            windows: 各GIF在区间内的 (偏移, 时长) 列表
+            output_paths: 与窗口对应的输出路径
+            width: 宽度（像素）
+            fps: 帧率
+            watermark: 水印参数（可选）
+            colors: 调色板颜色数
+
+        Returns:
+            命令列表
+        """
+        if len(windows) != len(output_paths) or not windows:
+            raise ValueError("windows与output_paths数量必须一致且不为空")
+
+        drawtext = f",{self.drawtext_filter(watermark)}" if watermark is not None else ""
+        palettegen = f"palettegen=max_colors={colors}" if colors < 256 else "palettegen"
+        labels = "".join(f"[v{i}]" for i in range(len(windows)))
+        graph = [f"[0:v]split={len(windows)}{labels}"]
+        outputs: List[str] = []
+
+        for i, ((offset, clip_duration), output_path) in enumerate(zip(windows, output_paths)):
+            graph.append(
+                f"[v{i}]trim=start={offset:.3f}:duration={clip_duration:.3f},setpts=PTS-STARTPTS,"
+                f"fps={fps},scale={width}:-1:flags=lanczos{drawtext},split[a{i}][b{i}];"
+                f"[a{i}]{palettegen}[p{i}];[b{i}][p{i}]paletteuse[o{i}]"
+            )
+            outputs += ["-map", f"[o{i}]", "-y", output_path]
+
+        return [
+            self.ffmpeg_path,
+            "-ss", str(start_time),
+            "-t", str(duration),
+            "-i", video_path,
+            "-filter_complex", ";".join(graph),
+            *outputs
+        ]
+
     def gif_command(
         self,
         video_path: str,
@@ -56,7 +324,10 @@ class FFmpegWrapper:
         output_path: str,
         width: int = 480,
         fps: int = 10,
-        use_palette: bool = True
+        use_palette: bool = True,
+        fused_palette: bool = False,
+        watermark: Optional[WatermarkSpec] = None,
+        colors: int = 256
     ) -> Tuple[List[str], Optional[List[str]]]:
         """
         生成GIF命令（支持调色板优化）
@@ -69,11 +340,33 @@ class FFmpegWrapper:
             width: 宽度（像素）
             fps: 帧率
             use_palette: 是否使用调色板优化
+            fused_palette: 调色板生成与应用是否合并到同一滤镜图（单进程、单次解码、无临时文件）
+            watermark: 水印参数（可选，缩放后、调色板生成前绘制，水印颜色计入调色板）
+            colors: 调色板颜色数（2-256）
 
         Returns:
-            (主命令, 调色板命令) 元组，如果不使用调色板则第二项为None
+            (主命令, 调色板命令) 元组，如果不使用调色板或合并调色板则第二项为None
         """
-        if use_palette:
+        drawtext = f",{self.drawtext_filter(watermark)}" if watermark is not None else ""
+        scale_chain = f"fps={fps},scale={width}:-1:flags=lanczos{drawtext}"
+        palettegen = f"palettegen=max_colors={colors}" if colors < 256 else "palettegen"
+
+        if use_palette and fused_palette:
+            # 单步法：split后一路生成调色板，另一路等待调色板后量化
+            gif_cmd = [
+                self.ffmpeg_path,
+                "-ss", str(start_time),
+                "-t", str(duration),
+                "-i", video_path,
+                "-filter_complex",
+                f"{scale_chain},split[a][b];"
+                f"[a]{palettegen}[p];[b][p]paletteuse",
+                "-y",
+                output_path
+            ]
+
+            return gif_cmd, None
+        elif use_palette:
             # 两步法：先生成调色板，再生成GIF
             palette_path = output_path.replace(".gif", "_palette.png")
 
@@ -83,7 +376,7 @@ class FFmpegWrapper:
                 "-ss", str(start_time),
                 "-t", str(duration),
                 "-i", video_path,
-                "-vf", f"fps={fps},scale={width}:-1:flags=lanczos,palettegen",
+                "-vf", f"{scale_chain},{palettegen}",
                 "-y",
                 palette_path
             ]
@@ -95,7 +388,7 @@ class FFmpegWrapper:
                 "-t", str(duration),
                 "-i", video_path,
                 "-i", palette_path,
-                "-filter_complex", f"fps={fps},scale={width}:-1:flags=lanczos[x];[x][1:v]paletteuse",
+                "-filter_complex", f"{scale_chain}[x];[x][1:v]paletteuse",
                 "-y",
                 output_path
             ]
@@ -108,13 +401,260 @@ class FFmpegWrapper:
                 "-ss", str(start_time),
                 "-t", str(duration),
                 "-i", video_path,
-                "-vf", f"fps={fps},scale={width}:-1",
+                "-vf", f"fps={fps},scale={width}:-1{drawtext}",
                 "-y",
                 output_path
             ]
 
             return gif_cmd, None
 
+    def rendition_command(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        renditions: List[RenditionSpec],
+        output_paths: List[str],
+        watermark: Optional[WatermarkSpec] = None
+    ) -> List[str]:
+        """
+        生成多规格输出命令（一次解码，split后每个分支独立缩放/编码）
+
+        GIF分支在分支内生成并应用调色板；MP4分支输出H.264（yuv420p，无音频）。
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            renditions: 输出规格列表（GIF的max_bytes需事先换算为具体参数）
+            output_paths: 与规格对应的输出路径
+            watermark: 水印参数（可选，每个分支缩放后绘制）
+
+        Returns:
+            命令列表
+        """
+        if len(renditions) != len(output_paths) or not renditions:
+            raise ValueError("renditions与output_paths数量必须一致且不为空")
+
+        drawtext = f",{self.drawtext_filter(watermark)}" if watermark is not None else ""
+        labels = "".join(f"[v{i}]" for i in range(len(renditions)))
+        graph = [f"[0:v]split={len(renditions)}{labels}"]
+        outputs: List[str] = []
+
+        for i, (spec, output_path) in enumerate(zip(renditions, output_paths)):
+            fps = f"fps={spec.fps}," if spec.fps else ""
+            if spec.format == "gif":
+                palettegen = f"palettegen=max_colors={spec.colors}" if spec.colors < 256 else "palettegen"
+                graph.append(
+                    f"[v{i}]{fps}scale={spec.width}:-1:flags=lanczos{drawtext},split[a{i}][b{i}];"
+                    f"[a{i}]{palettegen}[p{i}];[b{i}][p{i}]paletteuse[o{i}]"
+                )
+                outputs += ["-map", f"[o{i}]", "-y", output_path]
+            elif spec.format == "mp4":
+                # 宽高需为偶数
+                graph.append(f"[v{i}]{fps}scale={spec.width}:-2:flags=lanczos{drawtext},format=yuv420p[o{i}]")
+                outputs += [
+                    "-map", f"[o{i}]",
+                    "-c:v", "libx264",
+                    "-preset", spec.preset,
+                    "-crf", str(spec.crf),
+                    "-an",
+                    "-y", output_path
+                ]
+            else:
+                raise ValueError(f"不支持的输出格式: {spec.format}")
+
+        return [
+            self.ffmpeg_path,
+            "-ss", str(start_time),
+            "-t", str(duration),
+            "-i", video_path,
+            "-filter_complex", ";".join(graph),
+            *outputs
+        ]
+
+    def contact_sheet_command(
+        self,
+        video_path: str,
+        interval: float,
+        tile_width: int,
+        columns: int,
+        rows: int,
+        quality: int = 3
+    ) -> List[str]:
+        """
+        生成联系表命令（一次解码，按间隔抽帧缩放后拼成 columns x rows 的图片）
+
+        输出为相对路径（SHEET_PATTERN 联系表图片、FRAMES_FILE 每帧实际时间），
+        需在联系表目录中执行（run_command 的 cwd），滤镜参数中不必转义路径。
+
+        Args:
+            video_path: 视频文件路径（绝对路径）
+            interval: 抽帧间隔（秒）
+            tile_width: 缩略图宽度（像素）
+            columns: 每张联系表的列数
+            rows: 每张联系表的行数
+            quality: JPG质量（1-31，越小越好）
+
+        Returns:
+            FFmpeg命令列表
+        """
+        filters = (
+            f"select='{select_expr(interval)}',"
+            f"metadata=mode=add:key=sheet:value=1,"
+            f"metadata=mode=print:file={FRAMES_FILE},"
+            f"scale={tile_width}:-2:flags=bicubic,"
+            f"tile={columns}x{rows}"
+        )
+        return [
+            self.ffmpeg_path,
+            "-i", video_path,
+            "-vf", filters,
+            "-an",
+            "-fps_mode", "vfr",
+            "-q:v", str(quality),
+            "-y",
+            SHEET_PATTERN
+        ]
+
+    def scene_command(self, video_path: str, threshold: float, width: int = 160) -> List[str]:
+        """
+        生成镜头切换检测命令（低分辨率下计算场景分数，不输出视频）
+
+        切点写入相对路径 SCENES_FILE，需在临时目录中执行（run_command 的 cwd）。
+
+        Args:
+            video_path: 视频文件路径（绝对路径）
+            threshold: 场景分数阈值（0-1）
+            width: 检测分辨率宽度（像素）
+
+        Returns:
+            FFmpeg命令列表
+        """
+        filters = (
+            f"scale={width}:-2:flags=fast_bilinear,"
+            f"select='gt(scene,{threshold})',"
+            f"metadata=mode=print:file={SCENES_FILE}"
+        )
+        return [
+            self.ffmpeg_path,
+            "-i", video_path,
+            "-vf", filters,
+            "-an",
+            "-f", "null",
+            "-"
+        ]
+
+    def clip_copy_command(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: str,
+        inband_headers: bool = False
+    ) -> List[str]:
+        """
+        生成流复制剪辑命令（不解码不编码，起点应为关键帧）
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒，非关键帧时实际从前一个关键帧开始）
+            duration: 持续时长（秒）
+            output_path: 输出文件路径
+            inband_headers: 是否把H.264参数集写入码流（拼接不同编码参数的片段时需要）
+
+        Returns:
+            命令列表
+        """
+        cmd = [
+            self.ffmpeg_path,
+            "-ss", str(start_time),
+            "-i", video_path,
+            "-t", str(duration),
+            "-map", "0:v:0",
+            "-an",
+            "-c", "copy",
+            "-avoid_negative_ts", "make_zero"
+        ]
+        if inband_headers:
+            cmd += ["-bsf:v", "h264_mp4toannexb"]
+        return cmd + ["-y", output_path]
+
+    def clip_encode_command(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: str,
+        encoder: str = "libx264",
+        crf: int = 18,
+        preset: str = "veryfast",
+        pix_fmt: Optional[str] = None,
+        inband_headers: bool = False,
+        width: Optional[int] = None
+    ) -> List[str]:
+        """
+        生成重新编码剪辑命令（帧精确）
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            output_path: 输出文件路径
+            encoder: 视频编码器
+            crf: 质量参数
+            preset: 编码速度预设
+            pix_fmt: 像素格式（可选，与源一致便于拼接）
+            inband_headers: 是否在每个关键帧重复写入参数集（仅libx264，拼接时需要）
+            width: 缩放到的宽度（可选，默认保持源分辨率）
+
+        Returns:
+            命令列表
+        """
+        cmd = [
+            self.ffmpeg_path,
+            "-ss", str(start_time),
+            "-i", video_path,
+            "-t", str(duration),
+            "-map", "0:v:0",
+            "-an"
+        ]
+        if width:
+            # 宽高需为偶数
+            cmd += ["-vf", f"scale={width}:-2:flags=lanczos"]
+        cmd += [
+            "-c:v", encoder,
+            "-preset", preset,
+            "-crf", str(crf)
+        ]
+        if pix_fmt:
+            cmd += ["-pix_fmt", pix_fmt]
+        if inband_headers:
+            cmd += ["-x264-params", "repeat-headers=1"]
+        return cmd + ["-y", output_path]
+
+    def concat_command(self, list_path: str, output_path: str) -> List[str]:
+        """
+        生成拼接命令（concat demuxer，流复制）
+
+        Args:
+            list_path: 片段列表文件（每行 file '路径'）
+            output_path: 输出文件路径
+
+        Returns:
+            命令列表
+        """
+        return [
+            self.ffmpeg_path,
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            "-movflags", "+faststart",
+            "-y",
+            output_path
+        ]
+
     def watermark_command(
         self,
         input_path: str,
@@ -122,7 +662,8 @@ class FFmpegWrapper:
         text: str,
         position: str = "bottom-left",
         font_size: int = 16,
-        opacity: float = 0.7
+        opacity: float = 0.7,
+        overlay_path: Optional[str] = None
     ) -> List[str]:
         """
         生成水印命令
@@ -134,21 +675,99 @@ class FFmpegWrapper:
             position: 位置（bottom-left, bottom-right等）
             font_size: 字体大小
             opacity: 不透明度（0.0-1.0）
+            overlay_path: 预渲染的水印叠加层PNG（可选，见 WatermarkOverlayCache；
+                设置后用overlay滤镜叠加，不再逐帧drawtext）
+
+        Returns:
+            FFmpeg命令列表
+        """
+        if overlay_path is not None:
+            return self.batch_watermark_command([input_path], [output_path], overlay_path, position)
+
+        drawtext_filter = self.drawtext_filter(
+            WatermarkSpec(
+                text=text,
+                position=position,
+                font_size=font_size,
+                opacity=opacity
+            )
+        )
+
+        cmd = [
+            self.ffmpeg_path,
+            "-i", input_path,
+            "-vf", drawtext_filter,
+            "-y",
+            output_path
+        ]
+        return cmd
+
+    def batch_watermark_command(
+        self,
+        input_paths: List[str],
+        output_paths: List[str],
+        overlay_path: str,
+        position: str = "bottom-left"
+    ) -> List[str]:
+        """
+        生成批量水印命令（一个FFmpeg进程处理多个文件，共用一个叠加层输入）
+
+        滤镜图：叠加层split为N路，分别overlay到每个输入上，各自输出。
+        叠加层为单帧图片，overlay在其结束后重复最后一帧，GIF每一帧都会叠加。
+
+        Args:
+            input_paths: 输入文件路径列表（图片或GIF，宽度应与叠加层渲染宽度一致）
+            output_paths: 与输入一一对应的输出路径
+            overlay_path: 预渲染的水印叠加层PNG
+            position: 位置（bottom-left, bottom-right等）
 
         Returns:
             FFmpeg命令列表
         """
+        if len(input_paths) != len(output_paths) or not input_paths:
+            raise ValueError("input_paths与output_paths数量必须一致且不为空")
+
+        count = len(input_paths)
+        x_pos, y_pos = overlay_position(position)
+        # format=auto: RGB/调色板输入（GIF）保持RGB叠加，不降为yuv420
+        overlay = f"overlay=x={x_pos}:y={y_pos}:format=auto"
+
+        if count == 1:
+            filters = [f"[0:v][1:v]{overlay}[o0]"]
+        else:
+            labels = "".join(f"[w{i}]" for i in range(count))
+            filters = [f"[{count}:v]split={count}{labels}"]
+            filters.extend(f"[{i}:v][w{i}]{overlay}[o{i}]" for i in range(count))
+
+        cmd = [self.ffmpeg_path]
+        for input_path in input_paths:
+            cmd.extend(["-i", input_path])
+        cmd.extend(["-i", overlay_path, "-filter_complex", ";".join(filters)])
+        for i, output_path in enumerate(output_paths):
+            cmd.extend(["-map", f"[o{i}]", "-y", output_path])
+        return cmd
+
+    def drawtext_filter(self, watermark: WatermarkSpec) -> str:
+        """
+        构建水印drawtext滤镜，可直接拼接到截图/GIF的滤镜链中
+
+        Args:
+            watermark: 水印参数
+
+        Returns:
+            drawtext滤镜字符串
+        """
         # 计算位置参数
-        if position == "bottom-left":
+        if watermark.position == "bottom-left":
             x_pos = "10"
             y_pos = "h-th-10"
-        elif position == "bottom-right":
+        elif watermark.position == "bottom-right":
             x_pos = "w-tw-10"
             y_pos = "h-th-10"
-        elif position == "top-left":
+        elif watermark.position == "top-left":
             x_pos = "10"
             y_pos = "10"
-        elif position == "top-right":
+        elif watermark.position == "top-right":
             x_pos = "w-tw-10"
             y_pos = "10"
         else:
@@ -156,45 +775,195 @@ class FFmpegWrapper:
             x_pos = "10"
             y_pos = "h-th-10"
 
-        # 构建drawtext滤镜
-        drawtext_filter = (
-            f"drawtext=text='{text}':"
-            f"fontsize={font_size}:"
-            f"fontcolor=white@{opacity}:"
+        # 与预渲染叠加层使用同一个字体文件
+        font_path = resolve_watermark_font()
+        fontfile = f"fontfile='{font_path}':" if font_path else ""
+        return (
+            f"drawtext=text='{watermark.text}':"
+            f"{fontfile}"
+            f"fontsize={watermark.font_size}:"
+            f"fontcolor=white@{watermark.opacity}:"
             f"x={x_pos}:"
             f"y={y_pos}"
         )
 
-        cmd = [
-            self.ffmpeg_path,
-            "-i", input_path,
-            "-vf", drawtext_filter,
-            "-y",
-            output_path
-        ]
-        return cmd
+    def run_command(
+        self,
+        cmd: List[str],
+        check: bool = True,
+        timeout: Optional[float] = None,
+        progress: Optional[Callable[[Dict], None]] = None,
+        operation: str = "ffmpeg",
+        cwd: Optional[str] = None
+    ) -> subprocess.CompletedProcess:
+        """
+        执行FFmpeg命令（受管子进程：超时/取消时终止进程组，stderr只保留尾部）
+
+        Args:
+            cmd: 命令列表
+            check: 是否检查返回码
+            timeout: 时限（秒），默认使用 self.timeout
+            progress: 进度回调，运行期间接收 {frame, fps, speed, out_time, progress} 快照
+            operation: 操作类型（资源记录标签，如 screenshot/gif/watermark）
+            cwd: 工作目录（可选，命令中使用相对路径时设置）
 
-    def run_command(self, cmd: List[str], check: bool = True) -> subprocess.CompletedProcess:
+        Returns:
+            子进程结果
+        """
+        cmd, on_line, finish = self._prepare_command(cmd, progress)
+        try:
+            return runner.run(
+                cmd, timeout=timeout or self.timeout, check=check, on_stdout_line=on_line,
+                operation=operation, cwd=cwd
+            )
+        finally:
+            finish()
+
+    async def run_command_async(
+        self,
+        cmd: List[str],
+        check: bool = True,
+        timeout: Optional[float] = None,
+        progress: Optional[Callable[[Dict], None]] = None,
+        operation: str = "ffmpeg",
+        threads: Optional[int] = None,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> subprocess.CompletedProcess:
         """
-        执行FFmpeg命令
+        run_command 的asyncio版本
 
         Args:
             cmd: 命令列表
             check: 是否检查返回码
+            timeout: 时限（秒），默认使用 self.timeout
+            progress: 进度回调
+            operation: 操作类型（资源记录标签）
+            threads: FFmpeg线程数（默认使用 self.threads）
+            semaphore: 并发上限（可选）
 
         Returns:
             子进程结果
         """
+        cmd, on_line, finish = self._prepare_command(cmd, progress, threads)
+        try:
+            return await runner.run_async(
+                cmd, timeout=timeout or self.timeout, check=check, on_stdout_line=on_line,
+                operation=operation, semaphore=semaphore
+            )
+        finally:
+            finish()
+
+    def _prepare_command(
+        self,
+        cmd: List[str],
+        progress: Optional[Callable[[Dict], None]] = None,
+        threads: Optional[int] = None
+    ) -> Tuple[List[str], Optional[Callable[[str], None]], Callable[[], None]]:
+        """
+        加上线程限制与 -progress 输出，返回 (命令, stdout逐行回调, 结束回调)
+
+        未设置进度回调与 self.progress 时不输出 -progress（逐行回调为None）。
+        """
+        cmd = self._with_thread_limit(cmd, threads)
+        tracker = self.progress
+        if (progress is None and tracker is None) or not cmd or cmd[0] != self.ffmpeg_path:
+            logger.debug(f"执行命令: {' '.join(cmd)}")
+            return cmd, None, lambda: None
+
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + cmd[1:]
         logger.debug(f"执行命令: {' '.join(cmd)}")
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=check
-        )
+        parser = FFmpegProgressParser()
+        job_id = tracker.start(Path(cmd[-1]).name) if tracker is not None else None
+
+        def on_line(line: str) -> None:
+            snapshot = parser.feed(line)
+            if snapshot is None:
+                return
+            if progress is not None:
+                progress(snapshot)
+            if tracker is not None:
+                tracker.update(job_id, snapshot)
+
+        def finish() -> None:
+            if tracker is not None:
+                tracker.finish(job_id)
+
+        return cmd, on_line, finish
+
+    def _with_thread_limit(self, cmd: List[str], threads: Optional[int] = None) -> List[str]:
+        """
+        为FFmpeg命令加上线程数限制（解码与滤镜线程）
+
+        Args:
+            cmd: 命令列表
+            threads: 线程数（默认使用 self.threads）
+
+        Returns:
+            加上-threads/-filter_threads后的命令列表
+        """
+        threads = threads or self.threads
+        if not threads or not cmd or cmd[0] != self.ffmpeg_path:
+            return cmd
+
+        threads = str(threads)
+        return [cmd[0], "-threads", threads, "-filter_threads", threads] + cmd[1:]
+
+    def probe(self, video_path: str, keyframes: bool = False, persist: Optional[bool] = None) -> dict:
+        """
+        获取视频元数据（共享缓存，每个视频只探测一次）
+
+        Args:
+            video_path: 视频文件路径
+            keyframes: 是否需要关键帧时间
+            persist: 是否读写视频旁的持久化文件（默认按缓存配置）
+
+        Returns:
+            元数据字典（见 VideoProbeCache.probe）
+        """
+        return self.probe_cache.probe(video_path, keyframes=keyframes, persist=persist)
+
+    def keyframe_index(self, video_path: str, probe: bool = True) -> Optional[KeyframeIndex]:
+        """
+        获取视频关键帧索引（基于共享元数据缓存）
+
+        Args:
+            video_path: 视频文件路径
+            probe: 尚未探测关键帧时是否运行ffprobe（False时只使用已缓存的索引）
+
+        Returns:
+            KeyframeIndex对象，无法探测或未缓存时为None
+        """
+        try:
+            if probe:
+                return KeyframeIndex.from_probe(self.probe(video_path, keyframes=True))
+            data = self.probe_cache.cached(video_path)
+            if data is None or data.get("keyframe_times") is None:
+                return None
+            return KeyframeIndex.from_probe(data)
+        except Exception as e:
+            logger.debug(f"无法获取关键帧索引: {e}")
+            return None
+
+    def plan_seek(self, video_path: str, timestamp: float, fast: bool = False) -> Optional[dict]:
+        """
+        规划seek位置并计算预解码距离
+
+        精确模式下ffmpeg自行seek，索引只用于报告预解码距离，因此只使用已缓存的索引；
+        快速模式需要关键帧位置，必要时探测。
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 请求的时间（秒）
+            fast: 快速模式，吸附到最近的关键帧
 
-        return result
+        Returns:
+            seek计划字典（见 KeyframeIndex.plan_seek），无关键帧索引时为None
+        """
+        index = self.keyframe_index(video_path, probe=fast)
+        if index is None or not len(index):
+            return None
+        return index.plan_seek(timestamp, fast=fast)
 
     def get_video_duration(self, video_path: str) -> float:
         """
@@ -206,22 +975,7 @@ class FFmpegWrapper:
         Returns:
             时长（秒）
         """
-        cmd = [
-            self.ffprobe_path,
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            video_path
-        ]
-
-        result = self.run_command(cmd, check=False)
-
-        if result.returncode == 0:
-            duration = float(result.stdout.strip())
-            return duration
-        else:
-            raise Exception(f"获取视频时长失败: {result.stderr}")
+        return self.probe(video_path)["duration"]
 
     def get_video_info(self, video_path: str) -> dict:
         """
@@ -231,24 +985,6 @@ class FFmpegWrapper:
             video_path: 视频文件路径
 
         Returns:
-            视频信息字典
+            视频流信息字典（包含width、height、duration等）
         """
-        cmd = [
-            self.ffprobe_path,
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height,duration",
-            "-of", "json",
-            video_path
-        ]
-
-        result = self.run_command(cmd, check=False)
-
-        if result.returncode == 0:
-            import json
-            data = json.loads(result.stdout)
-            if "streams" in data and len(data["streams"]) > 0:
-                return data["streams"][0]
-            return {}
-        else:
-            raise Exception(f"获取视频信息失败: {result.stderr}")
+        return self.probe(video_path)["video"]
@@ -0,0 +1,114 @@
+"""按字节预算规划GIF参数 - 低分辨率试编码估算体积"""
+import math
+from typing import Dict, List, Tuple
+
+# 微信公众号GIF上限为2MB，留出余量
+WECHAT_GIF_MAX_BYTES = int(1.8 * 1024 * 1024)
+
+# 试编码参数：宽度越小越便宜，160px足以反映画面复杂度
+TRIAL_WIDTH = 160
+
+# 体积随宽度按 (w1/w0)^1.6 增长：像素数按平方增长，但大尺寸下相邻像素更相似、
+# LZW压缩更好（实测在1.5左右，取1.6偏保守）
+WIDTH_EXPONENT = 1.6
+
+# 估算误差余量：估算值不超过预算的该比例才视为可行
+SAFETY_MARGIN = 0.92
+
+# 候选参数 (宽度, 帧率, 颜色数)，按画质从高到低排列：优先保宽度，其次帧率，最后颜色数
+GIF_BUDGET_LADDER: List[Tuple[int, int, int]] = [
+    (width, fps, colors)
+    for width in (480, 400, 360, 320, 280, 240)
+    for fps in (10, 8, 6, 5)
+    for colors in (256, 128, 64)
+]
+
+
+def estimate_gif_bytes(
+    trial_bytes: int,
+    trial_width: int,
+    trial_fps: int,
+    width: int,
+    fps: int,
+    colors: int = 256,
+    trial_colors: int = 256
+) -> int:
+    """
+    由试编码体积估算目标参数下的GIF体积
+
+    体积近似与帧率成正比、与宽度的WIDTH_EXPONENT次方成正比、
+    与每像素索引位数 log2(colors) 成正比。
+
+    Args:
+        trial_bytes: 试编码GIF体积（字节）
+        trial_width: 试编码宽度
+        trial_fps: 试编码帧率
+        width: 目标宽度
+        fps: 目标帧率
+        colors: 目标颜色数
+        trial_colors: 试编码颜色数
+
+    Returns:
+        估算体积（字节）
+    """
+    scale = (
+        (fps / trial_fps)
+        * (width / trial_width) ** WIDTH_EXPONENT
+        * (math.log2(colors) / math.log2(trial_colors))
+    )
+    return int(trial_bytes * scale)
+
+
+def plan_gif_budget(
+    trial_bytes: int,
+    trial_width: int,
+    trial_fps: int,
+    max_bytes: int = WECHAT_GIF_MAX_BYTES,
+    max_width: int = 480,
+    max_fps: int = 10
+) -> Dict:
+    """
+    选择不超过字节预算的最高画质参数
+
+    Args:
+        trial_bytes: 试编码GIF体积（字节）
+        trial_width: 试编码宽度
+        trial_fps: 试编码帧率
+        max_bytes: 字节预算
+        max_width: 宽度上限
+        max_fps: 帧率上限
+
+    Returns:
+        参数字典，包含：
+        - width / fps / colors: 选定参数
+        - estimated_bytes: 估算体积
+        - fits: 估算体积是否在预算内（全部候选都超出时为False，返回最小候选）
+    """
+    candidates = [
+        (width, fps, colors)
+        for width, fps, colors in GIF_BUDGET_LADDER
+        if width <= max_width and fps <= max_fps
+    ] or [GIF_BUDGET_LADDER[-1]]
+
+    for width, fps, colors in candidates:
+        estimated = estimate_gif_bytes(trial_bytes, trial_width, trial_fps, width, fps, colors)
+        if estimated <= max_bytes * SAFETY_MARGIN:
+            return {
+                "width": width,
+                "fps": fps,
+                "colors": colors,
+                "estimated_bytes": estimated,
+                "fits": True
+            }
+
+    width, fps, colors = min(
+        candidates,
+        key=lambda c: estimate_gif_bytes(trial_bytes, trial_width, trial_fps, *c)
+    )
+    return {
+        "width": width,
+        "fps": fps,
+        "colors": colors,
+        "estimated_bytes": estimate_gif_bytes(trial_bytes, trial_width, trial_fps, width, fps, colors),
+        "fits": False
+    }
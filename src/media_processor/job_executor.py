@@ -0,0 +1,135 @@
+"""媒体任务并行执行器 - MediaJobExecutor"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from pydantic import BaseModel, Field
+from loguru import logger
+from src.media_processor.subprocess_runner import CancelToken, handle_signals, job_scope, runner
+
+
+class MediaJob(BaseModel):
+    """媒体任务（截图/GIF/水印等）"""
+    kind: str = Field(..., description="任务类型 (screenshot/gif/watermark)")
+    func: Callable[..., Any] = Field(..., description="执行函数")
+    kwargs: Dict[str, Any] = Field(default_factory=dict, description="函数参数")
+    timeout: Optional[float] = Field(None, description="任务时限（秒），默认使用执行器的job_timeout")
+
+
+class MediaJobResult(BaseModel):
+    """媒体任务结果"""
+    index: int = Field(..., description="任务在提交列表中的序号")
+    kind: str = Field(..., description="任务类型")
+    output: Optional[Any] = Field(None, description="执行函数返回值")
+    error: Optional[str] = Field(None, description="错误信息（成功时为None）")
+    elapsed: float = Field(default=0.0, description="耗时（秒）")
+
+    @property
+    def ok(self) -> bool:
+        """任务是否成功"""
+        return self.error is None
+
+
+class MediaJobExecutor:
+    """
+    媒体任务并行执行器
+
+    FFmpeg任务以子进程运行，线程池即可并发；CPU预算按工作线程数平分，
+    每个FFmpeg进程的-threads取 cpu_budget // max_workers，避免过度订阅。
+    任务内启动的子进程共享任务截止时间，取消令牌触发后未开始的任务直接跳过、
+    运行中的子进程被终止；在主线程运行时，SIGINT/SIGTERM会触发取消令牌。
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        cpu_budget: Optional[int] = None,
+        job_timeout: Optional[float] = None
+    ):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 并发任务数，默认取CPU预算的一半（至少1）
+            cpu_budget: 可用CPU核数，默认os.cpu_count()
+            job_timeout: 单个任务时限（秒），None表示不限制
+        """
+        self.cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+        if not max_workers:
+            max_workers = max(1, self.cpu_budget // 2)
+        self.max_workers = max(1, min(max_workers, self.cpu_budget))
+        self.job_timeout = job_timeout
+
+    @property
+    def threads_per_job(self) -> int:
+        """每个FFmpeg进程分到的线程数"""
+        return max(1, self.cpu_budget // self.max_workers)
+
+    def run(self, jobs: List[MediaJob], cancel: Optional[CancelToken] = None) -> List[MediaJobResult]:
+        """
+        并发执行任务，结果按提交顺序返回
+
+        单个任务失败（含超时、取消）只记录在对应结果中，不影响其他任务。
+
+        Args:
+            jobs: 任务列表
+            cancel: 取消令牌（可选，SIGINT/SIGTERM时触发）
+
+        Returns:
+            任务结果列表（与jobs一一对应）
+        """
+        if not jobs:
+            return []
+
+        cancel = cancel or CancelToken()
+        with handle_signals(cancel):
+            return self._run_jobs(jobs, cancel)
+
+    def _run_jobs(self, jobs: List[MediaJob], cancel: CancelToken) -> List[MediaJobResult]:
+        """在线程池中执行任务"""
+        workers = min(self.max_workers, len(jobs))
+        logger.info(
+            f"并行执行{len(jobs)}个媒体任务: {workers}个并发, "
+            f"每任务{self.threads_per_job}线程"
+        )
+
+        if workers == 1:
+            return [self._run_one(i, job, cancel) for i, job in enumerate(jobs)]
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(self._run_one, i, job, cancel) for i, job in enumerate(jobs)]
+        try:
+            results = [future.result() for future in futures]
+        except BaseException:
+            # KeyboardInterrupt等：不等待排队任务，终止运行中的子进程后立即返回
+            for future in futures:
+                future.cancel()
+            cancel.cancel()
+            runner.kill_all()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return results
+
+    def _run_one(self, index: int, job: MediaJob, cancel: Optional[CancelToken] = None) -> MediaJobResult:
+        """执行单个任务并捕获异常"""
+        start = time.perf_counter()
+        if cancel is not None and cancel.cancelled:
+            return MediaJobResult(index=index, kind=job.kind, error="已取消")
+
+        try:
+            with job_scope(timeout=job.timeout or self.job_timeout, cancel=cancel):
+                output = job.func(**job.kwargs)
+            error = None
+        except Exception as e:
+            logger.debug(f"{job.kind}任务{index + 1}失败: {e}")
+            output = None
+            error = str(e)
+
+        return MediaJobResult(
+            index=index,
+            kind=job.kind,
+            output=output,
+            error=error,
+            elapsed=time.perf_counter() - start
+        )
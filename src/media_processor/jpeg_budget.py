@@ -0,0 +1,102 @@
+"""按字节预算编码JPEG - 帧只解码一次，在内存中二分查找质量"""
+import io
+from typing import Any, Dict
+
+# 微信公众号图片上限为2MB（JPEG体积为实际编码结果，无需估算余量）
+WECHAT_IMAGE_MAX_BYTES = 2 * 1024 * 1024
+
+# 质量搜索下限（Pillow质量1-95），低于此值仍超出预算时缩小尺寸
+MIN_JPEG_QUALITY = 30
+
+# 质量下限仍超出预算时每次缩小的比例与次数上限
+DOWNSCALE_FACTOR = 0.8
+MAX_DOWNSCALES = 6
+
+
+def encode_jpeg(image: Any, quality: int) -> bytes:
+    """
+    在内存中编码JPEG
+
+    Args:
+        image: PIL图像（RGB）
+        quality: Pillow质量（1-95）
+
+    Returns:
+        JPEG字节
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def fit_jpeg_to_budget(
+    image: Any,
+    max_bytes: int = WECHAT_IMAGE_MAX_BYTES,
+    max_quality: int = 95,
+    min_quality: int = MIN_JPEG_QUALITY
+) -> Dict:
+    """
+    选择不超过字节预算的最高JPEG质量
+
+    先按 max_quality 编码，超出预算时在 [min_quality, max_quality) 内二分查找
+    （JPEG体积随质量单调增长）；min_quality仍超出时按DOWNSCALE_FACTOR缩小后重新查找。
+
+    Args:
+        image: PIL图像（RGB）
+        max_bytes: 字节预算
+        max_quality: 质量上限（Pillow质量）
+        min_quality: 质量下限
+
+    Returns:
+        结果字典，包含：
+        - data: JPEG字节
+        - quality: 选定质量
+        - width / height: 编码尺寸
+        - encodes: 编码次数
+        - fits: 是否在预算内（缩小到上限次数仍超出时为False，返回最小结果）
+    """
+    from PIL import Image
+
+    min_quality = min(min_quality, max_quality)
+    encodes = 0
+
+    for _ in range(MAX_DOWNSCALES + 1):
+        data = encode_jpeg(image, max_quality)
+        encodes += 1
+        best = None
+        if len(data) <= max_bytes:
+            best = (max_quality, data)
+        else:
+            low, high = min_quality, max_quality - 1
+            while low <= high:
+                quality = (low + high) // 2
+                data = encode_jpeg(image, quality)
+                encodes += 1
+                if len(data) <= max_bytes:
+                    best = (quality, data)
+                    low = quality + 1
+                else:
+                    high = quality - 1
+
+        if best is not None:
+            return {
+                "data": best[1],
+                "quality": best[0],
+                "width": image.width,
+                "height": image.height,
+                "encodes": encodes,
+                "fits": True
+            }
+
+        size = (max(1, round(image.width * DOWNSCALE_FACTOR)), max(1, round(image.height * DOWNSCALE_FACTOR)))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    data = encode_jpeg(image, min_quality)
+    return {
+        "data": data,
+        "quality": min_quality,
+        "width": image.width,
+        "height": image.height,
+        "encodes": encodes + 1,
+        "fits": False
+    }
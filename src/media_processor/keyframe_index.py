@@ -0,0 +1,110 @@
+"""关键帧索引 - 规划seek位置与预解码距离"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+
+class KeyframeIndex:
+    """
+    视频关键帧索引
+
+    输入端 -ss 会跳到目标时间之前最近的关键帧再向后解码，
+    预解码距离 = 目标时间 - 前一个关键帧时间。索引来自 VideoProbeCache
+    的 keyframe_times（一次只读数据包标志的ffprobe，不解码），查询为二分查找。
+    """
+
+    def __init__(self, keyframe_times: List[float]):
+        """
+        初始化索引
+
+        Args:
+            keyframe_times: 升序排列的关键帧时间列表（秒）
+        """
+        self.times = keyframe_times
+
+    @classmethod
+    def from_probe(cls, metadata: Dict) -> "KeyframeIndex":
+        """
+        从视频元数据构建索引
+
+        Args:
+            metadata: VideoProbeCache.probe 返回的元数据
+
+        Returns:
+            KeyframeIndex对象
+        """
+        return cls(metadata.get("keyframe_times") or [])
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def average_gop(self) -> Optional[float]:
+        """平均关键帧间隔（秒）"""
+        if len(self.times) < 2:
+            return None
+        return (self.times[-1] - self.times[0]) / (len(self.times) - 1)
+
+    def preceding(self, timestamp: float) -> Optional[float]:
+        """目标时间之前（含）最近的关键帧"""
+        pos = bisect_right(self.times, timestamp)
+        return self.times[pos - 1] if pos else None
+
+    def following(self, timestamp: float) -> Optional[float]:
+        """目标时间之后（含）最近的关键帧"""
+        pos = bisect_left(self.times, timestamp)
+        return self.times[pos] if pos < len(self.times) else None
+
+    def nearest(self, timestamp: float) -> Optional[float]:
+        """距离目标时间最近的关键帧"""
+        candidates = [t for t in (self.preceding(timestamp), self.following(timestamp)) if t is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda t: abs(t - timestamp))
+
+    def decode_ahead(self, timestamp: float) -> float:
+        """
+        精确seek到目标时间需要预解码的时长（秒）
+
+        Args:
+            timestamp: 目标时间
+
+        Returns:
+            预解码时长，索引为空时按从头解码计算
+        """
+        keyframe = self.preceding(timestamp)
+        return timestamp - (keyframe if keyframe is not None else 0.0)
+
+    def plan_seek(self, timestamp: float, fast: bool = False) -> Dict:
+        """
+        规划一次seek
+
+        Args:
+            timestamp: 请求的时间
+            fast: 快速模式，吸附到最近的关键帧（无需预解码）
+
+        Returns:
+            seek计划字典，包含：
+            - requested: 请求的时间
+            - seek_time: 实际使用的时间
+            - keyframe: 解码起点关键帧
+            - decode_ahead: 预解码时长（秒）
+            - snapped: 是否吸附到了关键帧
+        """
+        if fast:
+            keyframe = self.nearest(timestamp)
+            if keyframe is not None:
+                return {
+                    "requested": timestamp,
+                    "seek_time": keyframe,
+                    "keyframe": keyframe,
+                    "decode_ahead": 0.0,
+                    "snapped": True
+                }
+
+        return {
+            "requested": timestamp,
+            "seek_time": timestamp,
+            "keyframe": self.preceding(timestamp),
+            "decode_ahead": self.decode_ahead(timestamp),
+            "snapped": False
+        }
@@ -0,0 +1,267 @@
+"""视频元数据缓存 - 每个视频只运行一次ffprobe，关键帧按需探测"""
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from src.media_processor.subprocess_runner import runner
+
+# 元数据结构变化时递增，使旧的持久化文件失效
+PROBE_VERSION = 2
+
+# 单次ffprobe时限（秒），遍历长视频的数据包也远低于该值
+PROBE_TIMEOUT = 300
+
+
+class VideoProbeCache:
+    """
+    视频元数据缓存
+
+    默认的一次ffprobe只读取容器与流信息（时长、编码信息等，不遍历数据包）；
+    关键帧时间在第一次需要关键帧索引时才另行探测（只读数据包标志，不解码）并补入同一份元数据。
+    结果按 (路径, 大小, 修改时间) 在进程内缓存，并持久化到视频旁的
+    {视频文件名}.probe.json，大小或修改时间变化后自动重新探测。
+    同一视频的探测按路径加锁，并发任务等待同一次ffprobe而不是重复运行。
+    VideoFetcher 与 FFmpegWrapper 共用模块级实例 probe_cache。
+    """
+
+    def __init__(self, ffprobe_path: str = "ffprobe", persist: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            ffprobe_path: ffprobe命令路径
+            persist: 是否将结果持久化到视频旁
+        """
+        self.ffprobe_path = ffprobe_path
+        self.persist = persist
+        self._memo: Dict[Tuple[str, int, int], Dict] = {}
+        self._lock = threading.Lock()
+        # 每个视频路径一把探测锁，见 _path_lock
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def sidecar_path(video_path: str) -> Path:
+        """持久化文件路径"""
+        path = Path(video_path)
+        return path.with_name(f"{path.name}.probe.json")
+
+    def _path_lock(self, resolved: str) -> threading.Lock:
+        """获取某个视频路径的探测锁"""
+        with self._lock:
+            lock = self._path_locks.get(resolved)
+            if lock is None:
+                lock = self._path_locks[resolved] = threading.Lock()
+            return lock
+
+    def probe(self, video_path: str, keyframes: bool = False, persist: Optional[bool] = None) -> Dict:
+        """
+        获取视频元数据（优先读取缓存）
+
+        Args:
+            video_path: 视频文件路径
+            keyframes: 是否需要关键帧时间（尚未探测时额外运行一次读取数据包标志的ffprobe）
+            persist: 是否读写持久化文件（默认按初始化参数；临时文件如输出GIF应传False）
+
+        Returns:
+            元数据字典，包含：
+            - size / mtime_ns: 探测时的文件大小与修改时间
+            - format: 容器信息
+            - streams: 视频流信息列表
+            - video: 第一条视频流
+            - duration: 时长（秒）
+            - codec: 编码信息 {name, profile, pix_fmt, width, height, fps}
+            - keyframe_times: 关键帧时间列表（秒），尚未探测时为None
+            - keyframe_count: 关键帧数量，尚未探测时为None
+        """
+        path = Path(video_path)
+        stat = path.stat()
+        resolved = str(path.resolve())
+        memo_key = (resolved, stat.st_size, stat.st_mtime_ns)
+        persist = self.persist if persist is None else persist
+
+        with self._path_lock(resolved):
+            with self._lock:
+                cached = self._memo.get(memo_key)
+
+            data = cached
+            if data is None and persist:
+                data = self._load_sidecar(path, stat.st_size, stat.st_mtime_ns)
+
+            changed = False
+            if data is None:
+                data = self._run_probe(path)
+                data["size"] = stat.st_size
+                data["mtime_ns"] = stat.st_mtime_ns
+                changed = True
+
+            if keyframes and data.get("keyframe_times") is None:
+                keyframe_times = self._probe_keyframes(path)
+                data = {**data, "keyframe_times": keyframe_times, "keyframe_count": len(keyframe_times)}
+                changed = True
+
+            if changed and persist:
+                self._save_sidecar(path, data)
+            if data is not cached:
+                with self._lock:
+                    self._memo[memo_key] = data
+        return data
+
+    def cached(self, video_path: str) -> Optional[Dict]:
+        """
+        只读取已有的元数据（进程内或持久化缓存），不运行ffprobe
+
+        Args:
+            video_path: 视频文件路径
+
+        Returns:
+            元数据字典，尚未探测或已失效时为None
+        """
+        path = Path(video_path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        resolved = str(path.resolve())
+        memo_key = (resolved, stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            data = self._memo.get(memo_key)
+        if data is None and self.persist:
+            data = self._load_sidecar(path, stat.st_size, stat.st_mtime_ns)
+            if data is not None:
+                with self._lock:
+                    self._memo[memo_key] = data
+        return data
+
+    def _run_probe(self, path: Path) -> Dict:
+        """运行一次ffprobe读取容器与流信息"""
+        cmd = [
+            self.ffprobe_path,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_format",
+            "-show_streams",
+            "-of", "json=c=1",
+            str(path)
+        ]
+        logger.debug(f"探测视频元数据: {path.name}")
+
+        result = runner.run(cmd, timeout=PROBE_TIMEOUT, check=False, operation="probe")
+        if result.returncode != 0:
+            raise Exception(f"获取视频信息失败: {result.stderr}")
+
+        raw = json.loads(result.stdout)
+        return self._summarize(raw)
+
+    def _probe_keyframes(self, path: Path) -> List[float]:
+        """运行一次只读取数据包标志的ffprobe（不解码），返回关键帧时间"""
+        cmd = [
+            self.ffprobe_path,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            str(path)
+        ]
+        logger.debug(f"探测关键帧: {path.name}")
+
+        result = runner.run(cmd, timeout=PROBE_TIMEOUT, check=False, operation="probe")
+        if result.returncode != 0:
+            raise Exception(f"获取关键帧失败: {result.stderr}")
+
+        return self._parse_keyframe_packets(result.stdout)
+
+    @staticmethod
+    def _parse_keyframe_packets(output: str) -> List[float]:
+        """从 pts_time,flags 的CSV输出中取出关键帧数据包的时间（数据包按解码顺序，需排序）"""
+        times = []
+        for line in output.splitlines():
+            fields = line.strip().split(",")
+            if len(fields) < 2 or "K" not in fields[-1] or fields[0] in ("", "N/A"):
+                continue
+            times.append(float(fields[0]))
+        return sorted(times)
+
+    @staticmethod
+    def _summarize(raw: Dict) -> Dict:
+        """将ffprobe原始输出整理为缓存结构（关键帧时间留待 _probe_keyframes）"""
+        streams = raw.get("streams", [])
+        fmt = raw.get("format", {})
+        video = streams[0] if streams else {}
+
+        duration = video.get("duration") or fmt.get("duration") or 0
+
+        fps = None
+        rate = video.get("avg_frame_rate") or video.get("r_frame_rate")
+        if rate and "/" in rate:
+            num, den = rate.split("/")
+            if float(den):
+                fps = float(num) / float(den)
+
+        return {
+            "version": PROBE_VERSION,
+            "format": fmt,
+            "streams": streams,
+            "video": video,
+            "duration": float(duration),
+            "codec": {
+                "name": video.get("codec_name"),
+                "profile": video.get("profile"),
+                "pix_fmt": video.get("pix_fmt"),
+                "width": video.get("width"),
+                "height": video.get("height"),
+                "fps": fps
+            },
+            "keyframe_times": None,
+            "keyframe_count": None
+        }
+
+    def _load_sidecar(self, path: Path, size: int, mtime_ns: int) -> Optional[Dict]:
+        """读取持久化结果（大小/修改时间不一致时视为失效）"""
+        sidecar = self.sidecar_path(str(path))
+        if not sidecar.exists():
+            return None
+
+        try:
+            data = json.loads(sidecar.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.debug(f"元数据缓存文件损坏，重新探测: {e}")
+            return None
+
+        if (
+            data.get("version") != PROBE_VERSION
+            or data.get("size") != size
+            or data.get("mtime_ns") != mtime_ns
+        ):
+            return None
+        return data
+
+    def _save_sidecar(self, path: Path, data: Dict) -> None:
+        """持久化结果（失败只记录日志）"""
+        try:
+            self.sidecar_path(str(path)).write_text(
+                json.dumps(data, ensure_ascii=False),
+                encoding="utf-8"
+            )
+        except OSError as e:
+            logger.debug(f"无法写入元数据缓存: {e}")
+
+    def invalidate(self, video_path: Optional[str] = None) -> None:
+        """
+        清除进程内缓存
+
+        Args:
+            video_path: 只清除该视频（可选，默认全部）
+        """
+        with self._lock:
+            if video_path is None:
+                self._memo.clear()
+                return
+            resolved = str(Path(video_path).resolve())
+            for key in [k for k in self._memo if k[0] == resolved]:
+                del self._memo[key]
+
+
+# 全局元数据缓存实例
+probe_cache = VideoProbeCache()
@@ -1,36 +1,234 @@
 """媒体处理模块 - MediaProcessor"""
+import asyncio
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from loguru import logger
 import sys
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from config import settings
+from src.media_processor.artifact_cache import MediaArtifactCache
+from src.media_processor.contact_sheet import (
+    FRAMES_FILE, SHEET_COLUMNS, SHEET_INTERVAL, SHEET_QUALITY, SHEET_ROWS, SHEET_TILE_WIDTH, SHEET_VERSION,
+    ContactSheetIndex, parse_frame_times, sheet_dir
+)
 from src.media_processor.ffmpeg_wrapper import FFmpegWrapper
-from src.models.video import MediaAsset
+from src.media_processor.gif_budget import GIF_BUDGET_LADDER, TRIAL_WIDTH, WECHAT_GIF_MAX_BYTES, plan_gif_budget
+from src.media_processor.job_executor import MediaJob, MediaJobExecutor, MediaJobResult
+from src.media_processor.jpeg_budget import fit_jpeg_to_budget
+from src.media_processor.progress import ProgressTracker
+from src.media_processor.pyav_backend import PyAVDecoder, jpeg_quality
+from src.media_processor.scene_index import (
+    SCENE_SNAP_TOLERANCE, SCENE_THRESHOLD, SCENE_WIDTH, SCENES_FILE, SceneIndex, parse_scene_cuts, scene_sidecar
+)
+from src.media_processor.subprocess_runner import CancelToken
+from src.media_processor.watermark_overlay import watermark_overlays
+from src.models.video import MediaAsset, RenditionSpec, WatermarkSpec
+
+# 微信用MP4片段：480px H.264（yuv420p，CRF28，无音频），见 extract_wechat_clip
+WECHAT_CLIP = RenditionSpec(name="clip", format="mp4", width=480, fps=None, crf=28)
+
+# 文章常用的一组输出：HTML报告用完整GIF、微信用预算内GIF、MP4片段（与convert_for_wechat方案1参数一致）
+ARTICLE_RENDITIONS = [
+    RenditionSpec(name="report", format="gif", width=480, fps=10),
+    RenditionSpec(name="wechat", format="gif", width=480, fps=10, max_bytes=WECHAT_GIF_MAX_BYTES),
+    WECHAT_CLIP,
+]
+
+# 批量水印时一个FFmpeg进程最多处理的文件数
+WATERMARK_BATCH_SIZE = 8
+
+# 精确剪辑时，开头不完整GOP重新编码所用的编码器（需与源编码一致才能与流复制部分拼接）
+SMART_CUT_ENCODERS = {"h264": "libx264"}
 
 
 class MediaProcessor:
     """媒体处理器 - 处理截图、GIF和水印"""
 
-    def __init__(self, watermark_text: Optional[str] = None):
+    def __init__(
+        self,
+        watermark_text: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        cpu_budget: Optional[int] = None,
+        cache: Optional[MediaArtifactCache] = None,
+        backend: Optional[str] = None
+    ):
         """
         初始化媒体处理器
 
         Args:
             watermark_text: 水印文字，默认从配置读取
+            max_workers: 批量处理时并发的FFmpeg任务数，默认从配置读取（0为自动）
+            cpu_budget: 批量处理可用的CPU核数，默认从配置读取（0为全部）
+            cache: 产物缓存，默认按配置创建（media_cache_enabled=False时不使用缓存）
+            backend: 解码后端，ffmpeg（每个产物一个子进程）或 pyav（进程内解码），默认从配置读取
         """
         self.wrapper = FFmpegWrapper()
         self.watermark_text = watermark_text or settings.watermark_text
+        # 预渲染的水印叠加层（按文字/字号/不透明度/目标宽度缓存），见 add_watermark
+        self.overlays = watermark_overlays
+        self.executor = MediaJobExecutor(
+            max_workers=max_workers or settings.media_workers,
+            cpu_budget=cpu_budget or settings.media_cpu_budget,
+            job_timeout=settings.media_job_timeout or None
+        )
+        # 批量任务的取消令牌，见 cancel
+        self.cancel_token = CancelToken()
+        # 最近一次批量执行的FFmpeg吞吐汇总，见 run_jobs
+        self.last_progress: Optional[Dict] = None
+        # asyncio版本的并发上限 (事件循环, 信号量)，见 _async_semaphore
+        self._async_limit: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+        if cache is None and settings.media_cache_enabled:
+            cache = MediaArtifactCache()
+        self.cache = cache
+        # 每个任务的seek计划（含预解码距离），见 _plan_seek
+        self.seek_plans: List[dict] = []
+        # 按字节预算编码的截图所选的JPEG质量，见 extract_screenshot
+        self.screenshot_budgets: List[dict] = []
+        # 已加载的联系表索引（按视频路径），见 build_contact_sheet
+        self._contact_sheets: Dict[str, ContactSheetIndex] = {}
+        # 已加载的镜头切换索引（按路径/大小/修改时间/阈值），见 scene_index
+        self._scene_indexes: Dict[Tuple[str, int, int, float], SceneIndex] = {}
+        # 批量GIF合并重叠窗口的解码统计（秒），见 batch_process_gifs
+        self.window_stats: Dict[str, float] = {"requested_seconds": 0.0, "decoded_seconds": 0.0}
+
+        self.backend = backend or settings.media_backend
+        if self.backend == "pyav":
+            self.decoder = PyAVDecoder()
+        elif self.backend == "ffmpeg":
+            self.decoder = None
+        else:
+            raise ValueError(f"不支持的解码后端: {self.backend}")
+
+    def default_watermark(self) -> WatermarkSpec:
+        """
+        获取默认水印参数（使用处理器的水印文字）
+
+        Returns:
+            WatermarkSpec对象
+        """
+        return WatermarkSpec(text=self.watermark_text)
+
+    def _plan_seek(
+        self,
+        video_path: str,
+        kind: str,
+        timestamp: float,
+        fast: bool = False
+    ) -> Tuple[float, bool]:
+        """
+        按关键帧索引规划seek，记录并报告预解码距离
+
+        Args:
+            video_path: 视频文件路径
+            kind: 任务类型 (screenshot/gif)
+            timestamp: 请求的时间（秒）
+            fast: 快速模式，吸附到最近的关键帧
+
+        Returns:
+            (实际使用的时间, 是否吸附到了关键帧)
+        """
+        if timestamp <= 0:
+            # 从头开始无需预解码，也不必探测关键帧
+            return timestamp, False
+
+        plan = self.wrapper.plan_seek(video_path, timestamp, fast=fast)
+        if plan is None:
+            return timestamp, False
+
+        plan["kind"] = kind
+        self.seek_plans.append(plan)
+
+        if plan["snapped"]:
+            logger.info(f"  快速模式: {timestamp:.3f}秒吸附到关键帧{plan['seek_time']:.3f}秒")
+        else:
+            logger.info(f"  预解码: {plan['decode_ahead']:.2f}秒")
+        return plan["seek_time"], plan["snapped"]
+
+    def _cache_key(self, video_path: str, kind: str, params: dict) -> Optional[str]:
+        """
+        计算产物缓存键
+
+        Args:
+            video_path: 源视频路径
+            kind: 产物类型 (screenshot/gif)
+            params: 完整渲染参数
+
+        Returns:
+            缓存键，未启用缓存或源文件不可读时为None
+        """
+        if self.cache is None:
+            return None
+
+        try:
+            return self.cache.make_key(video_path, kind, params)
+        except OSError as e:
+            logger.debug(f"无法计算缓存键: {e}")
+            return None
+
+    @property
+    def saved_decode_seconds(self) -> float:
+        """合并重叠GIF窗口节省的解码时长（秒）"""
+        return self.window_stats["requested_seconds"] - self.window_stats["decoded_seconds"]
+
+    def _gif_cache_key(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        width: int,
+        fps: int,
+        use_palette: bool,
+        fused_palette: bool,
+        watermark: Optional[WatermarkSpec],
+        colors: int
+    ) -> Optional[str]:
+        """GIF缓存键（包含解码后端：两种后端的调色板与水印渲染不同，输出字节不同）"""
+        return self._cache_key(video_path, "gif", {
+            "backend": self.backend,
+            "start_time": round(start_time, 3),
+            "duration": round(duration, 3),
+            "width": width,
+            "fps": fps,
+            "use_palette": use_palette,
+            "fused_palette": fused_palette,
+            "watermark": watermark.model_dump() if watermark else None,
+            "colors": colors
+        })
+
+    def _screenshot_cache_key(
+        self,
+        video_path: str,
+        timestamp: float,
+        quality: int,
+        watermark: Optional[WatermarkSpec],
+        max_bytes: Optional[int] = None
+    ) -> Optional[str]:
+        """截图缓存键（包含解码后端：两种后端的JPEG编码与水印渲染不同，输出字节不同）"""
+        params = {
+            "backend": self.backend,
+            "timestamp": round(timestamp, 3),
+            "quality": quality,
+            "watermark": watermark.model_dump() if watermark else None
+        }
+        if max_bytes:
+            params["max_bytes"] = max_bytes
+        return self._cache_key(video_path, "screenshot", params)
 
     def extract_screenshot(
         self,
         video_path: str,
         timestamp: float,
         output_path: Optional[str] = None,
-        quality: int = 2
+        quality: int = 2,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False,
+        max_bytes: Optional[int] = None
     ) -> str:
         """
         提取高质量截图
@@ -40,6 +238,10 @@ class MediaProcessor:
             timestamp: 时间戳（秒）
             output_path: 输出文件路径（可选）
             quality: JPG质量（1-31，越小越好）
+            watermark: 水印参数（可选，与截图同一次编码完成）
+            fast: 快速模式，吸附到最近的关键帧并只解码关键帧
+            max_bytes: 字节预算（可选，如 WECHAT_IMAGE_MAX_BYTES）。设置后帧只解码一次，
+                在内存中二分查找不超过预算的最高JPEG质量（不高于quality），只写最终文件
 
         Returns:
             截图文件路径
@@ -50,24 +252,184 @@ class MediaProcessor:
 
         logger.info(f"提取截图: {timestamp:.3f}秒 -> {output_path}")
 
-        # 生成命令
+        timestamp, snapped = self._plan_seek(video_path, "screenshot", timestamp, fast)
+
+        cache_key = self._screenshot_cache_key(video_path, timestamp, quality, watermark, max_bytes)
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ 截图命中缓存")
+            return output_path
+
+        if max_bytes:
+            self._write_screenshot_within_budget(
+                video_path, timestamp, output_path, quality, watermark, snapped, max_bytes
+            )
+        elif self.decoder is not None:
+            self.decoder.extract_screenshots(
+                video_path, [timestamp], [output_path], quality=quality, watermark=watermark
+            )
+        else:
+            # 生成命令
+            cmd = self.wrapper.screenshot_command(
+                video_path=video_path,
+                timestamp=timestamp,
+                output_path=output_path,
+                quality=quality,
+                watermark=watermark,
+                keyframe_only=snapped
+            )
+
+            # 执行命令
+            result = self.wrapper.run_command(cmd, operation="screenshot")
+
+        return self._verify_output(output_path, cache_key, "截图")
+
+    async def extract_screenshot_async(
+        self,
+        video_path: str,
+        timestamp: float,
+        output_path: Optional[str] = None,
+        quality: int = 2,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False,
+        max_bytes: Optional[int] = None
+    ) -> str:
+        """
+        extract_screenshot 的asyncio版本
+
+        FFmpeg以asyncio子进程运行，同一事件循环内的并发数受 max_workers 限制，
+        可与网络上传等其他协程交错执行。参数与返回值同 extract_screenshot。
+        """
+        if self.decoder is not None or max_bytes:
+            # 进程内解码/JPEG预算编码主要是CPU工作，放到线程中执行
+            return await asyncio.to_thread(
+                self.extract_screenshot, video_path, timestamp, output_path, quality, watermark, fast, max_bytes
+            )
+
+        if output_path is None:
+            video_dir = Path(video_path).parent
+            output_path = str(video_dir / f"screenshot_{timestamp:.3f}.jpg")
+
+        logger.info(f"提取截图: {timestamp:.3f}秒 -> {output_path}")
+
+        # 关键帧索引首次构建需要运行ffprobe，不阻塞事件循环
+        timestamp, snapped = await asyncio.to_thread(self._plan_seek, video_path, "screenshot", timestamp, fast)
+
+        cache_key = self._screenshot_cache_key(video_path, timestamp, quality, watermark)
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ 截图命中缓存")
+            return output_path
+
         cmd = self.wrapper.screenshot_command(
             video_path=video_path,
             timestamp=timestamp,
             output_path=output_path,
-            quality=quality
+            quality=quality,
+            watermark=watermark,
+            keyframe_only=snapped
         )
+        await self._run_command_async(cmd, operation="screenshot")
 
-        # 执行命令
-        result = self.wrapper.run_command(cmd)
+        return self._verify_output(output_path, cache_key, "截图")
 
-        # 验证输出文件
-        if Path(output_path).exists():
-            file_size = Path(output_path).stat().st_size / 1024
-            logger.success(f"✓ 截图生成成功 ({file_size:.1f} KB)")
-            return output_path
+    def _write_screenshot_within_budget(
+        self,
+        video_path: str,
+        timestamp: float,
+        output_path: str,
+        quality: int,
+        watermark: Optional[WatermarkSpec],
+        keyframe_only: bool,
+        max_bytes: int
+    ) -> dict:
+        """
+        解码一帧，在内存中按字节预算编码JPEG后写入输出文件
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间戳（秒，已完成seek规划）
+            output_path: 输出文件路径
+            quality: FFmpeg风格质量上限（2-31，越小越好）
+            watermark: 水印参数（可选，进程内叠加）
+            keyframe_only: 只解码关键帧
+            max_bytes: 字节预算
+
+        Returns:
+            fit_jpeg_to_budget 的结果（不含JPEG数据），同时记录到 screenshot_budgets
+        """
+        from PIL import Image
+
+        if self.decoder is not None:
+            frame = self.decoder.read_frames(video_path, [timestamp])[0]
         else:
-            raise Exception(f"截图生成失败: {output_path}")
+            frame = self.wrapper.read_frame(video_path, timestamp, keyframe_only=keyframe_only)
+
+        image = Image.fromarray(frame)
+        if watermark:
+            image = self.overlays.blend(image, watermark)
+
+        plan = fit_jpeg_to_budget(image, max_bytes=max_bytes, max_quality=jpeg_quality(quality))
+        data = plan.pop("data")
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(output_path).write_bytes(data)
+
+        plan.update({"output_path": output_path, "bytes": len(data), "max_bytes": max_bytes})
+        self.screenshot_budgets.append(plan)
+        logger.info(
+            f"  JPEG预算 {max_bytes / 1024 / 1024:.2f} MB: 质量 {plan['quality']}, "
+            f"{plan['width']}x{plan['height']}, {len(data) / 1024:.1f} KB ({plan['encodes']}次编码)"
+        )
+        if not plan["fits"]:
+            logger.warning(f"  截图超出预算: {len(data) / 1024 / 1024:.2f} MB > {max_bytes / 1024 / 1024:.2f} MB")
+        return plan
+
+    def _verify_output(self, output_path: str, cache_key: Optional[str], label: str) -> str:
+        """
+        验证输出文件并写入缓存
+
+        Args:
+            output_path: 输出文件路径
+            cache_key: 缓存键（可选）
+            label: 产物名称（用于日志）
+
+        Returns:
+            输出文件路径
+        """
+        if not Path(output_path).exists():
+            raise Exception(f"{label}生成失败: {output_path}")
+
+        file_size = Path(output_path).stat().st_size / 1024
+        logger.success(f"✓ {label}生成成功 ({file_size:.1f} KB)")
+        if cache_key:
+            self.cache.store(cache_key, output_path)
+        return output_path
+
+    @staticmethod
+    def _clear_outputs(output_paths: List[str]) -> None:
+        """
+        删除输出路径上已有的文件
+
+        一个进程输出多个文件时按运行后文件是否存在判断每个输出是否成功，
+        上次运行残留的文件不能被当作本次的结果（更不能写入缓存）。
+        """
+        for output_path in output_paths:
+            Path(output_path).unlink(missing_ok=True)
+
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环内FFmpeg子进程的并发上限（max_workers）"""
+        loop = asyncio.get_running_loop()
+        if self._async_limit is None or self._async_limit[0] is not loop:
+            self._async_limit = (loop, asyncio.Semaphore(self.executor.max_workers))
+        return self._async_limit[1]
+
+    async def _run_command_async(self, cmd: List[str], check: bool = True, operation: str = "ffmpeg"):
+        """以asyncio子进程执行FFmpeg命令（受并发上限限制，线程数按CPU预算分配）"""
+        return await self.wrapper.run_command_async(
+            cmd,
+            check=check,
+            operation=operation,
+            threads=self.executor.threads_per_job if self.executor.max_workers > 1 else None,
+            semaphore=self._async_semaphore()
+        )
 
     def generate_gif(
         self,
@@ -77,7 +439,12 @@ class MediaProcessor:
         output_path: Optional[str] = None,
         width: int = 480,
         fps: int = 10,
-        use_palette: bool = True
+        use_palette: bool = True,
+        fused_palette: bool = True,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False,
+        colors: int = 256,
+        use_cache: bool = True
     ) -> str:
         """
         生成GIF动图
@@ -90,6 +457,11 @@ class MediaProcessor:
             width: 宽度（像素）
             fps: 帧率
             use_palette: 是否使用调色板优化
+            fused_palette: 是否单进程生成并应用调色板（不写调色板临时文件）
+            watermark: 水印参数（可选，在调色板量化前绘制，无需二次编码）
+            fast: 快速模式，起始时间吸附到最近的关键帧（无需预解码）
+            colors: 调色板颜色数（2-256）
+            use_cache: 是否读写产物缓存（试编码等临时文件传False）
 
         Returns:
             GIF文件路径
@@ -100,6 +472,27 @@ class MediaProcessor:
 
         logger.info(f"生成GIF: {start_time:.0f}秒, {duration:.0f}秒, {width}px")
 
+        start_time, _ = self._plan_seek(video_path, "gif", start_time, fast)
+
+        cache_key = self._gif_cache_key(
+            video_path, start_time, duration, width, fps,
+            use_palette, fused_palette, watermark, colors
+        ) if use_cache else None
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ GIF命中缓存")
+            return output_path
+
+        if self.decoder is not None:
+            self.decoder.generate_gif(
+                video_path, start_time, duration, output_path,
+                width=width, fps=fps, watermark=watermark, colors=colors
+            )
+            file_size = Path(output_path).stat().st_size / 1024
+            logger.success(f"✓ GIF生成成功 ({file_size:.1f} KB)")
+            if cache_key:
+                self.cache.store(cache_key, output_path)
+            return output_path
+
         # 生成命令
         gif_cmd, palette_cmd = self.wrapper.gif_command(
             video_path=video_path,
@@ -108,31 +501,599 @@ class MediaProcessor:
             output_path=output_path,
             width=width,
             fps=fps,
-            use_palette=use_palette
+            use_palette=use_palette,
+            fused_palette=fused_palette,
+            watermark=watermark,
+            colors=colors
         )
 
-        # 如果使用调色板，先生成调色板
+        # 两步法：先生成调色板
         if use_palette and palette_cmd:
             logger.debug("生成调色板...")
-            palette_result = self.wrapper.run_command(palette_cmd, check=False)
+            palette_result = self.wrapper.run_command(palette_cmd, check=False, operation="gif")
             if palette_result.returncode != 0:
                 logger.warning(f"调色板生成失败: {palette_result.stderr}")
 
-        # 执行GIF生成命令
-        result = self.wrapper.run_command(gif_cmd)
+        # 执行GIF生成命令
+        result = self.wrapper.run_command(gif_cmd, operation="gif")
+
+        # 清理调色板文件（仅两步法会生成）
+        if use_palette and palette_cmd:
+            palette_path = output_path.replace(".gif", "_palette.png")
+            Path(palette_path).unlink(missing_ok=True)
+
+        return self._verify_output(output_path, cache_key, "GIF")
+
+    async def generate_gif_async(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: Optional[str] = None,
+        width: int = 480,
+        fps: int = 10,
+        use_palette: bool = True,
+        fused_palette: bool = True,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False,
+        colors: int = 256
+    ) -> str:
+        """
+        generate_gif 的asyncio版本
+
+        FFmpeg以asyncio子进程运行，同一事件循环内的并发数受 max_workers 限制。
+        参数与返回值同 generate_gif。
+        """
+        if self.decoder is not None:
+            return await asyncio.to_thread(
+                self.generate_gif, video_path, start_time, duration, output_path,
+                width, fps, use_palette, fused_palette, watermark, fast, colors
+            )
+
+        if output_path is None:
+            video_dir = Path(video_path).parent
+            output_path = str(video_dir / f"gif_{start_time:.0f}_{duration:.0f}s.gif")
+
+        logger.info(f"生成GIF: {start_time:.0f}秒, {duration:.0f}秒, {width}px")
+
+        start_time, _ = await asyncio.to_thread(self._plan_seek, video_path, "gif", start_time, fast)
+
+        cache_key = self._gif_cache_key(
+            video_path, start_time, duration, width, fps,
+            use_palette, fused_palette, watermark, colors
+        )
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ GIF命中缓存")
+            return output_path
+
+        gif_cmd, palette_cmd = self.wrapper.gif_command(
+            video_path=video_path,
+            start_time=start_time,
+            duration=duration,
+            output_path=output_path,
+            width=width,
+            fps=fps,
+            use_palette=use_palette,
+            fused_palette=fused_palette,
+            watermark=watermark,
+            colors=colors
+        )
+
+        try:
+            if use_palette and palette_cmd:
+                palette_result = await self._run_command_async(palette_cmd, check=False, operation="gif")
+                if palette_result.returncode != 0:
+                    logger.warning(f"调色板生成失败: {palette_result.stderr}")
+            await self._run_command_async(gif_cmd, operation="gif")
+        finally:
+            if use_palette and palette_cmd:
+                Path(output_path.replace(".gif", "_palette.png")).unlink(missing_ok=True)
+
+        return self._verify_output(output_path, cache_key, "GIF")
+
+    def generate_gif_within_budget(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: Optional[str] = None,
+        max_bytes: int = WECHAT_GIF_MAX_BYTES,
+        max_width: int = 480,
+        max_fps: int = 10,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> str:
+        """
+        生成不超过字节预算的GIF
+
+        先以低分辨率试编码源片段估算体积，再按 GIF_BUDGET_LADDER 选出预算内
+        画质最高的宽度/帧率/颜色数，只做一次正式编码。
+
+        Args:
+            video_path: 源视频路径（也可以是已有的GIF）
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            output_path: 输出文件路径（可选）
+            max_bytes: 字节预算，默认微信公众号上限
+            max_width: 宽度上限
+            max_fps: 帧率上限
+            watermark: 水印参数（可选）
+
+        Returns:
+            GIF文件路径（估算偏差导致仍超出预算时记录警告，不再重新编码）
+        """
+        if output_path is None:
+            video_dir = Path(video_path).parent
+            output_path = str(video_dir / f"gif_{start_time:.0f}_{duration:.0f}s_budget.gif")
+
+        # 缓存键取预算请求本身，命中时连试编码也不需要
+        cache_key = self._cache_key(video_path, "gif_budget", {
+            "backend": self.backend,
+            "start_time": round(start_time, 3),
+            "duration": round(duration, 3),
+            "max_bytes": max_bytes,
+            "max_width": max_width,
+            "max_fps": max_fps,
+            "watermark": watermark.model_dump() if watermark else None
+        })
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ 预算GIF命中缓存")
+            return output_path
+
+        plan = self._plan_gif_budget(
+            video_path, start_time, duration, output_path,
+            max_bytes=max_bytes, max_width=max_width, max_fps=max_fps, watermark=watermark
+        )
+
+        self.generate_gif(
+            video_path=video_path,
+            start_time=start_time,
+            duration=duration,
+            output_path=output_path,
+            width=plan["width"],
+            fps=plan["fps"],
+            watermark=watermark,
+            colors=plan["colors"],
+            use_cache=False
+        )
+        if cache_key:
+            self.cache.store(cache_key, output_path)
+
+        final_bytes = Path(output_path).stat().st_size
+        if final_bytes > max_bytes:
+            logger.warning(
+                f"  GIF超出预算: {final_bytes / 1024 / 1024:.2f} MB > "
+                f"{max_bytes / 1024 / 1024:.2f} MB"
+            )
+        return output_path
+
+    def _plan_gif_budget(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: str,
+        max_bytes: int,
+        max_width: int = 480,
+        max_fps: int = 10,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> dict:
+        """
+        低分辨率试编码源片段，按字节预算选出GIF参数
+
+        Args:
+            video_path: 源视频路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            output_path: 正式输出路径（试编码文件放在旁边，用后删除，不写入产物缓存）
+            max_bytes: 字节预算
+            max_width: 宽度上限
+            max_fps: 帧率上限
+            watermark: 水印参数（可选）
+
+        Returns:
+            plan_gif_budget 返回的参数字典
+        """
+        trial_fps = min(max_fps, GIF_BUDGET_LADDER[0][1])
+        trial_path = str(Path(output_path).with_name(f"{Path(output_path).stem}_trial.gif"))
+        try:
+            self.generate_gif(
+                video_path=video_path,
+                start_time=start_time,
+                duration=duration,
+                output_path=trial_path,
+                width=TRIAL_WIDTH,
+                fps=trial_fps,
+                watermark=watermark,
+                use_cache=False
+            )
+            trial_bytes = Path(trial_path).stat().st_size
+        finally:
+            Path(trial_path).unlink(missing_ok=True)
+
+        plan = plan_gif_budget(
+            trial_bytes, TRIAL_WIDTH, trial_fps,
+            max_bytes=max_bytes, max_width=max_width, max_fps=max_fps
+        )
+        logger.info(
+            f"  GIF预算 {max_bytes / 1024 / 1024:.2f} MB: "
+            f"{plan['width']}px, {plan['fps']}fps, {plan['colors']}色, "
+            f"估算 {plan['estimated_bytes'] / 1024 / 1024:.2f} MB"
+        )
+        return plan
+
+    def generate_renditions(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        renditions: List[RenditionSpec],
+        output_dir: Optional[str] = None,
+        output_paths: Optional[Dict[str, str]] = None,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False
+    ) -> Dict[str, str]:
+        """
+        同一时刻一次解码生成多种输出（如报告GIF、微信GIF、MP4片段）
+
+        设置了max_bytes的GIF规格先做低分辨率试编码换算为具体参数；
+        已缓存的规格跳过，其余在同一个FFmpeg进程的split滤镜图中生成。
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            renditions: 输出规格列表（名称不可重复）
+            output_dir: 输出目录（可选，默认视频所在目录）
+            output_paths: 按规格名称指定输出路径（可选，未指定的按
+                moment_{开始秒}s_{名称}.{格式} 命名）
+            watermark: 水印参数（可选，所有规格共用）
+            fast: 快速模式，起始时间吸附到关键帧
+
+        Returns:
+            {规格名称: 输出路径} 字典
+        """
+        if output_dir is None:
+            output_dir = str(Path(video_path).parent)
+
+        paths = dict(output_paths or {})
+        for spec in renditions:
+            paths.setdefault(
+                spec.name,
+                os.path.join(output_dir, f"moment_{start_time:.0f}s_{spec.name}.{spec.format}")
+            )
+            Path(paths[spec.name]).parent.mkdir(parents=True, exist_ok=True)
+
+        logger.info(
+            f"生成{len(renditions)}种输出: {start_time:.0f}秒, {duration:.0f}秒 "
+            f"({', '.join(spec.name for spec in renditions)})"
+        )
+
+        start_time, _ = self._plan_seek(video_path, "rendition", start_time, fast)
+
+        pending: List[Tuple[RenditionSpec, Optional[str]]] = []
+        # 换算后参数与前面规格完全相同时直接复制，不再多开一个分支
+        duplicates: Dict[str, str] = {}
+        for spec in renditions:
+            budget_key = None
+            if spec.format == "gif" and spec.max_bytes:
+                # 预算规格按请求参数缓存，命中时无需试编码
+                budget_key = self._rendition_cache_key(video_path, start_time, duration, spec, watermark)
+                if budget_key and self.cache.fetch(budget_key, paths[spec.name]):
+                    logger.success(f"✓ {spec.name}命中缓存")
+                    continue
+                plan = self._plan_gif_budget(
+                    video_path, start_time, duration, paths[spec.name],
+                    max_bytes=spec.max_bytes,
+                    max_width=spec.width,
+                    max_fps=spec.fps or GIF_BUDGET_LADDER[0][1],
+                    watermark=watermark
+                )
+                spec = spec.model_copy(update={
+                    "width": plan["width"],
+                    "fps": plan["fps"],
+                    "colors": plan["colors"]
+                })
+
+            params = spec.model_dump(exclude={"name", "max_bytes"})
+            same = next((p.name for p, _ in pending if p.model_dump(exclude={"name", "max_bytes"}) == params), None)
+            if same is not None:
+                duplicates[spec.name] = same
+                continue
+
+            cache_key = budget_key
+            if cache_key is None:
+                cache_key = self._rendition_cache_key(video_path, start_time, duration, spec, watermark)
+                if cache_key and self.cache.fetch(cache_key, paths[spec.name]):
+                    logger.success(f"✓ {spec.name}命中缓存")
+                    continue
+            pending.append((spec, cache_key))
+
+        if pending:
+            self._clear_outputs([paths[spec.name] for spec, _ in pending])
+            cmd = self.wrapper.rendition_command(
+                video_path=video_path,
+                start_time=start_time,
+                duration=duration,
+                renditions=[spec for spec, _ in pending],
+                output_paths=[paths[spec.name] for spec, _ in pending],
+                watermark=watermark
+            )
+            self.wrapper.run_command(cmd, operation="rendition")
+
+            for spec, cache_key in pending:
+                output_path = paths[spec.name]
+                if not Path(output_path).exists():
+                    raise Exception(f"{spec.name}生成失败: {output_path}")
+                file_size = Path(output_path).stat().st_size / 1024
+                logger.success(f"✓ {spec.name}生成成功 ({file_size:.1f} KB)")
+                if cache_key:
+                    self.cache.store(cache_key, output_path)
+
+        for name, source in duplicates.items():
+            shutil.copyfile(paths[source], paths[name])
+
+        return {spec.name: paths[spec.name] for spec in renditions}
+
+    def _rendition_cache_key(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        spec: RenditionSpec,
+        watermark: Optional[WatermarkSpec]
+    ) -> Optional[str]:
+        """输出规格的缓存键（预算规格含max_bytes，按请求参数计算）"""
+        return self._cache_key(video_path, "rendition", {
+            "start_time": round(start_time, 3),
+            "duration": round(duration, 3),
+            "spec": spec.model_dump(exclude={"name"} if spec.max_bytes else {"name", "max_bytes"}),
+            "watermark": watermark.model_dump() if watermark else None
+        })
+
+    def extract_clip(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: Optional[str] = None,
+        exact: bool = False
+    ) -> str:
+        """
+        提取视频片段（默认流复制，不解码不编码）
+
+        exact=False：起点前移到前一个关键帧，整段 -c copy，终点不变。
+        exact=True：起点帧精确。起点恰为关键帧时仍整段流复制；否则只重新编码
+        起点到下一个关键帧之间的不完整GOP，其余流复制后拼接。源编码不是H.264
+        或无关键帧索引时整段重新编码。片段不含音频；流复制部分的终点按数据包截断。
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            output_path: 输出文件路径（可选）
+            exact: 起点是否必须帧精确
+
+        Returns:
+            片段文件路径
+        """
+        if output_path is None:
+            video_dir = Path(video_path).parent
+            output_path = str(video_dir / f"clip_{start_time:.0f}_{duration:.0f}s.mp4")
+
+        logger.info(f"提取片段: {start_time:.3f}秒, {duration:.0f}秒 -> {output_path}")
+
+        cache_key = self._cache_key(video_path, "clip", {
+            "start_time": round(start_time, 3),
+            "duration": round(duration, 3),
+            "exact": exact
+        })
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ 片段命中缓存")
+            return output_path
+
+        end_time = start_time + duration
+        keyframes = self.wrapper.keyframe_index(video_path)
+        previous = keyframes.preceding(start_time) if keyframes else None
+        following = keyframes.following(start_time) if keyframes else None
+
+        if previous is not None and (not exact or start_time - previous < 1e-3):
+            # 关键帧对齐：整段流复制
+            logger.info(f"  流复制: 起点对齐关键帧 {previous:.3f}秒")
+            cmd = self.wrapper.clip_copy_command(video_path, previous, end_time - previous, output_path)
+            self.wrapper.run_command(cmd, operation="clip")
+        elif not exact:
+            # 无关键帧索引：FFmpeg输入端seek同样从前一个关键帧开始复制
+            logger.info("  流复制: 起点由FFmpeg对齐到前一个关键帧")
+            cmd = self.wrapper.clip_copy_command(video_path, start_time, duration, output_path)
+            self.wrapper.run_command(cmd, operation="clip")
+        else:
+            codec = self.wrapper.probe(video_path)["codec"] if keyframes else {}
+            encoder = SMART_CUT_ENCODERS.get(codec.get("name"))
+            if following is None or following >= end_time or encoder is None:
+                logger.info("  重新编码整段（无法拼接流复制部分）")
+                cmd = self.wrapper.clip_encode_command(
+                    video_path, start_time, duration, output_path,
+                    encoder=encoder or "libx264", pix_fmt=codec.get("pix_fmt")
+                )
+                self.wrapper.run_command(cmd, operation="clip")
+            else:
+                logger.info(
+                    f"  智能剪辑: 重新编码 {start_time:.3f}-{following:.3f}秒, "
+                    f"流复制 {following:.3f}-{end_time:.3f}秒"
+                )
+                self._smart_cut(
+                    video_path, start_time, following, end_time, output_path,
+                    encoder=encoder, pix_fmt=codec.get("pix_fmt")
+                )
+
+        if Path(output_path).exists():
+            file_size = Path(output_path).stat().st_size / 1024
+            logger.success(f"✓ 片段生成成功 ({file_size:.1f} KB)")
+            if cache_key:
+                self.cache.store(cache_key, output_path)
+            return output_path
+        else:
+            raise Exception(f"片段生成失败: {output_path}")
+
+    def extract_wechat_clip(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: Optional[str] = None,
+        spec: RenditionSpec = WECHAT_CLIP
+    ) -> str:
+        """
+        提取微信可播放的MP4片段（默认480px H.264 yuv420p CRF28，与 ARTICLE_RENDITIONS 的clip一致）
+
+        只有源已满足规格（H.264、yuv420p、宽度不超过spec.width）时才流复制：起点为关键帧时
+        整段复制，否则智能剪辑（只重新编码开头不完整的GOP）。其余情况按规格缩放并重新编码，
+        起点帧精确。
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            output_path: 输出文件路径（可选）
+            spec: MP4输出规格
+
+        Returns:
+            片段文件路径
+        """
+        if output_path is None:
+            video_dir = Path(video_path).parent
+            output_path = str(video_dir / f"wechat_clip_{start_time:.0f}_{duration:.0f}s.mp4")
+
+        logger.info(f"提取微信片段: {start_time:.3f}秒, {duration:.0f}秒 -> {output_path}")
+
+        cache_key = self._cache_key(video_path, "wechat_clip", {
+            "start_time": round(start_time, 3),
+            "duration": round(duration, 3),
+            "spec": spec.model_dump(exclude={"name", "max_bytes"})
+        })
+        if cache_key and self.cache.fetch(cache_key, output_path):
+            logger.success("✓ 片段命中缓存")
+            return output_path
+
+        try:
+            codec = self.wrapper.probe(video_path)["codec"]
+        except Exception as e:
+            logger.debug(f"无法探测视频编码: {e}")
+            codec = {}
+        compatible = (
+            codec.get("name") == "h264"
+            and codec.get("pix_fmt") == "yuv420p"
+            and 0 < (codec.get("width") or 0) <= spec.width
+        )
+
+        end_time = start_time + duration
+        keyframes = self.wrapper.keyframe_index(video_path) if compatible else None
+        previous = keyframes.preceding(start_time) if keyframes else None
+        following = keyframes.following(start_time) if keyframes else None
+
+        if previous is not None and start_time - previous < 1e-3:
+            logger.info(f"  流复制: 源已满足规格，起点为关键帧 {previous:.3f}秒")
+            cmd = self.wrapper.clip_copy_command(video_path, previous, duration, output_path)
+            self.wrapper.run_command(cmd, operation="clip")
+        elif following is not None and following < end_time:
+            logger.info(
+                f"  智能剪辑: 重新编码 {start_time:.3f}-{following:.3f}秒, "
+                f"流复制 {following:.3f}-{end_time:.3f}秒"
+            )
+            self._smart_cut(
+                video_path, start_time, following, end_time, output_path,
+                encoder=SMART_CUT_ENCODERS["h264"], pix_fmt="yuv420p"
+            )
+        else:
+            logger.info(f"  重新编码: {spec.width}px H.264 CRF{spec.crf}")
+            cmd = self.wrapper.clip_encode_command(
+                video_path, start_time, duration, output_path,
+                crf=spec.crf, preset=spec.preset, pix_fmt="yuv420p", width=spec.width
+            )
+            self.wrapper.run_command(cmd, operation="clip")
+
+        if Path(output_path).exists():
+            file_size = Path(output_path).stat().st_size / 1024
+            logger.success(f"✓ 片段生成成功 ({file_size:.1f} KB)")
+            if cache_key:
+                self.cache.store(cache_key, output_path)
+            return output_path
+        else:
+            raise Exception(f"片段生成失败: {output_path}")
+
+    def _smart_cut(
+        self,
+        video_path: str,
+        start_time: float,
+        keyframe: float,
+        end_time: float,
+        output_path: str,
+        encoder: str,
+        pix_fmt: Optional[str] = None
+    ) -> None:
+        """
+        重新编码开头不完整的GOP，其余流复制，再用concat拼接
+
+        两段的H.264参数集都写入码流（重新编码部分每个关键帧重复参数集，
+        流复制部分经h264_mp4toannexb带出源参数集），拼接后解码器随码流切换参数集。
+        """
+        stem = Path(output_path).with_suffix("")
+        head_path = f"{stem}_head.mp4"
+        tail_path = f"{stem}_tail.mp4"
+        list_path = f"{stem}_concat.txt"
+
+        try:
+            self.wrapper.run_command(self.wrapper.clip_encode_command(
+                video_path, start_time, keyframe - start_time, head_path,
+                encoder=encoder, pix_fmt=pix_fmt, inband_headers=True
+            ), operation="clip")
+            self.wrapper.run_command(self.wrapper.clip_copy_command(
+                video_path, keyframe, end_time - keyframe, tail_path,
+                inband_headers=True
+            ), operation="clip")
+
+            Path(list_path).write_text(
+                "".join(f"file '{Path(path).resolve()}'\n" for path in (head_path, tail_path)),
+                encoding="utf-8"
+            )
+            self.wrapper.run_command(self.wrapper.concat_command(list_path, output_path), operation="clip")
+        finally:
+            for path in (head_path, tail_path, list_path):
+                Path(path).unlink(missing_ok=True)
 
-        # 清理调色板文件（如果存在）
-        if use_palette:
-            palette_path = output_path.replace(".gif", "_palette.png")
-            Path(palette_path).unlink(missing_ok=True)
+    def fit_gif_to_budget(
+        self,
+        gif_path: str,
+        output_path: str,
+        max_bytes: int = WECHAT_GIF_MAX_BYTES
+    ) -> str:
+        """
+        将已有GIF重新编码到字节预算内（已在预算内时直接复制）
 
-        # 验证输出文件
-        if Path(output_path).exists():
-            file_size = Path(output_path).stat().st_size / 1024
-            logger.success(f"✓ GIF生成成功 ({file_size:.1f} KB)")
+        Args:
+            gif_path: 原GIF路径
+            output_path: 输出文件路径
+            max_bytes: 字节预算
+
+        Returns:
+            输出文件路径
+        """
+        if Path(gif_path).stat().st_size <= max_bytes:
+            shutil.copyfile(gif_path, output_path)
             return output_path
-        else:
-            raise Exception(f"GIF生成失败: {output_path}")
+
+        # 输出目录中的GIF不写持久化元数据文件
+        probe = self.wrapper.probe(gif_path, persist=False)
+        source_width = probe["codec"]["width"] or GIF_BUDGET_LADDER[0][0]
+
+        return self.generate_gif_within_budget(
+            video_path=gif_path,
+            start_time=0,
+            duration=probe["duration"],
+            output_path=output_path,
+            max_bytes=max_bytes,
+            max_width=min(GIF_BUDGET_LADDER[0][0], source_width)
+        )
 
     def add_watermark(
         self,
@@ -169,6 +1130,10 @@ class MediaProcessor:
 
         logger.info(f"添加水印: {media_path} -> {output_path}")
 
+        # 水印只渲染一次，通过overlay滤镜叠加
+        watermark = WatermarkSpec(text=text, position=position, font_size=font_size, opacity=opacity)
+        overlay_path = self.overlays.path(watermark, self._media_width(media_path))
+
         # 生成命令
         cmd = self.wrapper.watermark_command(
             input_path=media_path,
@@ -176,11 +1141,12 @@ class MediaProcessor:
             text=text,
             position=position,
             font_size=font_size,
-            opacity=opacity
+            opacity=opacity,
+            overlay_path=overlay_path
         )
 
         # 执行命令
-        result = self.wrapper.run_command(cmd)
+        result = self.wrapper.run_command(cmd, operation="watermark")
 
         # 验证输出文件
         if Path(output_path).exists():
@@ -189,12 +1155,347 @@ class MediaProcessor:
         else:
             raise Exception(f"水印添加失败: {output_path}")
 
+    def _media_width(self, media_path: str) -> int:
+        """
+        获取媒体宽度（图片/GIF只读文件头，其他按视频探测）
+
+        Args:
+            media_path: 媒体文件路径
+
+        Returns:
+            宽度（像素）
+        """
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            with Image.open(media_path) as image:
+                return image.width
+        except UnidentifiedImageError:
+            return int(self.wrapper.get_video_info(media_path)["width"])
+        except OSError as e:
+            raise Exception(f"读取媒体尺寸失败: {media_path} - {e}")
+
+    def _add_watermarks_batch(
+        self,
+        media_paths: List[str],
+        output_paths: List[str],
+        watermark: WatermarkSpec,
+        width: int
+    ) -> List[str]:
+        """
+        一个FFmpeg进程为一组同宽度的文件添加水印
+
+        Args:
+            media_paths: 媒体文件路径列表
+            output_paths: 与之对应的输出路径
+            watermark: 水印参数
+            width: 这组文件的宽度（像素）
+
+        Returns:
+            输出文件路径列表
+        """
+        cmd = self.wrapper.batch_watermark_command(
+            media_paths,
+            output_paths,
+            self.overlays.path(watermark, width),
+            position=watermark.position
+        )
+        self.wrapper.run_command(cmd, operation="watermark")
+
+        missing = [path for path in output_paths if not Path(path).exists()]
+        if missing:
+            raise Exception(f"水印添加失败: {', '.join(missing)}")
+        return output_paths
+
+    def build_contact_sheet(
+        self,
+        video_path: str,
+        interval: float = SHEET_INTERVAL,
+        tile_width: int = SHEET_TILE_WIDTH,
+        columns: int = SHEET_COLUMNS,
+        rows: int = SHEET_ROWS,
+        force: bool = False
+    ) -> ContactSheetIndex:
+        """
+        生成整个视频的联系表（雪碧图）和帧索引
+
+        一次解码按固定间隔抽帧（每个区间的第一帧，与同一时间的截图相同），
+        缩放后拼成 columns x rows 的JPEG，写入视频旁的 {视频文件名}.sheets/，
+        index.json 记录每帧的实际时间和位置。视频文件与参数不变时直接复用。
+
+        Args:
+            video_path: 视频文件路径
+            interval: 抽帧间隔（秒）
+            tile_width: 缩略图宽度（像素）
+            columns: 每张联系表的列数
+            rows: 每张联系表的行数
+            force: 忽略已有联系表重新生成
+
+        Returns:
+            ContactSheetIndex对象
+        """
+        path = Path(video_path).resolve()
+        stat = path.stat()
+        params = {"interval": interval, "tile_width": tile_width, "columns": columns, "rows": rows}
+
+        index = None if force else self._current_contact_sheet(str(path))
+        if index is not None and index.data["params"] == params:
+            return index
+
+        directory = sheet_dir(str(path))
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+        logger.info(f"生成联系表: 每{interval:g}秒一帧, {columns}x{rows}/张 -> {directory}")
+
+        cmd = self.wrapper.contact_sheet_command(
+            str(path), interval, tile_width, columns, rows, quality=SHEET_QUALITY
+        )
+        self.wrapper.run_command(
+            cmd, timeout=self._full_decode_timeout(str(path)), operation="contact_sheet", cwd=str(directory)
+        )
+
+        frames_path = directory / FRAMES_FILE
+        times = parse_frame_times(frames_path.read_text(encoding="utf-8")) if frames_path.exists() else []
+        frames_path.unlink(missing_ok=True)
+        sheets = sorted(item.name for item in directory.glob("sheet_*.jpg"))
+        if not times or not sheets:
+            raise Exception(f"联系表生成失败: {directory}")
+
+        from PIL import Image
+
+        with Image.open(directory / sheets[0]) as image:
+            tile_height = image.height // rows
+
+        per_sheet = columns * rows
+        index = ContactSheetIndex({
+            "version": SHEET_VERSION,
+            "video": path.name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "params": params,
+            "tile_width": tile_width,
+            "tile_height": tile_height,
+            "sheets": sheets,
+            "frames": [
+                {
+                    "time": time_,
+                    "sheet": i // per_sheet,
+                    "x": (i % per_sheet) % columns * tile_width,
+                    "y": (i % per_sheet) // columns * tile_height
+                }
+                for i, time_ in enumerate(times)
+            ]
+        }, directory)
+        index.save()
+        self._contact_sheets[str(path)] = index
+
+        logger.success(f"✓ 联系表生成成功: {len(times)}帧, {len(sheets)}张")
+        return index
+
+    def _full_decode_timeout(self, video_path: str) -> Optional[float]:
+        """整个视频解码一遍的命令时限（不低于视频时长，即按不慢于实时速度放宽）"""
+        timeout = self.wrapper.timeout
+        if timeout:
+            try:
+                timeout = max(timeout, self.wrapper.get_video_duration(video_path))
+            except Exception:
+                pass
+        return timeout
+
+    def scene_index(
+        self,
+        video_path: str,
+        threshold: float = SCENE_THRESHOLD,
+        force: bool = False
+    ) -> SceneIndex:
+        """
+        获取视频的镜头切换索引（首次一次低分辨率解码检测，之后读取视频旁的缓存）
+
+        Args:
+            video_path: 视频文件路径
+            threshold: 场景分数阈值（0-1）
+            force: 忽略缓存重新检测
+
+        Returns:
+            SceneIndex对象
+        """
+        path = Path(video_path).resolve()
+        stat = path.stat()
+        sidecar = scene_sidecar(str(path))
+
+        memo_key = (str(path), stat.st_size, stat.st_mtime_ns, threshold)
+
+        index = None if force else self._scene_indexes.get(memo_key)
+        if index is not None:
+            return index
+        index = None if force else SceneIndex.load(sidecar, stat.st_size, stat.st_mtime_ns, threshold)
+
+        if index is None:
+            logger.info(f"检测镜头切换: {path.name} (阈值 {threshold})")
+            with tempfile.TemporaryDirectory() as work_dir:
+                cmd = self.wrapper.scene_command(str(path), threshold, width=SCENE_WIDTH)
+                self.wrapper.run_command(
+                    cmd, timeout=self._full_decode_timeout(str(path)), operation="scene", cwd=work_dir
+                )
+                scenes_path = Path(work_dir) / SCENES_FILE
+                cuts = parse_scene_cuts(scenes_path.read_text(encoding="utf-8")) if scenes_path.exists() else []
+
+            index = SceneIndex([cut for cut, _ in cuts], [score for _, score in cuts], threshold)
+            index.save(sidecar, stat.st_size, stat.st_mtime_ns)
+            logger.success(f"✓ 检测到{len(index)}个镜头切换")
+
+        self._scene_indexes[memo_key] = index
+        return index
+
+    def snap_to_scene(
+        self,
+        video_path: str,
+        timestamp: float,
+        tolerance: float = SCENE_SNAP_TOLERANCE
+    ) -> float:
+        """
+        将时间戳吸附到容差范围内最近的镜头切换点（避免截图/GIF起点落在转场中）
+
+        无法检测镜头切换时记录警告并返回原时间戳。
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间戳（秒）
+            tolerance: 容差（秒）
+
+        Returns:
+            吸附后的时间戳
+        """
+        try:
+            index = self.scene_index(video_path)
+        except Exception as e:
+            logger.warning(f"镜头切换检测失败，不吸附时间戳: {e}")
+            return timestamp
+
+        snapped = index.snap(timestamp, tolerance)
+        if snapped != timestamp:
+            logger.info(f"  吸附到镜头切换: {timestamp:.3f}秒 -> {snapped:.3f}秒")
+        return snapped
+
+    def _current_contact_sheet(self, video_path: str) -> Optional[ContactSheetIndex]:
+        """
+        视频现有的联系表索引（任意参数，视频文件变化后视为不存在）
+
+        Args:
+            video_path: 视频文件路径
+
+        Returns:
+            ContactSheetIndex对象或None
+        """
+        path = Path(video_path).resolve()
+        stat = path.stat()
+        index = self._contact_sheets.get(str(path)) or ContactSheetIndex.load(sheet_dir(str(path)))
+        if index is None or not index.matches(stat.st_size, stat.st_mtime_ns):
+            return None
+        self._contact_sheets[str(path)] = index
+        return index
+
+    def preview_frame(
+        self,
+        video_path: str,
+        timestamp: float,
+        output_path: Optional[str] = None
+    ) -> str:
+        """
+        从联系表裁剪时间戳处的缩略预览（使用视频现有的联系表，不存在时按默认参数生成）
+
+        用于核对时间戳（如NotebookLM给出的时间点）是否对应预期画面，
+        不为每次核对单独解码视频。超出视频范围的时间戳直接报错。
+
+        Args:
+            video_path: 视频文件路径
+            timestamp: 时间戳（秒）
+            output_path: 输出文件路径（可选）
+
+        Returns:
+            预览图路径（最近的联系表帧，与时间戳相差不超过半个抽帧间隔）
+        """
+        index = self._current_contact_sheet(video_path) or self.build_contact_sheet(video_path)
+        if timestamp < 0 or timestamp > index.end_time:
+            raise Exception(f"时间戳超出视频范围: {timestamp:.3f}秒 (视频约 {index.end_time:.0f}秒)")
+
+        frame = index.nearest(timestamp)
+        if output_path is None:
+            output_path = str(Path(video_path).parent / f"preview_{timestamp:.3f}.jpg")
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        index.crop(timestamp).save(output_path, format="JPEG", quality=90)
+        logger.info(f"预览: {timestamp:.3f}秒 -> 联系表帧 {frame['time']:.3f}秒 ({output_path})")
+        return output_path
+
+    def run_jobs(self, jobs: List[MediaJob]) -> List[MediaJobResult]:
+        """
+        并行执行一组媒体任务（截图/GIF/水印可混合）
+
+        并发时按CPU预算为每个FFmpeg进程分配线程数；结果按提交顺序返回，
+        单个任务失败不会中断其他任务。执行期间汇总FFmpeg进度（见 track_progress）。
+
+        Args:
+            jobs: 任务列表
+
+        Returns:
+            任务结果列表（与jobs一一对应）
+        """
+        previous_threads = self.wrapper.threads
+        if self.executor.max_workers > 1:
+            self.wrapper.threads = self.executor.threads_per_job
+
+        try:
+            with self.track_progress():
+                return self.executor.run(jobs, cancel=self.cancel_token)
+        finally:
+            self.wrapper.threads = previous_threads
+
+    @contextmanager
+    def track_progress(self) -> Iterator[ProgressTracker]:
+        """
+        汇总范围内所有FFmpeg进程的 -progress 输出
+
+        期间定期记录实时吞吐，结束后汇总保存在 last_progress；
+        嵌套时沿用外层的汇总（一个批量方法内多次 run_jobs 合并统计）。
+
+        Yields:
+            ProgressTracker对象
+        """
+        if self.wrapper.progress is not None:
+            yield self.wrapper.progress
+            return
+
+        tracker = self.wrapper.progress = ProgressTracker()
+        try:
+            yield tracker
+        finally:
+            self.wrapper.progress = None
+            self.last_progress = tracker.summary()
+            if self.last_progress["jobs"]:
+                logger.info(tracker.readout())
+
+    def cancel(self) -> None:
+        """
+        取消正在执行的批量任务（可从其他线程调用）
+
+        未开始的任务直接跳过，运行中的FFmpeg进程组被终止；
+        之后提交的批量任务使用新的取消令牌，不受影响。
+        """
+        token, self.cancel_token = self.cancel_token, CancelToken()
+        token.cancel()
+        logger.warning("已取消批量媒体任务")
+
     def batch_process_screenshots(
         self,
         video_path: str,
         timestamps: List[float],
         output_dir: Optional[str] = None,
-        quality: int = 2
+        quality: int = 2,
+        single_pass: bool = True,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False,
+        max_bytes: Optional[int] = None
     ) -> List[str]:
         """
         批量提取截图
@@ -204,6 +1505,10 @@ class MediaProcessor:
             timestamps: 时间戳列表
             output_dir: 输出目录（可选）
             quality: JPG质量
+            single_pass: 是否按时间分组、每组单进程一次解码输出全部截图
+            watermark: 水印参数（可选）
+            fast: 快速模式，逐张吸附到关键帧（只解码关键帧，不再单次解码分组）
+            max_bytes: 每张截图的字节预算（可选，见 extract_screenshot；设置后逐张提取）
 
         Returns:
             截图文件路径列表
@@ -211,31 +1516,171 @@ class MediaProcessor:
         if output_dir is None:
             output_dir = str(Path(video_path).parent)
 
-        output_paths = []
-
         logger.info(f"批量提取{len(timestamps)}张截图...")
 
-        for i, timestamp in enumerate(timestamps, 1):
-            try:
-                output_path = os.path.join(
-                    output_dir,
-                    f"{i:02d}_screenshot_{timestamp:.3f}.jpg"
+        all_paths = [
+            os.path.join(output_dir, f"{i:02d}_screenshot_{timestamp:.3f}.jpg")
+            for i, timestamp in enumerate(timestamps, 1)
+        ]
+
+        with self.track_progress():
+            if single_pass and not fast and not max_bytes:
+                done = self._extract_screenshots_single_pass(
+                    video_path, timestamps, all_paths, quality, watermark
                 )
+            else:
+                done = set()
 
-                result_path = self.extract_screenshot(
-                    video_path=video_path,
-                    timestamp=timestamp,
-                    output_path=output_path,
-                    quality=quality
+            # 未在单次解码中完成的截图逐张提取
+            pending = [i for i in range(len(timestamps)) if i not in done]
+            jobs = [
+                MediaJob(
+                    kind="screenshot",
+                    func=self.extract_screenshot,
+                    kwargs={
+                        "video_path": video_path,
+                        "timestamp": timestamps[i],
+                        "output_path": all_paths[i],
+                        "quality": quality,
+                        "watermark": watermark,
+                        "fast": fast,
+                        "max_bytes": max_bytes
+                    }
                 )
+                for i in pending
+            ]
+            for i, result in zip(pending, self.run_jobs(jobs)):
+                if result.ok:
+                    done.add(i)
+                else:
+                    logger.error(f"✗ 截图{i + 1}失败: {result.error}")
 
-                output_paths.append(result_path)
+        output_paths = [all_paths[i] for i in sorted(done)]
 
-            except Exception as e:
-                logger.error(f"✗ 截图{i}失败: {e}")
+        logger.success(f"批量截图完成: {len(output_paths)}/{len(timestamps)} 成功")
+        return output_paths
+
+    def _extract_screenshots_single_pass(
+        self,
+        video_path: str,
+        timestamps: List[float],
+        output_paths: List[str],
+        quality: int,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> Set[int]:
+        """
+        按时间分组，每组一个FFmpeg进程解码一次输出多张截图（各组并行，已缓存的跳过）
+
+        Args:
+            video_path: 视频文件路径
+            timestamps: 时间戳列表
+            output_paths: 与时间戳对应的输出路径
+            quality: JPG质量
+            watermark: 水印参数（可选）
+
+        Returns:
+            成功生成的截图索引集合（失败的由调用方逐张重试）
+        """
+        done: Set[int] = set()
+        cache_keys = {}
+
+        # 先查缓存，只为未命中的时间戳解码
+        for i, timestamp in enumerate(timestamps):
+            cache_key = self._screenshot_cache_key(video_path, timestamp, quality, watermark)
+            if cache_key and self.cache.fetch(cache_key, output_paths[i]):
+                done.add(i)
+            else:
+                cache_keys[i] = cache_key
+
+        misses = sorted(cache_keys)
+        if not misses:
+            logger.success(f"✓ {len(done)}张截图全部命中缓存")
+            return done
+
+        if self.decoder is not None:
+            # 进程内解码：一个解码会话按时间顺序读取全部截图
+            chunks = [misses]
+        else:
+            keyframes = self.wrapper.keyframe_index(video_path)
+            chunks = [
+                [misses[j] for j in chunk]
+                for chunk in self.wrapper.chunk_timestamps(
+                    [timestamps[i] for i in misses],
+                    keyframes=keyframes
+                )
+            ]
+        jobs = [
+            MediaJob(
+                kind="screenshot",
+                func=self._extract_screenshot_chunk,
+                kwargs={
+                    "video_path": video_path,
+                    "timestamps": [timestamps[i] for i in chunk],
+                    "output_paths": [output_paths[i] for i in chunk],
+                    "quality": quality,
+                    "watermark": watermark
+                }
+            )
+            for chunk in chunks
+        ]
+
+        for chunk, result in zip(chunks, self.run_jobs(jobs)):
+            if not result.ok:
+                logger.warning(f"单次解码截图失败，改为逐张提取: {result.error}")
                 continue
 
-        logger.success(f"批量截图完成: {len(output_paths)}/{len(timestamps)} 成功")
+            for index in chunk:
+                if Path(output_paths[index]).exists():
+                    done.add(index)
+                    if cache_keys[index]:
+                        self.cache.store(cache_keys[index], output_paths[index])
+
+        return done
+
+    def _extract_screenshot_chunk(
+        self,
+        video_path: str,
+        timestamps: List[float],
+        output_paths: List[str],
+        quality: int,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> List[str]:
+        """
+        单个FFmpeg进程（或进程内解码会话）提取一组截图
+
+        Args:
+            video_path: 视频文件路径
+            timestamps: 组内时间戳（升序）
+            output_paths: 对应输出路径
+            quality: JPG质量
+            watermark: 水印参数（可选）
+
+        Returns:
+            输出路径列表
+        """
+        logger.info(
+            f"单次解码提取{len(timestamps)}张截图: "
+            f"{timestamps[0]:.3f}秒 - {timestamps[-1]:.3f}秒"
+        )
+        self._plan_seek(video_path, "screenshot_batch", timestamps[0])
+        self._clear_outputs(output_paths)
+
+        if self.decoder is not None:
+            return self.decoder.extract_screenshots(
+                video_path, timestamps, output_paths, quality=quality, watermark=watermark
+            )
+
+        cmd = self.wrapper.multi_screenshot_command(
+            video_path=video_path,
+            timestamps=timestamps,
+            output_paths=output_paths,
+            quality=quality,
+            watermark=watermark
+        )
+        result = self.wrapper.run_command(cmd, check=False, operation="screenshot")
+        if result.returncode != 0:
+            raise Exception(result.stderr[-200:])
+
         return output_paths
 
     def batch_process_gifs(
@@ -245,11 +1690,19 @@ class MediaProcessor:
         output_dir: Optional[str] = None,
         width: int = 480,
         fps: int = 10,
-        use_palette: bool = True
+        use_palette: bool = True,
+        fused_palette: bool = True,
+        watermark: Optional[WatermarkSpec] = None,
+        fast: bool = False,
+        merge_windows: bool = True,
+        merge_gap: float = 0.0
     ) -> List[str]:
         """
         批量生成GIF
 
+        重叠的片段（相邻关键时刻去重后仍常有重叠）合并为一个区间，
+        一个FFmpeg进程只解码一次并按窗口输出各个GIF，输出与逐个生成相同。
+
         Args:
             video_path: 视频文件路径
             clips: (start_time, duration) 元组列表
@@ -257,6 +1710,11 @@ class MediaProcessor:
             width: 宽度
             fps: 帧率
             use_palette: 是否使用调色板
+            fused_palette: 是否单进程生成并应用调色板
+            watermark: 水印参数（可选）
+            fast: 快速模式，起始时间吸附到关键帧（不合并窗口）
+            merge_windows: 是否合并重叠窗口（仅合并调色板模式）
+            merge_gap: 间隔不超过该值（秒）的窗口也合并
 
         Returns:
             GIF文件路径列表
@@ -264,49 +1722,204 @@ class MediaProcessor:
         if output_dir is None:
             output_dir = str(Path(video_path).parent)
 
-        output_paths = []
-
         logger.info(f"批量生成{len(clips)}个GIF...")
 
-        for i, (start_time, duration) in enumerate(clips, 1):
-            try:
-                output_path = os.path.join(
-                    output_dir,
-                    f"gif_{i:02d}_{start_time:.0f}s_{duration:.0f}s.gif"
+        paths = [
+            os.path.join(output_dir, f"gif_{i:02d}_{start_time:.0f}s_{duration:.0f}s.gif")
+            for i, (start_time, duration) in enumerate(clips, 1)
+        ]
+
+        with self.track_progress():
+            done: Set[int] = set()
+            if (merge_windows and use_palette and fused_palette and not fast
+                    and self.decoder is None):
+                done = self._generate_gifs_merged(
+                    video_path, clips, paths, width, fps, watermark, merge_gap
                 )
 
-                result_path = self.generate_gif(
-                    video_path=video_path,
-                    start_time=start_time,
-                    duration=duration,
-                    output_path=output_path,
-                    width=width,
-                    fps=fps,
-                    use_palette=use_palette
+            pending = [i for i in range(len(clips)) if i not in done]
+            jobs = [
+                MediaJob(
+                    kind="gif",
+                    func=self.generate_gif,
+                    kwargs={
+                        "video_path": video_path,
+                        "start_time": clips[i][0],
+                        "duration": clips[i][1],
+                        "output_path": paths[i],
+                        "width": width,
+                        "fps": fps,
+                        "use_palette": use_palette,
+                        "fused_palette": fused_palette,
+                        "watermark": watermark,
+                        "fast": fast
+                    }
                 )
+                for i in pending
+            ]
 
-                output_paths.append(result_path)
+            failed = set()
+            for i, result in zip(pending, self.run_jobs(jobs)):
+                if not result.ok:
+                    failed.add(i)
+                    logger.error(f"✗ GIF{i + 1}失败: {result.error}")
 
-            except Exception as e:
-                logger.error(f"✗ GIF{i}失败: {e}")
+        output_paths = [path for i, path in enumerate(paths) if i not in failed]
+        logger.success(f"批量GIF生成完成: {len(output_paths)}/{len(clips)} 成功")
+        return output_paths
+
+    def _generate_gifs_merged(
+        self,
+        video_path: str,
+        clips: List[tuple],
+        output_paths: List[str],
+        width: int,
+        fps: int,
+        watermark: Optional[WatermarkSpec],
+        merge_gap: float
+    ) -> Set[int]:
+        """
+        合并重叠窗口生成GIF（各合并区间并行，已缓存的跳过），并统计节省的解码时长
+
+        Args:
+            video_path: 视频文件路径
+            clips: (start_time, duration) 元组列表
+            output_paths: 与片段对应的输出路径
+            width: 宽度
+            fps: 帧率
+            watermark: 水印参数（可选）
+            merge_gap: 间隔不超过该值（秒）的窗口也合并
+
+        Returns:
+            成功生成的GIF索引集合（单独成组的和失败的由调用方逐个生成）
+        """
+        done: Set[int] = set()
+        cache_keys = {}
+
+        for i, (start_time, duration) in enumerate(clips):
+            cache_key = self._gif_cache_key(
+                video_path, start_time, duration, width, fps, True, True, watermark, 256
+            )
+            if cache_key and self.cache.fetch(cache_key, output_paths[i]):
+                done.add(i)
+            else:
+                cache_keys[i] = cache_key
+
+        misses = sorted(cache_keys)
+        groups = [
+            [misses[j] for j in group]
+            for group in self.wrapper.merge_windows(
+                [clips[i] for i in misses], max_gap=merge_gap
+            )
+        ]
+
+        requested = sum(clips[i][1] for i in misses)
+        decoded = 0.0
+        for group in groups:
+            decoded += max(clips[i][0] + clips[i][1] for i in group) - clips[group[0]][0]
+        self.window_stats["requested_seconds"] += requested
+        self.window_stats["decoded_seconds"] += decoded
+        if requested > decoded:
+            logger.info(
+                f"合并重叠窗口: {len(misses)}个GIF -> {len(groups)}次解码, "
+                f"节省解码{requested - decoded:.1f}秒"
+            )
+
+        groups = [group for group in groups if len(group) > 1]
+        jobs = [
+            MediaJob(
+                kind="gif",
+                func=self._generate_gif_window,
+                kwargs={
+                    "video_path": video_path,
+                    "clips": [clips[i] for i in group],
+                    "output_paths": [output_paths[i] for i in group],
+                    "width": width,
+                    "fps": fps,
+                    "watermark": watermark
+                }
+            )
+            for group in groups
+        ]
+
+        for group, result in zip(groups, self.run_jobs(jobs)):
+            if not result.ok:
+                logger.warning(f"合并窗口生成GIF失败，改为逐个生成: {result.error}")
                 continue
 
-        logger.success(f"批量GIF生成完成: {len(output_paths)}/{len(clips)} 成功")
+            for index in group:
+                if Path(output_paths[index]).exists():
+                    done.add(index)
+                    if cache_keys[index]:
+                        self.cache.store(cache_keys[index], output_paths[index])
+
+        return done
+
+    def _generate_gif_window(
+        self,
+        video_path: str,
+        clips: List[tuple],
+        output_paths: List[str],
+        width: int,
+        fps: int,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> List[str]:
+        """
+        单个FFmpeg进程解码合并区间，输出区间内的多个GIF
+
+        Args:
+            video_path: 视频文件路径
+            clips: 组内 (start_time, duration) 列表（按开始时间升序）
+            output_paths: 对应输出路径
+            width: 宽度
+            fps: 帧率
+            watermark: 水印参数（可选）
+
+        Returns:
+            输出路径列表
+        """
+        start_time = clips[0][0]
+        end_time = max(start + duration for start, duration in clips)
+        logger.info(
+            f"合并解码生成{len(clips)}个GIF: {start_time:.1f}秒 - {end_time:.1f}秒"
+        )
+        self._plan_seek(video_path, "gif_window", start_time)
+        self._clear_outputs(output_paths)
+
+        cmd = self.wrapper.window_gif_command(
+            video_path=video_path,
+            start_time=start_time,
+            duration=end_time - start_time,
+            windows=[(start - start_time, duration) for start, duration in clips],
+            output_paths=output_paths,
+            width=width,
+            fps=fps,
+            watermark=watermark
+        )
+        result = self.wrapper.run_command(cmd, check=False, operation="gif")
+        if result.returncode != 0:
+            raise Exception(result.stderr[-200:])
+
         return output_paths
 
     def batch_add_watermarks(
         self,
         media_paths: List[str],
         output_dir: Optional[str] = None,
-        text: Optional[str] = None
+        text: Optional[str] = None,
+        batch_size: int = WATERMARK_BATCH_SIZE
     ) -> List[str]:
         """
         批量添加水印
 
+        水印叠加层按宽度各渲染一次；同宽度的文件分组，每组一个FFmpeg进程
+        （组数不少于并发数，组内最多batch_size个文件）。某组失败时该组逐个文件重试。
+
         Args:
             media_paths: 媒体文件路径列表
             output_dir: 输出目录（可选）
             text: 水印文字（可选）
+            batch_size: 一个FFmpeg进程最多处理的文件数（1为逐个处理）
 
         Returns:
             输出文件路径列表
@@ -314,34 +1927,81 @@ class MediaProcessor:
         if output_dir is None:
             output_dir = str(Path(media_paths[0]).parent)
 
-        output_paths = []
-
         logger.info(f"批量添加水印到{len(media_paths)}个文件...")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+        watermark = WatermarkSpec(text=text or self.watermark_text)
+        targets: Dict[str, str] = {}
+        by_width: Dict[int, List[str]] = {}
+        failed: Dict[str, str] = {}
         for media_path in media_paths:
-            try:
-                filename = Path(media_path).stem
-                suffix = Path(media_path).suffix
+            filename = Path(media_path).stem
+            suffix = Path(media_path).suffix
 
-                # 生成输出路径
-                if "_wm" not in filename:
-                    output_filename = f"{filename}_wm{suffix}"
-                else:
-                    output_filename = f"{filename}{suffix}"
+            # 生成输出路径
+            if "_wm" not in filename:
+                output_filename = f"{filename}_wm{suffix}"
+            else:
+                output_filename = f"{filename}{suffix}"
+            targets[media_path] = os.path.join(output_dir, output_filename)
+
+            try:
+                by_width.setdefault(self._media_width(media_path), []).append(media_path)
+            except Exception as e:
+                failed[media_path] = str(e)
 
-                output_path = os.path.join(output_dir, output_filename)
+        # 分组：保持并发度的前提下尽量让一个进程处理多个文件
+        workers = self.executor.max_workers
+        size = max(1, min(batch_size, -(-len(media_paths) // workers)))
+        jobs = []
+        for width, paths in by_width.items():
+            for start in range(0, len(paths), size):
+                group = paths[start:start + size]
+                jobs.append(MediaJob(
+                    kind="watermark",
+                    func=self._add_watermarks_batch,
+                    kwargs={
+                        "media_paths": group,
+                        "output_paths": [targets[path] for path in group],
+                        "watermark": watermark,
+                        "width": width
+                    }
+                ))
 
-                result_path = self.add_watermark(
-                    media_path=media_path,
-                    output_path=output_path,
-                    text=text
-                )
+        done: Set[str] = set()
+        retry = []
+        with self.track_progress():
+            for job, result in zip(jobs, self.run_jobs(jobs)):
+                group = job.kwargs["media_paths"]
+                if result.ok:
+                    done.update(group)
+                elif len(group) > 1:
+                    logger.warning(f"批量水印失败，逐个重试{len(group)}个文件: {result.error}")
+                    retry.extend(group)
+                else:
+                    failed[group[0]] = result.error
 
-                output_paths.append(result_path)
+            if retry:
+                retry_jobs = [
+                    MediaJob(
+                        kind="watermark",
+                        func=self.add_watermark,
+                        kwargs={"media_path": path, "output_path": targets[path], "text": watermark.text}
+                    )
+                    for path in retry
+                ]
+                for media_path, result in zip(retry, self.run_jobs(retry_jobs)):
+                    if result.ok:
+                        done.add(media_path)
+                    else:
+                        failed[media_path] = result.error
 
-            except Exception as e:
-                logger.error(f"✗ 水印添加失败: {media_path} - {e}")
-                continue
+        output_paths = []
+        for media_path in media_paths:
+            if media_path in done:
+                output_paths.append(targets[media_path])
+            else:
+                logger.error(f"✗ 水印添加失败: {media_path} - {failed.get(media_path)}")
 
         logger.success(f"批量水印添加完成: {len(output_paths)}/{len(media_paths)} 成功")
         return output_paths
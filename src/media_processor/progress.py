@@ -0,0 +1,204 @@
+"""FFmpeg进度遥测 - 解析 -progress 输出并汇总批量吞吐"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+from loguru import logger
+
+# 实时汇总日志的最小间隔（秒）
+LOG_INTERVAL = 2.0
+
+
+def parse_out_time(value: str) -> Optional[float]:
+    """
+    解析 out_time（HH:MM:SS.microseconds）为秒
+
+    Args:
+        value: -progress 输出中的 out_time 值
+
+    Returns:
+        秒数，无法解析（如 N/A）时为None
+    """
+    try:
+        hours, minutes, seconds = value.strip().split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+class FFmpegProgressParser:
+    """
+    -progress 输出解析器
+
+    FFmpeg每隔约0.5秒输出一组 key=value 行，以 progress=continue/end 结尾；
+    feed 逐行累积，在一组结束时返回快照：
+    {frame, fps, speed, out_time, progress}
+    多输出命令（split）中 frame/out_time 为第一个输出的统计。
+    """
+
+    def __init__(self):
+        self._fields: Dict[str, str] = {}
+
+    def feed(self, line: str) -> Optional[Dict]:
+        """
+        输入一行输出
+
+        Args:
+            line: -progress 输出行
+
+        Returns:
+            一组结束时返回快照字典，否则为None
+        """
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        self._fields[key] = value.strip()
+        if key != "progress":
+            return None
+
+        fields, self._fields = self._fields, {}
+        return {
+            "frame": self._number(fields.get("frame"), int) or 0,
+            "fps": self._number(fields.get("fps"), float) or 0.0,
+            "speed": self._number(fields.get("speed", "").rstrip("x"), float) or 0.0,
+            "out_time": self._out_time(fields),
+            "progress": value.strip()
+        }
+
+    @staticmethod
+    def _number(value: Optional[str], cast: Callable):
+        """解析数值（N/A等返回None）"""
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _out_time(fields: Dict[str, str]) -> float:
+        """输出时长（秒），优先使用微秒字段"""
+        micros = FFmpegProgressParser._number(fields.get("out_time_us"), int)
+        if micros is not None and micros >= 0:
+            return micros / 1_000_000
+        return max(0.0, parse_out_time(fields.get("out_time", "")) or 0.0)
+
+
+class ProgressTracker:
+    """
+    批量FFmpeg进度汇总
+
+    每个FFmpeg进程注册为一个任务，update 记录其最新快照；汇总吞吐为
+    运行中任务的fps/speed之和（实时），以及已输出帧数/时长除以总耗时（平均）。
+    可设置回调接收每个快照，并按 log_interval 节流输出实时吞吐日志。
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[str, Dict], None]] = None,
+        log_interval: Optional[float] = LOG_INTERVAL
+    ):
+        """
+        初始化汇总器
+
+        Args:
+            callback: 快照回调 (任务标签, 快照)
+            log_interval: 实时吞吐日志间隔（秒），None不输出
+        """
+        self.callback = callback
+        self.log_interval = log_interval
+        self.jobs: Dict[int, Dict] = {}
+        self.started_at = time.monotonic()
+        self._next_id = 0
+        self._last_log = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, label: str) -> int:
+        """
+        注册一个FFmpeg任务
+
+        Args:
+            label: 任务标签（一般为输出文件名）
+
+        Returns:
+            任务ID
+        """
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self.jobs[job_id] = {
+                "label": label,
+                "frame": 0,
+                "fps": 0.0,
+                "speed": 0.0,
+                "out_time": 0.0,
+                "done": False
+            }
+        return job_id
+
+    def update(self, job_id: int, snapshot: Dict) -> None:
+        """
+        记录任务的最新快照
+
+        Args:
+            job_id: 任务ID
+            snapshot: FFmpegProgressParser 返回的快照
+        """
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update({key: snapshot[key] for key in ("frame", "fps", "speed", "out_time")})
+            label = job["label"]
+
+            now = time.monotonic()
+            log_due = self.log_interval is not None and now - self._last_log >= self.log_interval
+            if log_due:
+                self._last_log = now
+
+        if self.callback is not None:
+            self.callback(label, snapshot)
+        if log_due:
+            logger.info(self.readout())
+
+    def finish(self, job_id: int) -> None:
+        """标记任务结束"""
+        with self._lock:
+            self.jobs[job_id]["done"] = True
+
+    def summary(self) -> Dict:
+        """
+        汇总吞吐
+
+        Returns:
+            汇总字典，包含：
+            - jobs / running / finished: 任务数
+            - frames: 已输出帧数
+            - out_time: 已输出时长（秒）
+            - elapsed: 自创建以来的耗时（秒）
+            - fps / speed: 运行中任务的实时帧率/倍速之和
+            - avg_fps / avg_speed: 平均帧率/倍速（已输出量 / 耗时）
+        """
+        with self._lock:
+            jobs = [dict(job) for job in self.jobs.values()]
+
+        running = [job for job in jobs if not job["done"]]
+        frames = sum(job["frame"] for job in jobs)
+        out_time = sum(job["out_time"] for job in jobs)
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return {
+            "jobs": len(jobs),
+            "running": len(running),
+            "finished": len(jobs) - len(running),
+            "frames": frames,
+            "out_time": out_time,
+            "elapsed": elapsed,
+            "fps": sum(job["fps"] for job in running),
+            "speed": sum(job["speed"] for job in running),
+            "avg_fps": frames / elapsed,
+            "avg_speed": out_time / elapsed
+        }
+
+    def readout(self) -> str:
+        """单行吞吐描述"""
+        stats = self.summary()
+        return (
+            f"FFmpeg进度: {stats['finished']}/{stats['jobs']} 完成, {stats['running']} 运行中, "
+            f"{stats['frames']}帧, 实时 {stats['fps']:.0f} fps / {stats['speed']:.1f}x, "
+            f"平均 {stats['avg_fps']:.0f} fps / {stats['avg_speed']:.1f}x"
+        )
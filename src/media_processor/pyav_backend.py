@@ -0,0 +1,370 @@
+"""进程内解码后端 - 基于PyAV，每个视频只打开一次解复用器/解码器"""
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from src.media_processor.watermark_overlay import watermark_overlays
+from src.models.video import WatermarkSpec
+
+# 目标时间与当前解码位置相距超过此值（秒）时重新seek，否则继续顺序解码
+RESEEK_GAP = 10.0
+
+
+def jpeg_quality(qscale: int) -> int:
+    """
+    将FFmpeg的 -q:v（2-31，越小越好）换算为Pillow的JPEG质量（1-95）
+
+    Args:
+        qscale: FFmpeg质量参数
+
+    Returns:
+        Pillow质量参数
+    """
+    return max(1, min(95, round(100 - (qscale - 1) * 3.5)))
+
+
+def draw_watermark(image: Any, watermark: WatermarkSpec) -> Any:
+    """
+    在PIL图像上叠加水印（位置与FFmpegWrapper.drawtext_filter一致）
+
+    水印文字按目标宽度只渲染一次（见 WatermarkOverlayCache），每帧只做alpha混合。
+
+    Args:
+        image: PIL图像（RGB）
+        watermark: 水印参数
+
+    Returns:
+        叠加水印后的RGB图像
+    """
+    return watermark_overlays.blend(image, watermark)
+
+
+class PyAVDecoder:
+    """
+    进程内解码后端
+
+    每个视频保持一个打开的容器和解码器，多个时间戳按升序在同一解码会话中
+    依次读取（间隔较近时顺序解码，较远时重新seek），帧以NumPy数组交出，
+    JPEG/GIF由Pillow在进程内编码，不再为每个产物启动FFmpeg进程。
+    同一视频的读取串行执行（PyAV容器不是线程安全的）。
+    """
+
+    def __init__(self, reseek_gap: float = RESEEK_GAP, thread_type: str = "AUTO"):
+        """
+        初始化解码后端
+
+        Args:
+            reseek_gap: 超过该间隔（秒）时重新seek
+            thread_type: 解码线程模式（AUTO/FRAME/SLICE）
+        """
+        try:
+            import av  # noqa: F401
+        except ImportError:
+            raise Exception("PyAV未安装，请运行: pip install av")
+
+        self.reseek_gap = reseek_gap
+        self.thread_type = thread_type
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, video_path: str) -> Dict[str, Any]:
+        """获取（必要时打开）视频的解码会话"""
+        import av
+
+        key = str(Path(video_path).resolve())
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        try:
+            container = av.open(str(video_path))
+        except Exception as e:
+            raise Exception(f"打开视频失败: {e}")
+
+        stream = container.streams.video[0]
+        stream.thread_type = self.thread_type
+        session = {
+            "container": container,
+            "stream": stream,
+            "frames": None,
+            "frame": None
+        }
+        self._sessions[key] = session
+        logger.debug(f"打开解码会话: {Path(video_path).name}")
+        return session
+
+    def _video_lock(self, video_path: str) -> threading.Lock:
+        """同一视频的会话锁"""
+        key = str(Path(video_path).resolve())
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _frame_time(frame: Any, stream: Any) -> float:
+        """帧相对视频流起点的显示时间（秒）"""
+        return float((frame.pts - (stream.start_time or 0)) * stream.time_base)
+
+    def _seek(self, session: Dict[str, Any], timestamp: float) -> None:
+        """seek到目标时间之前的关键帧并重建解码迭代器"""
+        stream = session["stream"]
+        offset = int(max(0.0, timestamp) / stream.time_base)
+        if stream.start_time is not None:
+            offset += stream.start_time
+        session["container"].seek(offset, stream=stream, backward=True, any_frame=False)
+        session["frames"] = session["container"].decode(stream)
+        session["frame"] = None
+
+    def _frame_at(self, session: Dict[str, Any], timestamp: float) -> Any:
+        """
+        读取显示时间不早于目标时间的第一帧（与FFmpeg输入端 -ss 相同）
+
+        当前会话位置在目标之前且距离不超过reseek_gap时继续顺序解码，否则重新seek。
+        """
+        stream = session["stream"]
+        current = session["frame"]
+        if current is not None:
+            current_time = self._frame_time(current, stream)
+            if current_time >= timestamp and current_time - timestamp < 1e-3:
+                return current
+            if current_time > timestamp or timestamp - current_time > self.reseek_gap:
+                self._seek(session, timestamp)
+        else:
+            self._seek(session, timestamp)
+
+        last = None
+        for frame in session["frames"]:
+            session["frame"] = frame
+            last = frame
+            if self._frame_time(frame, stream) >= timestamp - 1e-3:
+                return frame
+
+        # 超出视频结尾时返回最后一帧
+        if last is None:
+            raise Exception(f"解码失败: {timestamp:.3f}秒之后没有视频帧")
+        return last
+
+    def read_frames(self, video_path: str, timestamps: List[float]) -> List[Any]:
+        """
+        在同一解码会话中读取多个时间点的帧
+
+        Args:
+            video_path: 视频文件路径
+            timestamps: 时间戳列表（任意顺序）
+
+        Returns:
+            与timestamps一一对应的RGB帧（NumPy数组，形状 H x W x 3）
+        """
+        order = sorted(range(len(timestamps)), key=lambda i: timestamps[i])
+        frames: List[Any] = [None] * len(timestamps)
+
+        with self._video_lock(video_path):
+            session = self._session(video_path)
+            for index in order:
+                frame = self._frame_at(session, timestamps[index])
+                frames[index] = frame.to_ndarray(format="rgb24")
+        return frames
+
+    def read_clip(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        fps: int,
+        width: Optional[int] = None
+    ) -> List[Any]:
+        """
+        读取一段视频并按目标帧率抽帧
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            fps: 目标帧率
+            width: 缩放宽度（可选，高度按比例取偶数）
+
+        Returns:
+            RGB帧列表（NumPy数组）
+        """
+        end_time = start_time + duration
+        step = 1.0 / fps
+        next_time = start_time
+        frames: List[Any] = []
+
+        with self._video_lock(video_path):
+            session = self._session(video_path)
+            stream = session["stream"]
+            self._seek(session, start_time)
+
+            for frame in session["frames"]:
+                session["frame"] = frame
+                frame_time = self._frame_time(frame, stream)
+                if frame_time >= end_time - 1e-3:
+                    break
+                if frame_time < next_time - 1e-3:
+                    continue
+
+                if width:
+                    height = max(2, round(frame.height * width / frame.width / 2) * 2)
+                    frame = frame.reformat(width=width, height=height, interpolation="LANCZOS")
+                frames.append(frame.to_ndarray(format="rgb24"))
+                while next_time <= frame_time + 1e-3:
+                    next_time += step
+
+        if not frames:
+            raise Exception(f"解码失败: {start_time:.3f}秒起没有视频帧")
+        return frames
+
+    def write_jpeg(
+        self,
+        frame: Any,
+        output_path: str,
+        quality: int = 2,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> str:
+        """
+        将帧编码为JPEG
+
+        Args:
+            frame: RGB帧（NumPy数组）
+            output_path: 输出文件路径
+            quality: FFmpeg风格质量参数（2-31，越小越好）
+            watermark: 水印参数（可选）
+
+        Returns:
+            输出文件路径
+        """
+        from PIL import Image
+
+        image = Image.fromarray(frame)
+        if watermark:
+            image = draw_watermark(image, watermark)
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        image.save(output_path, format="JPEG", quality=jpeg_quality(quality))
+        return output_path
+
+    def write_gif(
+        self,
+        frames: List[Any],
+        output_path: str,
+        fps: int,
+        watermark: Optional[WatermarkSpec] = None,
+        colors: int = 256
+    ) -> str:
+        """
+        将帧序列编码为GIF（全片共用一个调色板，等价于palettegen+paletteuse）
+
+        Args:
+            frames: RGB帧列表（NumPy数组）
+            output_path: 输出文件路径
+            fps: 帧率
+            watermark: 水印参数（可选）
+            colors: 调色板颜色数
+
+        Returns:
+            输出文件路径
+        """
+        import numpy as np
+        from PIL import Image
+
+        images = [Image.fromarray(frame) for frame in frames]
+        if watermark:
+            images = [draw_watermark(image, watermark) for image in images]
+
+        # 用均匀抽样的帧拼成一张图生成全局调色板
+        samples = images[::max(1, len(images) // 16)]
+        mosaic = Image.fromarray(np.concatenate([np.asarray(image) for image in samples], axis=0))
+        palette = mosaic.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+
+        quantized = [
+            image.quantize(palette=palette, dither=Image.Dither.FLOYDSTEINBERG)
+            for image in images
+        ]
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        quantized[0].save(
+            output_path,
+            format="GIF",
+            save_all=True,
+            append_images=quantized[1:],
+            duration=round(1000 / fps),
+            loop=0
+        )
+        return output_path
+
+    def extract_screenshots(
+        self,
+        video_path: str,
+        timestamps: List[float],
+        output_paths: List[str],
+        quality: int = 2,
+        watermark: Optional[WatermarkSpec] = None
+    ) -> List[str]:
+        """
+        一次解码会话提取多张截图
+
+        Args:
+            video_path: 视频文件路径
+            timestamps: 时间戳列表
+            output_paths: 与时间戳对应的输出路径
+            quality: FFmpeg风格质量参数
+            watermark: 水印参数（可选）
+
+        Returns:
+            输出路径列表
+        """
+        if len(timestamps) != len(output_paths) or not timestamps:
+            raise ValueError("timestamps与output_paths数量必须一致且不为空")
+
+        frames = self.read_frames(video_path, timestamps)
+        for frame, output_path in zip(frames, output_paths):
+            self.write_jpeg(frame, output_path, quality=quality, watermark=watermark)
+        return output_paths
+
+    def generate_gif(
+        self,
+        video_path: str,
+        start_time: float,
+        duration: float,
+        output_path: str,
+        width: int = 480,
+        fps: int = 10,
+        watermark: Optional[WatermarkSpec] = None,
+        colors: int = 256
+    ) -> str:
+        """
+        进程内生成GIF
+
+        Args:
+            video_path: 视频文件路径
+            start_time: 开始时间（秒）
+            duration: 持续时长（秒）
+            output_path: 输出文件路径
+            width: 宽度（像素）
+            fps: 帧率
+            watermark: 水印参数（可选）
+            colors: 调色板颜色数
+
+        Returns:
+            输出文件路径
+        """
+        frames = self.read_clip(video_path, start_time, duration, fps, width=width)
+        return self.write_gif(frames, output_path, fps, watermark=watermark, colors=colors)
+
+    def close(self, video_path: Optional[str] = None) -> None:
+        """
+        关闭解码会话
+
+        Args:
+            video_path: 只关闭该视频（可选，默认全部）
+        """
+        keys = list(self._sessions) if video_path is None else [str(Path(video_path).resolve())]
+        for key in keys:
+            session = self._sessions.pop(key, None)
+            if session is not None:
+                session["container"].close()
@@ -0,0 +1,136 @@
+"""子进程资源记录 - 每次ffmpeg/ffprobe/yt-dlp调用的耗时、CPU时间与峰值内存"""
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from loguru import logger
+
+
+class ResourceLedger:
+    """
+    资源记录
+
+    每个子进程一条记录：operation（screenshot/gif/watermark/probe/download等）、
+    command、status、returncode、wall_time、user_cpu、sys_cpu（秒）、peak_rss_mb。
+    设置 path 时每条记录立即追加到JSONL文件，流水线中途退出也不会丢失。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        初始化记录
+
+        Args:
+            path: JSONL输出路径（可选）
+        """
+        self.path = Path(path) if path else None
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(self, record: Dict) -> None:
+        """
+        追加一条记录
+
+        Args:
+            record: 资源记录字典
+        """
+        record = {"time": datetime.now().isoformat(timespec="milliseconds"), **record}
+        with self._lock:
+            self.records.append(record)
+            if self.path is not None:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        按操作类型汇总
+
+        Returns:
+            {operation: {count, failed, wall_time, user_cpu, sys_cpu, cpu_per_wall, max_rss_mb}}
+            （时间为总和，cpu_per_wall为平均占用核数）
+        """
+        with self._lock:
+            records = list(self.records)
+
+        summary: Dict[str, Dict] = {}
+        for record in records:
+            stats = summary.setdefault(record["operation"], {
+                "count": 0,
+                "failed": 0,
+                "wall_time": 0.0,
+                "user_cpu": 0.0,
+                "sys_cpu": 0.0,
+                "max_rss_mb": 0.0
+            })
+            stats["count"] += 1
+            stats["failed"] += record["status"] != "ok"
+            stats["wall_time"] += record["wall_time"]
+            stats["user_cpu"] += record["user_cpu"] or 0.0
+            stats["sys_cpu"] += record["sys_cpu"] or 0.0
+            stats["max_rss_mb"] = max(stats["max_rss_mb"], record["peak_rss_mb"] or 0.0)
+
+        for stats in summary.values():
+            cpu = stats["user_cpu"] + stats["sys_cpu"]
+            stats["cpu_per_wall"] = cpu / stats["wall_time"] if stats["wall_time"] else 0.0
+        return summary
+
+    def summary_table(self) -> str:
+        """汇总表（每种操作一行，最后一行为合计）"""
+        summary = self.summary()
+        header = (
+            f"{'操作':<12}{'次数':>6}{'失败':>6}{'耗时(s)':>10}{'用户CPU(s)':>12}"
+            f"{'系统CPU(s)':>12}{'核数':>7}{'峰值内存(MB)':>14}"
+        )
+        lines = [header, "-" * len(header)]
+
+        total = {"count": 0, "failed": 0, "wall_time": 0.0, "user_cpu": 0.0, "sys_cpu": 0.0, "max_rss_mb": 0.0}
+        for operation, stats in sorted(summary.items(), key=lambda item: -item[1]["wall_time"]):
+            lines.append(self._row(operation, stats))
+            for key in ("count", "failed", "wall_time", "user_cpu", "sys_cpu"):
+                total[key] += stats[key]
+            total["max_rss_mb"] = max(total["max_rss_mb"], stats["max_rss_mb"])
+
+        cpu = total["user_cpu"] + total["sys_cpu"]
+        total["cpu_per_wall"] = cpu / total["wall_time"] if total["wall_time"] else 0.0
+        lines.append(self._row("合计", total))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _row(operation: str, stats: Dict) -> str:
+        """汇总表的一行"""
+        return (
+            f"{operation:<12}{stats['count']:>6}{stats['failed']:>6}{stats['wall_time']:>10.2f}"
+            f"{stats['user_cpu']:>12.2f}{stats['sys_cpu']:>12.2f}{stats['cpu_per_wall']:>7.2f}"
+            f"{stats['max_rss_mb']:>14.1f}"
+        )
+
+
+@contextmanager
+def track_resources(name: str, log_dir: str = "./logs") -> Iterator[ResourceLedger]:
+    """
+    记录一次流水线运行中全部子进程的资源用量
+
+    记录写入 {log_dir}/resources/{name}_{时间}.jsonl，结束时输出汇总表。
+
+    Args:
+        name: 流水线名称
+        log_dir: 日志目录
+
+    Yields:
+        ResourceLedger对象
+    """
+    from src.media_processor.subprocess_runner import runner
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ledger = ResourceLedger(str(Path(log_dir) / "resources" / f"{name}_{stamp}.jsonl"))
+    previous, runner.ledger = runner.ledger, ledger
+    try:
+        yield ledger
+    finally:
+        runner.ledger = previous
+        if ledger.records:
+            logger.info(f"子进程资源用量 ({len(ledger.records)} 次调用, 记录: {ledger.path}):\n{ledger.summary_table()}")
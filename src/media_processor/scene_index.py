@@ -0,0 +1,149 @@
+"""镜头切换索引 - 一次低分辨率解码检测场景切换，关键时刻吸附到最近的切点"""
+import json
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 索引结构或检测方式变化时递增，使旧的持久化文件失效
+SCENE_VERSION = 1
+
+# 场景变化分数阈值（select滤镜的scene，0-1），越小检测到的切点越多
+SCENE_THRESHOLD = 0.3
+
+# 检测前缩放到的宽度（像素），场景分数只需要低分辨率
+SCENE_WIDTH = 160
+
+# 吸附容差（秒）：时间戳与最近切点相距不超过该值时吸附
+SCENE_SNAP_TOLERANCE = 2.0
+
+# 检测命令在临时目录中输出的切点文件
+SCENES_FILE = "scenes.txt"
+
+
+def scene_sidecar(video_path: str) -> Path:
+    """持久化文件路径（视频旁的 {视频文件名}.scenes.json）"""
+    path = Path(video_path)
+    return path.with_name(f"{path.name}.scenes.json")
+
+
+def parse_scene_cuts(text: str) -> List[Tuple[float, float]]:
+    """
+    解析 metadata=mode=print 输出的切点
+
+    Args:
+        text: 输出文本（每个切点一行 "frame:N pts:P pts_time:T"，后跟 lavfi.scene_score=S）
+
+    Returns:
+        [(切点时间, 场景分数)]，按时间排序
+    """
+    cuts = []
+    current = None
+    for line in text.splitlines():
+        if line.startswith("frame:"):
+            current = None
+            for field in line.split():
+                if field.startswith("pts_time:"):
+                    current = float(field.split(":", 1)[1])
+        elif line.startswith("lavfi.scene_score=") and current is not None:
+            cuts.append((current, float(line.split("=", 1)[1])))
+            current = None
+    return sorted(cuts)
+
+
+class SceneIndex:
+    """
+    镜头切换索引
+
+    切点为新镜头第一帧的时间（输入端 -ss 到该时间取到的正是切换后的第一帧）。
+    结果按 (大小, 修改时间, 阈值) 持久化到 {视频文件名}.scenes.json。
+    """
+
+    def __init__(self, cuts: List[float], scores: Optional[List[float]] = None, threshold: float = SCENE_THRESHOLD):
+        """
+        初始化索引
+
+        Args:
+            cuts: 升序排列的切点时间列表（秒）
+            scores: 与切点对应的场景分数（可选）
+            threshold: 检测阈值
+        """
+        self.cuts = cuts
+        self.scores = scores or [1.0] * len(cuts)
+        self.threshold = threshold
+
+    def __len__(self) -> int:
+        return len(self.cuts)
+
+    def nearest(self, timestamp: float) -> Optional[float]:
+        """距离目标时间最近的切点（没有切点时为None）"""
+        pos = bisect_left(self.cuts, timestamp)
+        candidates = [self.cuts[i] for i in (pos - 1, pos) if 0 <= i < len(self.cuts)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda cut: abs(cut - timestamp))
+
+    def snap(self, timestamp: float, tolerance: float = SCENE_SNAP_TOLERANCE) -> float:
+        """
+        吸附到容差范围内最近的切点
+
+        Args:
+            timestamp: 时间（秒）
+            tolerance: 容差（秒）
+
+        Returns:
+            切点时间，范围内没有切点时返回原时间
+        """
+        cut = self.nearest(timestamp)
+        if cut is None or abs(cut - timestamp) > tolerance:
+            return timestamp
+        return cut
+
+    @classmethod
+    def load(cls, path: Path, size: int, mtime_ns: int, threshold: float) -> Optional["SceneIndex"]:
+        """
+        读取持久化的索引
+
+        Args:
+            path: 持久化文件路径
+            size: 当前视频大小
+            mtime_ns: 当前视频修改时间
+            threshold: 需要的检测阈值
+
+        Returns:
+            SceneIndex对象，文件不存在、损坏或与视频/阈值不一致时为None
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            data.get("version") != SCENE_VERSION
+            or data.get("size") != size
+            or data.get("mtime_ns") != mtime_ns
+            or data.get("threshold") != threshold
+        ):
+            return None
+        return cls([cut["time"] for cut in data["cuts"]], [cut["score"] for cut in data["cuts"]], threshold)
+
+    def save(self, path: Path, size: int, mtime_ns: int) -> None:
+        """
+        持久化索引
+
+        Args:
+            path: 持久化文件路径
+            size: 视频大小
+            mtime_ns: 视频修改时间
+        """
+        data: Dict = {
+            "version": SCENE_VERSION,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "threshold": self.threshold,
+            "cuts": [{"time": cut, "score": score} for cut, score in zip(self.cuts, self.scores)]
+        }
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp_path.replace(path)
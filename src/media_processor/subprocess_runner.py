@@ -0,0 +1,533 @@
+"""受管子进程执行 - 超时、协作式取消、进程组清理与stderr尾部"""
+import asyncio
+import atexit
+import ctypes
+import functools
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from loguru import logger
+from src.media_processor.resource_usage import ResourceLedger
+
+# 失败时保留的stderr尾部长度（字符）
+STDERR_TAIL_CHARS = 4000
+
+# 等待子进程期间检查取消/截止时间的间隔（秒）
+POLL_INTERVAL = 0.2
+
+# Linux prctl选项：父进程退出时内核向子进程发送指定信号
+PR_SET_PDEATHSIG = 1
+
+
+def _load_prctl() -> Optional[Callable[..., int]]:
+    """加载libc的prctl（仅Linux；fork后子进程中不能再加载）"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return ctypes.CDLL(None, use_errno=True).prctl
+    except (OSError, AttributeError):
+        return None
+
+
+_prctl = _load_prctl()
+
+
+def _set_parent_death_signal(parent_pid: int) -> None:
+    """
+    在子进程中（fork之后、exec之前）设置父进程退出时收到SIGKILL
+
+    子进程位于独立会话，收不到终端的Ctrl-C；父进程被SIGKILL等无法清理的方式
+    终止时，由内核负责结束子进程。
+
+    Args:
+        parent_pid: 启动子进程的父进程pid（fork前已退出时子进程立即退出）
+    """
+    _prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+    if os.getppid() != parent_pid:
+        os._exit(1)
+
+
+class SubprocessCancelled(Exception):
+    """子进程被取消"""
+
+
+class CancelToken:
+    """协作式取消令牌：cancel()后，使用该令牌的任务不再启动，运行中的子进程被终止"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """请求取消"""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._event.is_set()
+
+
+# 当前任务的截止时间（time.monotonic）与取消令牌，由 job_scope 设置
+_deadline: ContextVar[Optional[float]] = ContextVar("subprocess_deadline", default=None)
+_cancel_token: ContextVar[Optional[CancelToken]] = ContextVar("subprocess_cancel_token", default=None)
+
+
+@contextmanager
+def job_scope(timeout: Optional[float] = None, cancel: Optional[CancelToken] = None) -> Iterator[None]:
+    """
+    为当前线程内启动的子进程设置任务级截止时间与取消令牌
+
+    嵌套时截止时间取较早者；未传取消令牌时沿用外层。
+
+    Args:
+        timeout: 任务总时限（秒），None表示不限制
+        cancel: 取消令牌（可选）
+    """
+    deadline = _deadline.get()
+    if timeout:
+        job_deadline = time.monotonic() + timeout
+        deadline = job_deadline if deadline is None else min(deadline, job_deadline)
+
+    deadline_token = _deadline.set(deadline)
+    cancel_token = _cancel_token.set(cancel or _cancel_token.get())
+    try:
+        yield
+    finally:
+        _deadline.reset(deadline_token)
+        _cancel_token.reset(cancel_token)
+
+
+def stderr_tail(stderr: Optional[str], limit: int = STDERR_TAIL_CHARS) -> str:
+    """取stderr末尾（FFmpeg的错误原因在最后几行）"""
+    if not stderr:
+        return ""
+    return stderr[-limit:]
+
+
+class SubprocessRunner:
+    """
+    受管子进程执行器
+
+    每个子进程在独立的进程组（Windows为独立进程组）中启动，超时、取消或
+    父进程异常/退出时终止整个进程组，不留下孤儿编码进程。
+    设置 ledger 后，每个子进程的耗时、CPU时间与峰值内存按操作类型写入记录。
+    FFmpegWrapper、VideoProbeCache 与 VideoFetcher 共用模块级实例 runner。
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        """
+        初始化执行器
+
+        Args:
+            poll_interval: 检查取消/截止时间的间隔（秒）
+        """
+        self.poll_interval = poll_interval
+        # 资源记录（按流水线运行设置，见 resource_usage.track_resources）
+        self.ledger: Optional[ResourceLedger] = None
+        self._active: Dict[int, subprocess.Popen] = {}
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        cmd: List[str],
+        timeout: Optional[float] = None,
+        check: bool = True,
+        cancel: Optional[CancelToken] = None,
+        text: bool = True,
+        on_stdout_line: Optional[Callable[[str], None]] = None,
+        operation: Optional[str] = None,
+        **kwargs
+    ) -> subprocess.CompletedProcess:
+        """
+        执行命令并捕获输出（接口与 subprocess.run(capture_output=True) 一致）
+
+        Args:
+            cmd: 命令列表
+            timeout: 本次命令时限（秒），与 job_scope 的任务截止时间取较早者
+            check: 返回码非0时抛出 CalledProcessError
+            cancel: 取消令牌（默认使用 job_scope 设置的令牌）
+            text: 以文本方式读取输出
+            on_stdout_line: 逐行处理stdout的回调（进程运行期间调用，此时结果中stdout为空）
+            operation: 操作类型（资源记录的标签，如 screenshot/gif/probe/download），默认为命令名
+            **kwargs: 传给 subprocess.Popen 的其他参数（encoding/errors/cwd等）
+
+        Returns:
+            子进程结果（stderr只保留尾部）
+
+        Raises:
+            subprocess.TimeoutExpired: 超过时限（进程组已终止）
+            SubprocessCancelled: 被取消（进程组已终止）
+            subprocess.CalledProcessError: check=True且返回码非0
+        """
+        cancel = cancel or _cancel_token.get()
+        if cancel is not None and cancel.cancelled:
+            raise SubprocessCancelled(f"已取消: {cmd[0]}")
+
+        deadline = _deadline.get()
+        if timeout:
+            deadline = time.monotonic() + timeout if deadline is None else min(deadline, time.monotonic() + timeout)
+
+        started = time.monotonic()
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=text,
+            **self._group_kwargs(),
+            **kwargs
+        )
+        with self._lock:
+            self._active[process.pid] = process
+
+        # 等待线程回收子进程（POSIX下同时取得其资源用量），读取线程收集输出
+        exited = threading.Event()
+        usage: Dict[str, float] = {}
+        stdout_chunks: List = []
+        stderr_chunks: List = []
+        threads = [
+            threading.Thread(target=self._wait, args=(process, usage, exited), daemon=True),
+            threading.Thread(
+                target=self._read_lines if on_stdout_line is not None else self._read_all,
+                args=(process.stdout, on_stdout_line if on_stdout_line is not None else stdout_chunks),
+                daemon=True
+            ),
+            threading.Thread(target=self._read_all, args=(process.stderr, stderr_chunks), daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+
+        status = "ok"
+        try:
+            while not exited.wait(self._wait_time(deadline)):
+                if cancel is not None and cancel.cancelled:
+                    status = "cancelled"
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    status = "timeout"
+                    break
+
+            if status != "ok":
+                self._kill(process)
+                exited.wait()
+            for thread in threads[1:]:
+                thread.join()
+        except BaseException:
+            # KeyboardInterrupt等：不留下运行中的子进程
+            status = "interrupted"
+            if not exited.is_set():
+                self._kill(process)
+                exited.wait(5)
+            raise
+        finally:
+            with self._lock:
+                self._active.pop(process.pid, None)
+            if status == "ok" and process.returncode != 0:
+                status = "failed"
+            self._record(cmd, operation, status, process.returncode, time.monotonic() - started, usage)
+
+        empty = "" if text else b""
+        stdout = empty.join(stdout_chunks)
+        stderr = empty.join(stderr_chunks)
+        if text:
+            stderr = stderr_tail(stderr)
+
+        if status == "cancelled":
+            raise SubprocessCancelled(f"已取消: {cmd[0]}")
+        if status == "timeout":
+            logger.warning(f"子进程超时，已终止进程组: {cmd[0]} (pid {process.pid})")
+            raise subprocess.TimeoutExpired(cmd, timeout or 0, output=stdout, stderr=stderr)
+        if check and process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    async def run_async(
+        self,
+        cmd: List[str],
+        timeout: Optional[float] = None,
+        check: bool = True,
+        text: bool = True,
+        on_stdout_line: Optional[Callable[[str], None]] = None,
+        operation: Optional[str] = None,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> subprocess.CompletedProcess:
+        """
+        run 的asyncio版本（asyncio子进程，不占用线程）
+
+        任务被取消（asyncio.CancelledError）、取消令牌触发或超时时终止整个进程组。
+        子进程由事件循环回收，资源记录只有耗时（CPU时间与峰值内存为None）。
+
+        Args:
+            cmd: 命令列表
+            timeout: 本次命令时限（秒），与 job_scope 的任务截止时间取较早者
+            check: 返回码非0时抛出 CalledProcessError
+            text: 以文本方式返回输出
+            on_stdout_line: 逐行处理stdout的回调（此时结果中stdout为空）
+            operation: 操作类型（资源记录标签）
+            semaphore: 并发上限（可选，等待期间不启动进程）
+
+        Returns:
+            子进程结果（stderr只保留尾部）
+
+        Raises:
+            subprocess.TimeoutExpired: 超过时限（进程组已终止）
+            SubprocessCancelled: 被取消（进程组已终止）
+            subprocess.CalledProcessError: check=True且返回码非0
+        """
+        if semaphore is None:
+            return await self._run_async(cmd, timeout, check, text, on_stdout_line, operation)
+        async with semaphore:
+            return await self._run_async(cmd, timeout, check, text, on_stdout_line, operation)
+
+    async def _run_async(
+        self,
+        cmd: List[str],
+        timeout: Optional[float],
+        check: bool,
+        text: bool,
+        on_stdout_line: Optional[Callable[[str], None]],
+        operation: Optional[str]
+    ) -> subprocess.CompletedProcess:
+        """启动并等待一个asyncio子进程"""
+        cancel = _cancel_token.get()
+        if cancel is not None and cancel.cancelled:
+            raise SubprocessCancelled(f"已取消: {cmd[0]}")
+
+        deadline = _deadline.get()
+        if timeout:
+            deadline = time.monotonic() + timeout if deadline is None else min(deadline, time.monotonic() + timeout)
+
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            **self._group_kwargs()
+        )
+        with self._lock:
+            self._active[process.pid] = process
+
+        readers = asyncio.gather(
+            self._read_stream_async(process.stdout, on_stdout_line),
+            process.stderr.read()
+        )
+        # 与同步路径一致：等待期间按 poll_interval 检查取消令牌与截止时间
+        waiter = asyncio.ensure_future(process.wait())
+        status = "ok"
+        try:
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=self._wait_time(deadline))
+                if done:
+                    break
+                if cancel is not None and cancel.cancelled:
+                    status = "cancelled"
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    status = "timeout"
+                    break
+
+            if status != "ok":
+                self._kill(process)
+                await waiter
+            stdout, stderr = await readers
+        except BaseException:
+            # asyncio.CancelledError等：不留下运行中的子进程
+            status = "interrupted"
+            self._kill(process)
+            waiter.cancel()
+            readers.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._active.pop(process.pid, None)
+            if status == "ok" and process.returncode != 0:
+                status = "failed"
+            self._record(cmd, operation, status, process.returncode, time.monotonic() - started, {})
+
+        if text:
+            stdout = stdout.decode("utf-8", errors="replace")
+            stderr = stderr_tail(stderr.decode("utf-8", errors="replace"))
+
+        if status == "cancelled":
+            raise SubprocessCancelled(f"已取消: {cmd[0]}")
+        if status == "timeout":
+            logger.warning(f"子进程超时，已终止进程组: {cmd[0]} (pid {process.pid})")
+            raise subprocess.TimeoutExpired(cmd, timeout or 0, output=stdout, stderr=stderr)
+        if check and process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    @staticmethod
+    async def _read_stream_async(stream: asyncio.StreamReader, callback: Optional[Callable[[str], None]]) -> bytes:
+        """读取asyncio子进程输出；有回调时逐行交给回调并返回空"""
+        if callback is None:
+            return await stream.read()
+
+        async for line in stream:
+            try:
+                callback(line.decode("utf-8", errors="replace"))
+            except Exception as e:
+                logger.debug(f"输出回调失败: {e}")
+        return b""
+
+    def _wait_time(self, deadline: Optional[float]) -> float:
+        """下一次检查取消/截止时间前的等待时长"""
+        if deadline is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.0, deadline - time.monotonic()))
+
+    @staticmethod
+    def _wait(process: subprocess.Popen, usage: Dict[str, float], exited: threading.Event) -> None:
+        """回收子进程；POSIX下用wait4取得该子进程（含其已回收的后代）的CPU时间与峰值内存"""
+        try:
+            if hasattr(os, "wait4"):
+                try:
+                    _, wait_status, rusage = os.wait4(process.pid, 0)
+                except ChildProcessError:
+                    process.wait()
+                    return
+                process.returncode = os.waitstatus_to_exitcode(wait_status)
+                # Linux的ru_maxrss单位为KB，macOS为字节
+                rss_bytes = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+                usage.update({
+                    "user_cpu": rusage.ru_utime,
+                    "sys_cpu": rusage.ru_stime,
+                    "peak_rss_mb": rss_bytes / (1024 * 1024)
+                })
+            else:
+                process.wait()
+        finally:
+            exited.set()
+
+    @staticmethod
+    def _read_lines(stream, callback: Callable[[str], None]) -> None:
+        """逐行读取输出并回调（回调异常不影响子进程）"""
+        for line in stream:
+            try:
+                callback(line)
+            except Exception as e:
+                logger.debug(f"输出回调失败: {e}")
+        stream.close()
+
+    @staticmethod
+    def _read_all(stream, chunks: List) -> None:
+        """读取全部输出"""
+        chunks.append(stream.read())
+        stream.close()
+
+    def _record(
+        self,
+        cmd: List[str],
+        operation: Optional[str],
+        status: str,
+        returncode: Optional[int],
+        wall_time: float,
+        usage: Dict[str, float]
+    ) -> None:
+        """写入资源记录（未设置 ledger 时跳过）"""
+        ledger = self.ledger
+        if ledger is None:
+            return
+
+        command = Path(cmd[0]).name
+        ledger.record({
+            "operation": operation or command,
+            "command": command,
+            "status": status,
+            "returncode": returncode,
+            "wall_time": round(wall_time, 4),
+            "user_cpu": round(usage["user_cpu"], 4) if "user_cpu" in usage else None,
+            "sys_cpu": round(usage["sys_cpu"], 4) if "sys_cpu" in usage else None,
+            "peak_rss_mb": round(usage["peak_rss_mb"], 1) if "peak_rss_mb" in usage else None
+        })
+
+    @staticmethod
+    def _group_kwargs() -> Dict:
+        """在独立进程组中启动子进程的Popen参数（Linux下同时设置父进程退出信号）"""
+        if os.name == "nt":
+            return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        if _prctl is None:
+            return {"start_new_session": True}
+        return {
+            "start_new_session": True,
+            "preexec_fn": functools.partial(_set_parent_death_signal, os.getpid())
+        }
+
+    @staticmethod
+    def _kill(process: subprocess.Popen) -> None:
+        """终止子进程所在的整个进程组"""
+        if process.returncode is not None:
+            return
+        try:
+            if os.name == "nt":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def kill_all(self) -> int:
+        """
+        终止全部运行中的子进程组
+
+        Returns:
+            终止的进程数
+        """
+        with self._lock:
+            processes = list(self._active.values())
+        for process in processes:
+            if process.returncode is None:
+                self._kill(process)
+        return len(processes)
+
+
+# 模块级共享实例，进程退出时清理残留子进程
+runner = SubprocessRunner()
+atexit.register(runner.kill_all)
+
+
+@contextmanager
+def handle_signals(cancel: CancelToken) -> Iterator[None]:
+    """
+    在范围内拦截SIGINT/SIGTERM：触发取消令牌并终止全部运行中的子进程组，再交给原处理器
+
+    子进程位于独立会话，终端的Ctrl-C与发给父进程的SIGTERM都不会到达它们。
+    原处理器为默认行为时恢复默认并重新发送信号（SIGTERM仍然终止进程）。
+    信号处理器只能在主线程安装，其他线程中调用时不做处理。
+
+    Args:
+        cancel: 收到信号时触发的取消令牌
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    previous: Dict[int, Any] = {}
+
+    def handler(signum, frame):
+        cancel.cancel()
+        runner.kill_all()
+        original = previous[signum]
+        if callable(original):
+            original(signum, frame)
+        elif original == signal.SIG_DFL:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        original = signal.getsignal(signum)
+        if original is None or original == signal.SIG_IGN:
+            continue
+        previous[signum] = original
+        signal.signal(signum, handler)
+    try:
+        yield
+    finally:
+        for signum, original in previous.items():
+            signal.signal(signum, original)
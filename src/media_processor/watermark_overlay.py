@@ -0,0 +1,233 @@
+"""水印叠加层 - 水印文字只栅格化一次，缓存为RGBA图片后叠加到每一帧"""
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from config import settings
+from src.media_processor.subprocess_runner import runner
+from src.models.video import WatermarkSpec
+
+# 渲染方式变化时递增，使旧的叠加层缓存失效
+OVERLAY_VERSION = 1
+
+# 水印距画面边缘的距离（像素，与drawtext_filter一致）
+MARGIN = 10
+
+# 字号自动缩小的下限
+MIN_FONT_SIZE = 8
+
+# FFmpeg drawtext未指定fontfile时经fontconfig使用的字体族
+DEFAULT_FONT_FAMILY = "Sans"
+
+
+@lru_cache(maxsize=None)
+def _fontconfig_match(family: str) -> str:
+    """fc-match 解析字体族对应的字体文件（没有fc-match或解析失败时为空字符串）"""
+    try:
+        result = runner.run(["fc-match", "-f", "%{file}", family], timeout=10, check=False, operation="font")
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f"无法运行fc-match: {e}")
+        return ""
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def resolve_watermark_font(font_path: Optional[str] = None) -> str:
+    """
+    水印字体文件（drawtext滤镜与预渲染叠加层共用，两条路径的字形与字号一致）
+
+    Args:
+        font_path: 字体文件路径，默认 settings.watermark_font
+
+    Returns:
+        字体文件路径；未配置时为fontconfig解析的FFmpeg默认字体（Sans），解析失败时为空字符串
+    """
+    if font_path is None:
+        font_path = settings.watermark_font
+    return font_path or _fontconfig_match(DEFAULT_FONT_FAMILY)
+
+
+def overlay_position(position: str) -> Tuple[str, str]:
+    """
+    overlay滤镜的位置表达式（W/H为画面尺寸，w/h为叠加层尺寸）
+
+    Args:
+        position: 位置（bottom-left, bottom-right, top-left, top-right）
+
+    Returns:
+        (x表达式, y表达式)，未知位置按左下角处理
+    """
+    x_pos = f"W-w-{MARGIN}" if position.endswith("right") else str(MARGIN)
+    y_pos = str(MARGIN) if position.startswith("top") else f"H-h-{MARGIN}"
+    return x_pos, y_pos
+
+
+class WatermarkOverlayCache:
+    """
+    水印叠加层缓存
+
+    每个 (文字, 字号, 不透明度, 字体, 目标宽度) 只渲染一次：白色文字、透明背景、
+    按文字边界裁剪的RGBA图片。文字超出目标宽度时自动缩小字号。
+    叠加层同时保存在进程内（PIL图像，供进程内alpha混合）和磁盘上
+    （PNG，供FFmpeg overlay滤镜作为第二个输入）。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, font_path: Optional[str] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: PNG缓存目录，默认 {媒体缓存目录}/watermarks
+            font_path: 字体文件路径，默认见 resolve_watermark_font（首次渲染时解析）
+        """
+        if cache_dir is None:
+            media_cache_dir = settings.media_cache_dir or str(Path(settings.temp_dir) / "media_cache")
+            cache_dir = str(Path(media_cache_dir) / "watermarks")
+
+        self.cache_dir = Path(cache_dir)
+        self._font_path = font_path
+        # 实际渲染次数（缓存未命中）
+        self.renders = 0
+
+        self._images: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def font_path(self) -> str:
+        """渲染用字体文件（与 FFmpegWrapper.drawtext_filter 相同）"""
+        if not self._font_path:
+            self._font_path = resolve_watermark_font(self._font_path)
+        return self._font_path
+
+    def key(self, watermark: WatermarkSpec, width: int) -> str:
+        """
+        叠加层缓存键（位置不影响渲染结果，不计入）
+
+        Args:
+            watermark: 水印参数
+            width: 目标画面宽度（像素）
+
+        Returns:
+            SHA1十六进制字符串
+        """
+        params = {
+            "version": OVERLAY_VERSION,
+            "text": watermark.text,
+            "font_size": watermark.font_size,
+            "opacity": watermark.opacity,
+            "font": self.font_path,
+            "width": width
+        }
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _font(self, size: int) -> Any:
+        """加载指定字号的字体"""
+        from PIL import ImageFont
+
+        if not self.font_path:
+            # Pillow内置字体与drawtext的默认字体不同，同一水印会因生成路径而不同
+            raise Exception(
+                f"加载水印字体失败: 未设置WATERMARK_FONT，且fontconfig无法解析默认字体{DEFAULT_FONT_FAMILY}"
+            )
+        try:
+            return ImageFont.truetype(self.font_path, size)
+        except OSError as e:
+            raise Exception(f"加载水印字体失败: {self.font_path} - {e}")
+
+    def _render(self, watermark: WatermarkSpec, width: int) -> Any:
+        """渲染叠加层（文字超出 width - 2*MARGIN 时逐步缩小字号）"""
+        from PIL import Image, ImageDraw
+
+        size = watermark.font_size
+        while True:
+            font = self._font(size)
+            left, top, right, bottom = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox(
+                (0, 0), watermark.text, font=font
+            )
+            if right - left <= width - 2 * MARGIN or size <= MIN_FONT_SIZE:
+                break
+            size -= 1
+
+        mask = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), watermark.text, font=font, fill=255)
+
+        overlay = Image.new("RGBA", mask.size, (255, 255, 255, 0))
+        overlay.putalpha(mask.point(lambda value: round(value * watermark.opacity)))
+        if size != watermark.font_size:
+            logger.debug(f"水印字号缩小以适应宽度{width}: {watermark.font_size} -> {size}")
+        return overlay
+
+    def image(self, watermark: WatermarkSpec, width: int) -> Any:
+        """
+        获取叠加层图像（进程内缓存）
+
+        Args:
+            watermark: 水印参数
+            width: 目标画面宽度（像素）
+
+        Returns:
+            RGBA的PIL图像（调用方不应修改）
+        """
+        key = self.key(watermark, width)
+        with self._lock:
+            overlay = self._images.get(key)
+            if overlay is None:
+                overlay = self._render(watermark, width)
+                self._images[key] = overlay
+                self.renders += 1
+        return overlay
+
+    def path(self, watermark: WatermarkSpec, width: int) -> str:
+        """
+        获取叠加层PNG路径（不存在时渲染并写入缓存目录）
+
+        Args:
+            watermark: 水印参数
+            width: 目标画面宽度（像素）
+
+        Returns:
+            PNG文件路径
+        """
+        png_path = self.cache_dir / f"{self.key(watermark, width)}.png"
+        if png_path.exists():
+            return str(png_path)
+
+        overlay = self.image(watermark, width)
+        png_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再改名，并行任务不会读到写了一半的PNG
+        tmp_path = png_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        overlay.save(tmp_path, format="PNG")
+        os.replace(tmp_path, png_path)
+        return str(png_path)
+
+    def blend(self, image: Any, watermark: WatermarkSpec) -> Any:
+        """
+        进程内叠加水印（只混合叠加层覆盖的区域）
+
+        Args:
+            image: PIL图像（RGB）
+            watermark: 水印参数
+
+        Returns:
+            叠加水印后的RGB图像（新对象，不修改输入）
+        """
+        overlay = self.image(watermark, image.width)
+        x = image.width - overlay.width - MARGIN if watermark.position.endswith("right") else MARGIN
+        y = MARGIN if watermark.position.startswith("top") else image.height - overlay.height - MARGIN
+
+        result = image.convert("RGB") if image.mode != "RGB" else image.copy()
+        result.paste(overlay, (x, y), mask=overlay)
+        return result
+
+
+# 全局叠加层缓存实例
+watermark_overlays = WatermarkOverlayCache()
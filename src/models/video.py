@@ -49,3 +49,23 @@ class MediaAsset(BaseModel):
     width: Optional[int] = Field(None, description="宽度")
     height: Optional[int] = Field(None, description="高度")
     wechat_media_id: Optional[str] = Field(None, description="微信素材ID")
+
+
+class WatermarkSpec(BaseModel):
+    """水印参数模型（与截图/GIF在同一滤镜图中绘制）"""
+    text: str = Field(..., description="水印文字")
+    position: str = Field(default="bottom-left", description="位置 (bottom-left, bottom-right, top-left, top-right)")
+    font_size: int = Field(default=16, description="字体大小")
+    opacity: float = Field(default=0.7, description="不透明度（0.0-1.0）")
+
+
+class RenditionSpec(BaseModel):
+    """同一时刻的一种输出规格（多个规格共用一次解码）"""
+    name: str = Field(..., description="规格名称，用作结果键和文件名后缀 (report/wechat/clip)")
+    format: str = Field(default="gif", description="输出格式 (gif/mp4)")
+    width: int = Field(default=480, description="宽度（像素）")
+    fps: Optional[int] = Field(default=10, description="帧率（MP4为None时保持原帧率）")
+    colors: int = Field(default=256, description="GIF调色板颜色数")
+    max_bytes: Optional[int] = Field(None, description="GIF字节预算，设置后按试编码结果确定宽度/帧率/颜色数")
+    crf: int = Field(default=28, description="MP4质量（CRF）")
+    preset: str = Field(default="medium", description="MP4编码速度预设")
@@ -1,13 +1,18 @@
 """视频获取模块 - VideoFetcher"""
+import asyncio
 import os
 import subprocess
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 import sys
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from config import settings
+from src.content_analyzer.rolling_captions import compact_subtitle
+from src.media_processor.probe_cache import probe_cache
+from src.media_processor.subprocess_runner import runner
 from src.models.video import VideoInfo
 
 
@@ -23,6 +28,8 @@ class VideoFetcher:
         """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # asyncio版本的并发上限 (事件循环, 信号量)，见 _async_semaphore
+        self._async_limit: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
 
     def download_video(
         self,
@@ -120,42 +127,100 @@ class VideoFetcher:
             cookies_path: cookies文件路径
 
         Returns:
-            字幕文件路径字典 {语言: 路径}
+            字幕文件路径字典 {语言: 路径}（自动字幕为压缩后的路径，见 _find_subtitle）
         """
         logger.info(f"开始下载字幕: {languages}")
 
         subtitle_paths = {}
 
         for lang in languages:
-            cmd = [
-                "yt-dlp",
-                "--cookies", cookies_path,
-                "--write-subs",
-                "--write-auto-subs",
-                "--sub-langs", lang,
-                "--sub-format", "vtt",
-                "--skip-download",
-                "-o", str(self.output_dir / "%(title)s. [%(id)s].%(ext)s"),
-                url
-            ]
-
             try:
                 logger.debug(f"下载{lang}字幕...")
-                subprocess.run(cmd, capture_output=True, check=True)
+                runner.run(
+                    self._subtitle_command(url, lang, cookies_path),
+                    timeout=settings.fetch_timeout or None, check=True, operation="download"
+                )
 
                 # 查找字幕文件
-                subtitle_files = list(self.output_dir.glob(f"*[{video_id}].{lang}.vtt"))
-                if subtitle_files:
-                    subtitle_paths[lang] = str(subtitle_files[0])
-                    logger.success(f"{lang}字幕下载成功")
-                else:
-                    logger.warning(f"未找到{lang}字幕文件")
+                subtitle_path = self._find_subtitle(video_id, lang)
+                if subtitle_path:
+                    subtitle_paths[lang] = subtitle_path
 
             except subprocess.CalledProcessError as e:
-                logger.warning(f"下载{lang}字幕失败: {e}")
+                logger.warning(f"下载{lang}字幕失败: {e} {e.stderr.strip()[-200:]}")
+            except subprocess.TimeoutExpired:
+                logger.warning(f"下载{lang}字幕超时（{settings.fetch_timeout}秒），已终止")
 
         return subtitle_paths
 
+    async def download_subtitles_async(
+        self,
+        url: str,
+        video_id: str,
+        languages: List[str] = ["en", "zh-Hans", "zh-Hant"],
+        cookies_path: str = "cookies.txt"
+    ) -> Dict[str, str]:
+        """
+        download_subtitles 的asyncio版本
+
+        各语言的yt-dlp以asyncio子进程并发运行，同一事件循环内的并发数受
+        fetch_workers 限制。参数与返回值同 download_subtitles。
+        """
+        logger.info(f"开始下载字幕: {languages}")
+
+        async def download(lang: str) -> Optional[str]:
+            try:
+                logger.debug(f"下载{lang}字幕...")
+                await runner.run_async(
+                    self._subtitle_command(url, lang, cookies_path),
+                    timeout=settings.fetch_timeout or None, check=True, operation="download",
+                    semaphore=self._async_semaphore()
+                )
+                return self._find_subtitle(video_id, lang)
+            except subprocess.CalledProcessError as e:
+                logger.warning(f"下载{lang}字幕失败: {e} {e.stderr.strip()[-200:]}")
+            except subprocess.TimeoutExpired:
+                logger.warning(f"下载{lang}字幕超时（{settings.fetch_timeout}秒），已终止")
+            return None
+
+        paths = await asyncio.gather(*(download(lang) for lang in languages))
+        return {lang: path for lang, path in zip(languages, paths) if path}
+
+    def _subtitle_command(self, url: str, lang: str, cookies_path: str) -> List[str]:
+        """单个语言的yt-dlp字幕下载命令"""
+        return [
+            "yt-dlp",
+            "--cookies", cookies_path,
+            "--write-subs",
+            "--write-auto-subs",
+            "--sub-langs", lang,
+            "--sub-format", "vtt",
+            "--skip-download",
+            "-o", str(self.output_dir / "%(title)s. [%(id)s].%(ext)s"),
+            url
+        ]
+
+    def _find_subtitle(self, video_id: str, lang: str) -> Optional[str]:
+        """查找下载的字幕文件（YouTube滚动自动字幕返回压缩后的文件，供后续搜索使用）"""
+        subtitle_files = list(self.output_dir.glob(f"*[{video_id}].{lang}.vtt"))
+        if subtitle_files:
+            logger.success(f"{lang}字幕下载成功")
+            try:
+                return compact_subtitle(str(subtitle_files[0]))
+            except Exception as e:
+                logger.warning(f"{lang}字幕压缩失败，使用原字幕: {e}")
+                return str(subtitle_files[0])
+
+        logger.warning(f"未找到{lang}字幕文件")
+        return None
+
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环内yt-dlp子进程的并发上限（fetch_workers）"""
+        loop = asyncio.get_running_loop()
+        if self._async_limit is None or self._async_limit[0] is not loop:
+            self._async_limit = (loop, asyncio.Semaphore(settings.fetch_workers))
+        return self._async_limit[1]
+
     def _extract_video_id(self, url: str) -> str:
         """
         从URL提取视频ID
@@ -192,25 +257,14 @@ class VideoFetcher:
         Returns:
             VideoInfo对象
         """
-        # 使用ffprobe获取视频信息
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height,duration",
-            "-of", "json",
-            str(video_path)
-        ]
-
+        # 从共享元数据缓存读取（与MediaProcessor共用同一次ffprobe结果）
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            import json
-            video_data = json.loads(result.stdout)
-            stream = video_data.get("streams", [{}])[0]
+            metadata = probe_cache.probe(str(video_path))
+            stream = metadata["video"]
 
             width = stream.get("width", 1280)
             height = stream.get("height", 720)
-            duration = int(float(stream.get("duration", 0)))
+            duration = int(metadata["duration"])
 
         except Exception as e:
             logger.warning(f"获取视频信息失败: {e}")
@@ -1,32 +1,47 @@
 """微信公众号媒体上传模块"""
 import sys
 from pathlib import Path
-from typing import Optional, Dict
+from typing import TYPE_CHECKING, Optional, Dict
 import requests
-import subprocess
 from loguru import logger
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+if TYPE_CHECKING:
+    from src.media_processor import MediaProcessor
+
 
 class MediaUploader:
     """微信公众号媒体上传器"""
 
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, processor: Optional["MediaProcessor"] = None):
         """
         初始化媒体上传器
 
         Args:
             access_token: 微信公众号访问令牌
+            processor: 压缩GIF所用的媒体处理器（可选，默认第一次压缩时创建并复用）
         """
         self.access_token = access_token
         self.base_url = "https://api.weixin.qq.com/cgi-bin"
+        self._processor = processor
+
+    @property
+    def processor(self) -> "MediaProcessor":
+        """媒体处理器（只创建一次，只上传不压缩时不加载媒体处理模块）"""
+        if self._processor is None:
+            from src.media_processor import MediaProcessor
+            self._processor = MediaProcessor()
+        return self._processor
 
     def compress_gif_for_wechat(self, gif_path: str, output_path: str, target_size_mb: float = 1.8) -> bool:
         """
         压缩 GIF 到指定大小以下（微信限制 2MB）
 
+        先低分辨率试编码估算体积，再选出预算内画质最高的宽度/帧率/颜色数，
+        只正式编码一次（见 MediaProcessor.generate_gif_within_budget）
+
         Args:
             gif_path: 原始 GIF 路径
             output_path: 输出路径
@@ -49,58 +64,25 @@ class MediaUploader:
             shutil.copy(gif_path, output_path)
             return True
 
-        # 使用 ffmpeg 压缩
-        # 策略：降低帧率和尺寸
-        cmd = [
-            'ffmpeg',
-            '-i', gif_path,
-            '-vf', 'fps=8,scale=400:-1',  # 降低到 8fps，宽度400px
-            '-f', 'gif',
-            output_path,
-            '-y'
-        ]
-
         try:
             logger.info("  开始压缩...")
-            result = subprocess.run(cmd, capture_output=True, check=True)
-
-            # 检查压缩后文件大小
-            compressed_size = Path(output_path).stat().st_size / (1024 * 1024)
-            logger.info(f"  压缩后大小: {compressed_size:.1f} MB")
-
-            if compressed_size <= target_size_mb:
-                logger.success("  ✓ 压缩成功")
-                return True
-            else:
-                # 如果仍然过大，进一步压缩
-                logger.warning(f"  ⚠ 文件仍然过大 ({compressed_size:.1f} MB)，尝试进一步压缩...")
-
-                cmd2 = [
-                    'ffmpeg',
-                    '-i', output_path,
-                    '-vf', 'fps=5,scale=320:-1',  # 进一步降低
-                    '-f', 'gif',
-                    output_path + '_tmp.gif',
-                    '-y'
-                ]
-
-                subprocess.run(cmd2, capture_output=True, check=True)
-
-                # 替换文件
-                Path(output_path + '_tmp.gif').replace(output_path)
-
-                final_size = Path(output_path).stat().st_size / (1024 * 1024)
-                logger.info(f"  最终大小: {final_size:.1f} MB")
+            self.processor.fit_gif_to_budget(
+                gif_path,
+                output_path,
+                max_bytes=int(target_size_mb * 1024 * 1024)
+            )
+        except Exception as e:
+            logger.error(f"  ✗ 压缩失败: {e}")
+            return False
 
-                if final_size <= target_size_mb:
-                    logger.success("  ✓ 压缩成功")
-                    return True
-                else:
-                    logger.error(f"  ✗ 无法压缩到 {target_size_mb} MB 以下")
-                    return False
+        compressed_size = Path(output_path).stat().st_size / (1024 * 1024)
+        logger.info(f"  压缩后大小: {compressed_size:.1f} MB")
 
-        except subprocess.CalledProcessError as e:
-            logger.error(f"  ✗ 压缩失败: {e}")
+        if compressed_size <= target_size_mb:
+            logger.success("  ✓ 压缩成功")
+            return True
+        else:
+            logger.error(f"  ✗ 无法压缩到 {target_size_mb} MB 以下")
             return False
 
     def upload_image(self, image_path: str) -> Optional[str]:
@@ -12,7 +12,9 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 from loguru import logger
-from src.content_analyzer import ContentAnalyzer, NotebookLMHelper, TimestampExtractor
+from src.content_analyzer import ContentAnalyzer, KeywordMatcher, NotebookLMHelper, SubtitleIndex, TimestampExtractor
+from src.content_analyzer.rolling_captions import compact_rolling_captions, compact_subtitle, compacted_path
+from src.content_analyzer.subtitle_index import NearestTimes, iter_cues
 
 # 配置日志
 logger.remove()
@@ -379,6 +381,340 @@ def test_real_world_scenario():
         return False
 
 
+def test_subtitle_index():
+    """测试SubtitleIndex类"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试6: SubtitleIndex - 字幕索引")
+    logger.info("=" * 70)
+
+    try:
+        # 测试解析
+        logger.info("\n6.1 测试VTT解析...")
+        index = SubtitleIndex.parse(
+            "WEBVTT\nKind: captions\n\nNOTE 注释块\n\n"
+            "intro\n00:00:01.000 --> 00:00:03.000 align:start position:0%\nFront Brake\nsecond line\n\n"
+            "01:02.500 --> 01:04.500\nbody position\n"
+        )
+        assert len(index) == 2, f"cue数量错误: {len(index)}"
+        assert index.texts[0] == "Front Brake second line", "多行文本应以空格连接"
+        assert index.starts.tolist() == [1.0, 62.5] and index.ends.tolist() == [3.0, 64.5], "时间解析错误"
+        logger.success("✓ 解析正确（cue设置、省略小时、NOTE块）")
+
+        # 测试搜索
+        logger.info("\n6.2 测试不区分大小写搜索...")
+        matches = index.search("front brake")
+        assert len(matches) == 1 and matches[0]["keyword"] == "front brake"
+        assert matches[0]["timestamp"] == "00:00:01.000 --> 00:00:03.000"
+        assert matches[0]["mid_seconds"] == 2.0
+        logger.success("✓ 搜索结果正确")
+
+        # 测试索引缓存：只解析一次，不启动子进程
+        logger.info("\n6.3 测试索引缓存...")
+        extractor = TimestampExtractor()
+        subtitle_path = "./output/test_subtitle.vtt"
+        create_mock_subtitle(subtitle_path)
+
+        import subprocess
+        original_run = subprocess.run
+        subprocess.run = lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("不应启动子进程"))
+        try:
+            first = extractor.load_index(subtitle_path)
+            matches = extractor.search_keywords(subtitle_path, ["front brake", "JUMP"])
+            assert extractor.load_index(subtitle_path) is first, "索引应被复用"
+        finally:
+            subprocess.run = original_run
+        assert [m["keyword"] for m in matches] == ["front brake", "JUMP"], "匹配结果错误"
+
+        with open(subtitle_path, "a", encoding="utf-8") as f:
+            f.write("\n00:06:00.000 --> 00:06:05.000\nOne more jump\n")
+        assert len(extractor.load_index(subtitle_path)) == len(first) + 1, "文件变化后应重新解析"
+        logger.success("✓ 索引复用，文件变化后重新解析")
+
+        logger.success("\n✓ SubtitleIndex所有测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"\n✗ SubtitleIndex测试失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+
+def test_keyword_matcher():
+    """测试KeywordMatcher类"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试7: KeywordMatcher - 多关键词一次扫描")
+    logger.info("=" * 70)
+
+    try:
+        # 测试重叠关键词
+        logger.info("\n7.1 测试重叠与包含关系的关键词...")
+        matcher = KeywordMatcher(["brake", "Front Brake", "rake", "he", "she", "hers", ""])
+        assert matcher.find("The FRONT BRAKE") == [0, 1, 2, 3], "应找出所有（含互相包含的）关键词"
+        assert matcher.find("ushers") == [3, 4, 5], "失配链接应覆盖后缀关键词"
+        assert matcher.find("nothing") == [], "空关键词应被忽略"
+        logger.success("✓ 重叠关键词全部找到")
+
+        # 测试按技术标记
+        logger.info("\n7.2 测试按技术标记匹配结果...")
+        index = SubtitleIndex.parse(
+            "WEBVTT\n\n00:00:05.000 --> 00:00:08.000\nJump and land\n\n"
+            "00:00:01.000 --> 00:00:03.000\nfront brake, then body position\n"
+        )
+        matcher = KeywordMatcher.for_techniques([
+            {"name": "Braking", "keywords": ["front brake", "brake"]},
+            {"name": "Body", "keywords": ["body position"]},
+            {"name": "Jumping", "keywords": ["jump"]},
+        ])
+        assert matcher.match_cues(index) == [(0, 3), (1, 0), (1, 1), (1, 2)]
+        matches = matcher.search(index)
+        tagged = [(m["start_seconds"], m["keyword"], m["technique"]) for m in matches]
+        assert tagged == [
+            (1.0, "front brake", "Braking"),
+            (1.0, "brake", "Braking"),
+            (1.0, "body position", "Body"),
+            (5.0, "jump", "Jumping"),
+        ], f"匹配结果错误: {tagged}"
+        logger.success("✓ 匹配按时间排序并标记关键词和技术")
+
+        logger.success("\n✓ KeywordMatcher所有测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"\n✗ KeywordMatcher测试失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+
+def test_rolling_captions():
+    """测试滚动字幕压缩"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试8: 滚动字幕压缩")
+    logger.info("=" * 70)
+
+    # YouTube自动字幕：每行带逐词标签出现一次，再在过渡cue和下一个cue中重复
+    rolling = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:01.000 --> 00:00:03.000 align:start position:0%
+ 
+use<00:00:01.500><c> the</c><00:00:02.000><c> front</c><00:00:02.500><c> brake</c>
+
+00:00:03.000 --> 00:00:03.010 align:start position:0%
+use the front brake
+ 
+
+00:00:03.010 --> 00:00:05.000 align:start position:0%
+use the front brake
+then<00:00:04.000><c> lean</c>
+
+00:00:05.000 --> 00:00:05.010 align:start position:0%
+then lean
+ 
+"""
+
+    try:
+        # 测试压缩
+        logger.info("\n8.1 测试合并滚动重复...")
+        index = SubtitleIndex.parse(compact_rolling_captions(rolling))
+        assert index.texts == ["use the front brake", "then lean"], f"压缩结果错误: {index.texts}"
+        assert index.starts.tolist() == [1.0, 3.01] and index.ends.tolist() == [3.0, 5.0], "cue应不重叠"
+        assert "<00:00:02.500>brake" in compact_rolling_captions(rolling), "应保留逐词时间"
+        logger.success("✓ 4个滚动cue压缩为2个不重叠cue，保留逐词时间")
+
+        # 测试缓存与搜索
+        logger.info("\n8.2 测试压缩结果缓存并用于搜索...")
+        subtitle_path = "./output/test_rolling.en.vtt"
+        Path(subtitle_path).write_text(rolling, encoding="utf-8")
+        compacted_path(subtitle_path).unlink(missing_ok=True)
+
+        assert compact_subtitle(subtitle_path) == str(compacted_path(subtitle_path))
+        mtime = compacted_path(subtitle_path).stat().st_mtime_ns
+        assert compact_subtitle(subtitle_path) == str(compacted_path(subtitle_path))
+        assert compacted_path(subtitle_path).stat().st_mtime_ns == mtime, "来源未变化时应复用"
+
+        matches = TimestampExtractor().search_keywords(subtitle_path, ["front brake"])
+        assert len(matches) == 1 and matches[0]["start_seconds"] == 1.0, "搜索应使用压缩后的字幕"
+
+        manual_path = "./output/test_subtitle.vtt"
+        create_mock_subtitle(manual_path)
+        assert compact_subtitle(manual_path) == manual_path, "普通字幕不压缩"
+        logger.success("✓ 压缩结果缓存在原文件旁，搜索只匹配一次")
+
+        logger.success("\n✓ 滚动字幕压缩所有测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"\n✗ 滚动字幕压缩测试失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+
+def test_streaming_parser():
+    """测试流式VTT/SRT解析"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试9: 流式VTT/SRT解析")
+    logger.info("=" * 70)
+
+    try:
+        # 测试逐个产出cue
+        logger.info("\n9.1 测试按需读取...")
+        consumed = []
+
+        def lines():
+            for line in ["WEBVTT", "", "00:00:01.000 --> 00:00:02.000", "first", "",
+                         "00:00:03.000 --> 00:00:04.000", "second", ""]:
+                consumed.append(line)
+                yield line
+
+        cues = iter_cues(lines())
+        first = next(cues)
+        assert (first.start, first.end, first.lines) == (1.0, 2.0, ["first"])
+        assert len(consumed) == 5, f"产出第一个cue时应只读到它的结束空行: {len(consumed)}"
+        assert [cue.lines for cue in cues] == [["second"]]
+        logger.success("✓ cue逐个产出，不需要完整文本")
+
+        # 测试SRT
+        logger.info("\n9.2 测试SRT解析与搜索...")
+        subtitle_path = "./output/test_subtitle.srt"
+        Path(subtitle_path).write_text(
+            "\ufeff1\r\n00:00:28,000 --> 00:00:35,000\r\n<i>Use the</i>\r\nfront brake &amp; lean\r\n\r\n"
+            "2\r\n00:01:15,500 --> 00:01:22,000\r\nBody position\r\n",
+            encoding="utf-8"
+        )
+        index = SubtitleIndex.from_file(subtitle_path)
+        assert index.texts == ["Use the front brake & lean", "Body position"], f"SRT文本错误: {index.texts}"
+        assert index.starts.tolist() == [28.0, 75.5] and index.ends.tolist() == [35.0, 82.0], "SRT时间错误"
+
+        matches = TimestampExtractor().search_keywords(subtitle_path, ["front brake", "body position"])
+        assert [m["timestamp"] for m in matches] == ["00:00:28.000 --> 00:00:35.000", "00:01:15.500 --> 00:01:22.000"]
+        assert compact_subtitle(subtitle_path) == subtitle_path, "SRT不压缩"
+        logger.success("✓ SRT解析与搜索正确")
+
+        logger.success("\n✓ 流式解析所有测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"\n✗ 流式解析测试失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+
+def test_cue_time_queries():
+    """测试向量化的cue时间查询"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试10: 向量化cue时间查询")
+    logger.info("=" * 70)
+
+    try:
+        # 测试最近时间（距离相同时取靠前的元素，与min一致）
+        logger.info("\n10.1 测试最近时间查询...")
+        nearest = NearestTimes([5.0, 1.0, 3.0, 3.0])
+        assert nearest(2.0) == 1, "距离相同时应取序号小的"
+        assert nearest([0.0, 3.1, 4.0, 99.0]).tolist() == [1, 2, 0, 0]
+        logger.success("✓ 最近时间查询正确")
+
+        # 测试区间查询
+        logger.info("\n10.2 测试时间点/窗口查询...")
+        index = SubtitleIndex([0.0, 2.0, 3.0, 10.0], [12.0, 4.0, 5.0, 11.0], ["a", "b", "c", "d"])
+        assert index.mids.tolist() == [6.0, 3.0, 4.0, 10.5]
+        assert index.nearest(3.6) == 2 and index.nearest([0.0, 9.0]).tolist() == [1, 3]
+        assert index.containing(4.0).tolist() == [0, 2], "长cue与结束于4秒的cue应正确处理"
+        assert index.overlapping(4.5, 10.0).tolist() == [0, 2]
+        assert index.within(2.0, 5.0).tolist() == [1, 2]
+        logger.success("✓ 包含与重叠查询正确")
+
+        # 测试批量选择最佳时间戳
+        logger.info("\n10.3 测试批量选择时间戳...")
+        extractor = TimestampExtractor()
+        subtitle_path = "./output/test_subtitle.vtt"
+        create_mock_subtitle(subtitle_path)
+        technique = {"name": "Braking", "keywords": ["brake"]}
+        times = [0.0, 30.0, 160.0, 300.0]
+        batch = extractor.find_best_timestamps(technique, subtitle_path, times)
+        single = [extractor.find_best_timestamp(technique, subtitle_path, t) for t in times]
+        assert batch == single, "批量结果应与逐个查询一致"
+        assert [m["start_seconds"] for m in batch] == [28.0, 28.0, 162.0, 162.0]
+        logger.success("✓ 一次调用解析多个偏好时间")
+
+        # 测试分组查询与批量提取所有技术
+        logger.info("\n10.4 测试所有技术一次查询...")
+        grouped = NearestTimes([1.0, 9.0, 2.0, 8.0], groups=[0, 0, 1, 1])
+        assert grouped([8.5, 8.5, 8.5], [0, 1, 2]).tolist() == [1, 3, -1], "只在目标所在组内比较"
+
+        techniques = [
+            {"name": "Braking", "keywords": ["brake"]},
+            {"name": "Body", "keywords": ["body"]},
+            {"name": "Jump", "keywords": ["jump", "landing"]},
+            {"name": "Missing", "keywords": ["wheelie"]},
+        ]
+        key_moments = [{"seconds": 170.0}, {"seconds": 250.0}, {"seconds": None}, {"seconds": 10.0}]
+        results = extractor.extract_all_techniques(techniques, subtitle_path, key_moments)
+        expected = [
+            extractor.find_best_timestamp(technique, subtitle_path, moment["seconds"])
+            for technique, moment in zip(techniques, key_moments)
+        ]
+        assert [r["start_seconds"] for r in results] == [e and e["start_seconds"] for e in expected]
+        assert [r["start_seconds"] for r in results] == [162.0, 258.0, 255.0, None]
+        logger.success("✓ 批量结果与逐个技术选择一致")
+
+        logger.success("\n✓ 向量化时间查询所有测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"\n✗ 向量化时间查询测试失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+
+def test_scene_snapping():
+    """测试关键时刻起点吸附到镜头切换"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试11: 关键时刻吸附到镜头切换")
+    logger.info("=" * 70)
+
+    try:
+        cuts = [10.0, 30.0]
+
+        def snap(timestamp: float, tolerance: float = 1.0) -> float:
+            nearest = min(cuts, key=lambda cut: abs(cut - timestamp))
+            return nearest if abs(nearest - timestamp) <= tolerance else timestamp
+
+        logger.info("\n11.1 测试时间段整体平移...")
+        techniques = [
+            {"technique_name": "A", "timestamp": "00:00:28.500 --> 00:00:38.500",
+             "start_seconds": 28.5, "end_seconds": 38.5, "mid_seconds": 33.5},
+            {"technique_name": "B", "start_seconds": 55.0, "end_seconds": 60.0, "mid_seconds": 57.5},
+            {"technique_name": "C", "start_seconds": None, "end_seconds": None, "mid_seconds": None},
+        ]
+        snapped = ContentAnalyzer().snap_to_scenes(techniques, snap, tolerance=2.0)
+        assert snapped == 1
+        assert techniques[0]["start_seconds"] == 30.0 and techniques[0]["end_seconds"] == 40.0
+        assert techniques[0]["timestamp"] == "00:00:30.000 --> 00:00:40.000", "VTT时间应随吸附更新"
+        assert techniques[0]["mid_seconds"] == 35.0 and techniques[0]["scene_snapped_from"] == 28.5
+        assert techniques[1]["start_seconds"] == 55.0 and "scene_snapped_from" not in techniques[1]
+        logger.success("✓ 时间段整体平移到切点")
+
+        logger.info("\n11.2 测试默认容差...")
+        techniques = [{"technique_name": "A", "start_seconds": 28.5, "end_seconds": 30.0, "mid_seconds": 29.25}]
+        assert ContentAnalyzer().snap_to_scenes(techniques, snap) == 0, "未传容差时使用吸附函数的默认值"
+        logger.success("✓ 未传容差时不覆盖吸附函数的默认值")
+
+        logger.success("\n✓ 镜头切换吸附所有测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"\n✗ 镜头切换吸附测试失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
+
+
 if __name__ == "__main__":
     logger.info("=" * 70)
     logger.info("MotoStep - 内容分析模块测试套件")
@@ -394,6 +730,12 @@ if __name__ == "__main__":
         ("ContentAnalyzer", test_content_analyzer),
         ("媒体生成参数", test_media_generation_params),
         ("真实场景", test_real_world_scenario),
+        ("SubtitleIndex", test_subtitle_index),
+        ("KeywordMatcher", test_keyword_matcher),
+        ("滚动字幕压缩", test_rolling_captions),
+        ("流式字幕解析", test_streaming_parser),
+        ("向量化时间查询", test_cue_time_queries),
+        ("镜头切换吸附", test_scene_snapping),
     ]
 
     results = []
@@ -2,6 +2,11 @@
 import sys
 from pathlib import Path
 import subprocess
+import json
+import asyncio
+import os
+import threading
+import time
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent))
@@ -12,7 +17,21 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 from loguru import logger
-from src.media_processor import FFmpegWrapper, MediaProcessor
+from src.media_processor import FFmpegWrapper, MediaProcessor, MediaJob, MediaJobExecutor
+from src.media_processor.artifact_cache import MediaArtifactCache
+from src.media_processor.contact_sheet import parse_frame_times, sheet_dir
+from src.media_processor.gif_budget import GIF_BUDGET_LADDER, estimate_gif_bytes, plan_gif_budget
+from src.media_processor.jpeg_budget import MIN_JPEG_QUALITY, encode_jpeg, fit_jpeg_to_budget
+from src.media_processor.keyframe_index import KeyframeIndex
+from src.media_processor.pyav_backend import PyAVDecoder, jpeg_quality
+from src.media_processor.probe_cache import VideoProbeCache
+from src.media_processor.resource_usage import ResourceLedger
+from src.media_processor.scene_index import SceneIndex, parse_scene_cuts, scene_sidecar
+from src.media_processor.progress import FFmpegProgressParser, ProgressTracker, parse_out_time
+from src.media_processor.subprocess_runner import CancelToken, SubprocessCancelled, SubprocessRunner, job_scope
+from src.media_processor.subprocess_runner import runner as subprocess_runner
+from src.media_processor.watermark_overlay import WatermarkOverlayCache, resolve_watermark_font
+from src.models.video import RenditionSpec, WatermarkSpec
 
 # 配置日志
 logger.remove()
@@ -252,6 +271,1233 @@ def test_batch_processing():
         return False
 
 
+def test_multi_screenshot_command():
+    """测试单次解码多截图命令"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试5: 单次解码多截图")
+    logger.info("=" * 70)
+
+    wrapper = FFmpegWrapper()
+
+    logger.info("\n5.1 测试时间戳分组...")
+    timestamps = [300.0, 12.0, 10.0, 25.0, 305.5]
+    chunks = wrapper.chunk_timestamps(timestamps, max_gap=30.0)
+    assert wrapper.chunk_timestamps(timestamps) == [[2, 1], [3], [0, 4]]
+    assert chunks == [[2, 1, 3], [0, 4]], f"分组错误: {chunks}"
+    assert wrapper.chunk_timestamps(timestamps, max_size=2) == [[2, 1], [3], [0, 4]]
+    logger.success("✓ 时间戳分组正确")
+
+    logger.info("\n5.2 测试命令构建...")
+    cmd = wrapper.multi_screenshot_command(
+        video_path="test.mp4",
+        timestamps=[10.0, 12.0, 25.0],
+        output_paths=["a.jpg", "b.jpg", "c.jpg"],
+        quality=2
+    )
+    assert cmd.count("-i") == 1, "应只打开一次输入"
+    assert cmd[cmd.index("-ss") + 1] == "10.0"
+    filter_complex = cmd[cmd.index("-filter_complex") + 1]
+    assert "split=3" in filter_complex
+    assert "trim=start=2.000" in filter_complex
+    assert "trim=start=15.000,trim=end_frame=1" in filter_complex
+    assert cmd.count("-frames:v") == 3
+    assert cmd[-1] == "c.jpg"
+    logger.success("✓ 多截图命令构建正确")
+
+    return True
+
+
+def test_fused_palette_gif_command():
+    """测试单滤镜图调色板GIF命令"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试6: 合并调色板GIF")
+    logger.info("=" * 70)
+
+    wrapper = FFmpegWrapper()
+
+    gif_cmd, palette_cmd = wrapper.gif_command(
+        video_path="test.mp4",
+        start_time=120.0,
+        duration=10.0,
+        output_path="output.gif",
+        use_palette=True,
+        fused_palette=True
+    )
+
+    assert palette_cmd is None, "合并模式不应生成调色板命令"
+    assert gif_cmd.count("-i") == 1, "合并模式只应解码一次"
+    filter_complex = gif_cmd[gif_cmd.index("-filter_complex") + 1]
+    assert "palettegen" in filter_complex and "paletteuse" in filter_complex
+    assert "_palette.png" not in " ".join(gif_cmd), "不应写调色板临时文件"
+    logger.success("✓ 合并调色板GIF命令构建正确")
+
+    return True
+
+
+def test_fused_watermark_commands():
+    """测试水印合并到截图/GIF滤镜图"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试7: 水印合并编码")
+    logger.info("=" * 70)
+
+    wrapper = FFmpegWrapper()
+    watermark = WatermarkSpec(text="FreeSoloDirtbike", position="bottom-right")
+
+    logger.info("\n7.1 测试截图水印...")
+    cmd = wrapper.screenshot_command("test.mp4", 10.0, "out.jpg", watermark=watermark)
+    vf = cmd[cmd.index("-vf") + 1]
+    assert vf.startswith("drawtext=text='FreeSoloDirtbike'")
+    assert "x=w-tw-10" in vf
+    assert "-vf" not in wrapper.screenshot_command("test.mp4", 10.0, "out.jpg")
+    logger.success("✓ 截图水印正确")
+
+    logger.info("\n7.2 测试GIF水印（调色板前绘制）...")
+    gif_cmd, _ = wrapper.gif_command(
+        "test.mp4", 10.0, 10.0, "out.gif",
+        fused_palette=True, watermark=watermark
+    )
+    filter_complex = gif_cmd[gif_cmd.index("-filter_complex") + 1]
+    assert filter_complex.index("drawtext") < filter_complex.index("palettegen")
+    logger.success("✓ GIF水印正确")
+
+    logger.info("\n7.3 测试水印命令与滤镜一致...")
+    wm_cmd = wrapper.watermark_command("in.jpg", "out.jpg", "FreeSoloDirtbike", position="bottom-right")
+    assert wm_cmd[wm_cmd.index("-vf") + 1] == vf
+    logger.success("✓ 水印命令一致")
+
+    return True
+
+
+def test_job_executor():
+    """测试并行任务执行器"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试8: 并行任务执行器")
+    logger.info("=" * 70)
+
+    logger.info("\n8.1 测试CPU预算分配...")
+    executor = MediaJobExecutor(max_workers=4, cpu_budget=32)
+    assert executor.threads_per_job == 8
+    assert MediaJobExecutor(max_workers=64, cpu_budget=8).max_workers == 8
+    assert MediaJobExecutor(cpu_budget=1).max_workers == 1
+    logger.success("✓ CPU预算分配正确")
+
+    logger.info("\n8.2 测试结果顺序与失败隔离...")
+    import time
+
+    def work(value: int) -> int:
+        time.sleep(0.01 * (5 - value))  # 先提交的任务后完成
+        if value == 2:
+            raise ValueError("boom")
+        return value * 10
+
+    jobs = [MediaJob(kind="test", func=work, kwargs={"value": v}) for v in range(5)]
+    results = executor.run(jobs)
+    assert [r.index for r in results] == [0, 1, 2, 3, 4]
+    assert [r.output for r in results] == [0, 10, None, 30, 40]
+    assert not results[2].ok and "boom" in results[2].error
+    logger.success("✓ 结果按提交顺序返回，单个失败不影响其他任务")
+
+    logger.info("\n8.3 测试中断时不等待排队任务...")
+
+    def interrupt():
+        time.sleep(0.2)
+        raise KeyboardInterrupt
+
+    sleep = [sys.executable, "-c", "import time; time.sleep(4)"]
+    jobs = [MediaJob(kind="interrupt", func=interrupt)]
+    jobs += [MediaJob(kind="sleep", func=subprocess_runner.run, kwargs={"cmd": sleep}) for _ in range(3)]
+    start = time.perf_counter()
+    try:
+        MediaJobExecutor(max_workers=2, cpu_budget=2).run(jobs)
+        assert False, "应抛出KeyboardInterrupt"
+    except KeyboardInterrupt:
+        pass
+    assert time.perf_counter() - start < 2, "中断后应立即返回"
+    # 被终止的子进程由各自的工作线程回收
+    deadline = time.monotonic() + 2
+    while subprocess_runner._active and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not subprocess_runner._active, "运行中的子进程应已终止"
+    logger.success("✓ 中断后取消排队任务并终止运行中的子进程")
+
+    logger.info("\n8.4 测试FFmpeg线程参数...")
+    wrapper = FFmpegWrapper()
+    cmd = wrapper.screenshot_command("test.mp4", 1.0, "out.jpg")
+    assert wrapper._with_thread_limit(cmd) == cmd
+    wrapper.threads = 4
+    limited = wrapper._with_thread_limit(cmd)
+    assert limited[:5] == ["ffmpeg", "-threads", "4", "-filter_threads", "4"]
+    assert wrapper._with_thread_limit(["ffprobe", "-version"]) == ["ffprobe", "-version"]
+    logger.success("✓ 线程参数正确")
+
+    return True
+
+
+def test_artifact_cache(tmp_path):
+    """测试媒体产物缓存"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试9: 媒体产物缓存")
+    logger.info("=" * 70)
+
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\x00" * 4096)
+    cache = MediaArtifactCache(cache_dir=str(tmp_path / "cache"), max_bytes=2500)
+
+    logger.info("\n9.1 测试缓存键...")
+    key = cache.make_key(str(video), "gif", {"width": 480, "fps": 10})
+    assert key == cache.make_key(str(video), "gif", {"fps": 10, "width": 480})
+    assert key != cache.make_key(str(video), "gif", {"width": 320, "fps": 10})
+    assert key != cache.make_key(str(video), "screenshot", {"width": 480, "fps": 10})
+    logger.success("✓ 缓存键随渲染参数变化")
+
+    logger.info("\n9.2 测试命中与未命中...")
+    output = tmp_path / "out.gif"
+    assert not cache.fetch(key, str(output))
+    artifact = tmp_path / "rendered.gif"
+    artifact.write_bytes(b"G" * 1000)
+    cache.store(key, str(artifact))
+    assert cache.fetch(key, str(output))
+    assert output.read_bytes() == artifact.read_bytes()
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+    logger.success("✓ 命中后直接复制缓存文件")
+
+    logger.info("\n9.3 测试源视频变化后失效...")
+    video.write_bytes(b"\x01" * 8192)
+    assert cache.make_key(str(video), "gif", {"width": 480, "fps": 10}) != key
+    logger.success("✓ 源视频变化后缓存键变化")
+
+    logger.info("\n9.4 测试LRU淘汰...")
+    import os
+    import time
+    for name in ("a", "b"):
+        other = tmp_path / f"{name}.gif"
+        other.write_bytes(b"x" * 1000)
+        cache.store(f"{name}" * 64, str(other))
+        # 保证修改时间有先后
+        entry = cache._entry_path(f"{name}" * 64, ".gif")
+        os.utime(entry, (time.time() + 10, time.time() + 10))
+    assert not cache._entry_path(key, ".gif").exists(), "最久未使用的应被淘汰"
+    assert cache.stats()["evictions"] == 1
+    logger.success("✓ 超出上限时淘汰最久未使用的文件")
+
+    logger.info("\n9.5 测试解码后端区分缓存...")
+    processor = MediaProcessor(cache=cache, backend="ffmpeg")
+    gif_key = processor._gif_cache_key(str(video), 1.0, 3.0, 480, 10, True, True, None, 256)
+    screenshot_key = processor._screenshot_cache_key(str(video), 1.0, 2, None)
+    processor.backend = "pyav"
+    assert processor._gif_cache_key(str(video), 1.0, 3.0, 480, 10, True, True, None, 256) != gif_key
+    assert processor._screenshot_cache_key(str(video), 1.0, 2, None) != screenshot_key
+    logger.success("✓ 不同后端的产物不共用缓存")
+
+    return True
+
+
+def test_probe_cache(tmp_path):
+    """测试视频元数据缓存（每个视频只探测一次）"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试10: 视频元数据缓存")
+    logger.info("=" * 70)
+
+    # 用脚本模拟ffprobe输出，并记录每次调用的参数
+    probe_output = {
+        "streams": [{
+            "codec_name": "h264", "width": 1920, "height": 1080,
+            "avg_frame_rate": "30/1", "duration": "62.5"
+        }],
+        "format": {"duration": "62.6", "format_name": "mov,mp4,m4a,3gp,3g2,mj2"}
+    }
+    (tmp_path / "probe.json").write_text(json.dumps(probe_output))
+    # 数据包按解码顺序输出（pts_time,flags），非关键帧与无时间的数据包应被忽略
+    (tmp_path / "packets.csv").write_text("5.000000,K__\n5.033333,___\n0.000000,K_\nN/A,K__\n")
+    calls = tmp_path / "calls.log"
+    fake_ffprobe = tmp_path / "ffprobe"
+    fake_ffprobe.write_text(
+        f"#!/bin/sh\necho \"$*\" >> {calls}\nsleep 0.1\n"
+        f"case \"$*\" in *packet=*) cat {tmp_path / 'packets.csv'} ;; *) cat {tmp_path / 'probe.json'} ;; esac\n"
+    )
+    fake_ffprobe.chmod(0o755)
+
+    def probe_calls():
+        return calls.read_text().splitlines() if calls.exists() else []
+
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\x00" * 1024)
+
+    logger.info("\n10.1 测试元数据整理...")
+    cache = VideoProbeCache(ffprobe_path=str(fake_ffprobe))
+    data = cache.probe(str(video))
+    assert data["duration"] == 62.5
+    assert data["video"]["width"] == 1920
+    assert data["codec"]["fps"] == 30.0
+    assert data["keyframe_times"] is None, "默认不探测关键帧"
+    assert len(probe_calls()) == 1 and "packet" not in probe_calls()[0], "默认探测不应遍历数据包"
+    logger.success("✓ 元数据整理正确")
+
+    logger.info("\n10.2 测试按需探测关键帧...")
+    data = cache.probe(str(video), keyframes=True)
+    assert data["keyframe_times"] == [0.0, 5.0]
+    assert data["keyframe_count"] == 2
+    assert len(probe_calls()) == 2 and "packet=pts_time,flags" in probe_calls()[1]
+    assert "-skip_frame" not in probe_calls()[1], "关键帧索引应来自数据包标志，不解码"
+    cache.probe(str(video), keyframes=True)
+    assert len(probe_calls()) == 2, "关键帧只探测一次"
+    logger.success("✓ 关键帧按需探测")
+
+    logger.info("\n10.3 测试进程内与持久化缓存...")
+    cache.probe(str(video))
+    assert VideoProbeCache(ffprobe_path=str(fake_ffprobe)).probe(str(video), keyframes=True)["keyframe_count"] == 2
+    assert len(probe_calls()) == 2, "应只调用两次ffprobe"
+    assert VideoProbeCache.sidecar_path(str(video)).exists()
+    logger.success("✓ 同一视频只探测一次")
+
+    logger.info("\n10.4 测试并发探测与不持久化...")
+    other = tmp_path / "other.gif"
+    other.write_bytes(b"\x00" * 512)
+    threads = [threading.Thread(target=cache.probe, args=(str(other),), kwargs={"persist": False}) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(probe_calls()) == 3, "并发任务应等待同一次ffprobe"
+    assert not VideoProbeCache.sidecar_path(str(other)).exists(), "persist=False时不写持久化文件"
+    logger.success("✓ 同一路径并发只探测一次")
+
+    logger.info("\n10.5 测试精确seek只使用已缓存的关键帧索引...")
+    wrapper = FFmpegWrapper()
+    wrapper.probe_cache = VideoProbeCache(ffprobe_path=str(fake_ffprobe), persist=False)
+    fresh = tmp_path / "fresh.mp4"
+    fresh.write_bytes(b"\x00" * 256)
+    assert wrapper.plan_seek(str(fresh), 7.0) is None
+    assert len(probe_calls()) == 3, "精确模式不应为预解码距离探测关键帧"
+    assert wrapper.plan_seek(str(fresh), 7.0, fast=True)["seek_time"] == 5.0
+    assert wrapper.plan_seek(str(fresh), 7.0)["decode_ahead"] == 2.0, "已缓存索引时报告预解码距离"
+    assert len(probe_calls()) == 5
+    logger.success("✓ 精确seek不触发关键帧探测")
+
+    logger.info("\n10.6 测试文件变化后重新探测...")
+    video.write_bytes(b"\x00" * 2048)
+    assert cache.probe(str(video))["keyframe_times"] is None
+    assert len(probe_calls()) == 6
+    logger.success("✓ 文件变化后缓存失效")
+
+    return True
+
+
+def test_keyframe_index():
+    """测试关键帧索引与seek规划"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试11: 关键帧索引")
+    logger.info("=" * 70)
+
+    index = KeyframeIndex.from_probe({"keyframe_times": [0.0, 10.0, 20.0, 30.0]})
+
+    logger.info("\n11.1 测试关键帧查询...")
+    assert len(index) == 4
+    assert index.average_gop == 10.0
+    assert index.preceding(14.0) == 10.0
+    assert index.preceding(20.0) == 20.0
+    assert index.following(14.0) == 20.0
+    assert index.nearest(16.0) == 20.0
+    assert index.decode_ahead(14.5) == 4.5
+    assert KeyframeIndex([]).decode_ahead(3.0) == 3.0
+    logger.success("✓ 关键帧查询正确")
+
+    logger.info("\n11.2 测试seek规划...")
+    exact = index.plan_seek(14.5)
+    assert exact["seek_time"] == 14.5 and exact["keyframe"] == 10.0
+    assert exact["decode_ahead"] == 4.5 and not exact["snapped"]
+    fast = index.plan_seek(14.5, fast=True)
+    assert fast["seek_time"] == 10.0 and fast["decode_ahead"] == 0.0 and fast["snapped"]
+    logger.success("✓ 精确/快速seek规划正确")
+
+    logger.info("\n11.3 测试按关键帧分组...")
+    # 12秒的间隔超过max_gap，但19秒仍在10秒关键帧的GOP内，继续解码比重新seek便宜
+    chunks = FFmpegWrapper.chunk_timestamps([11.0, 19.0, 35.0], max_gap=5.0)
+    assert chunks == [[0], [1], [2]]
+    chunks = FFmpegWrapper.chunk_timestamps([11.0, 19.0, 35.0], max_gap=5.0, keyframes=index)
+    assert chunks == [[0, 1], [2]]
+
+    wrapper = FFmpegWrapper()
+    cmd = wrapper.screenshot_command("test.mp4", 10.0, "out.jpg", keyframe_only=True)
+    assert cmd[1:3] == ["-skip_frame", "nokey"]
+    logger.success("✓ 分组与关键帧截图命令正确")
+
+    return True
+
+
+def test_pyav_backend(tmp_path):
+    """测试PyAV进程内解码后端"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试12: PyAV进程内解码后端")
+    logger.info("=" * 70)
+
+    import av
+    import numpy as np
+    from PIL import Image
+
+    # 生成4秒测试视频：每秒一个关键帧，第n秒的帧亮度约为 n*60
+    video = tmp_path / "gray.mp4"
+    with av.open(str(video), "w") as container:
+        stream = container.add_stream("mpeg4", rate=10)
+        stream.width, stream.height = 64, 48
+        stream.pix_fmt = "yuv420p"
+        stream.gop_size = 10
+        for i in range(40):
+            array = np.full((48, 64, 3), (i // 10) * 60 + (i % 10) * 2, dtype=np.uint8)
+            frame = av.VideoFrame.from_ndarray(array, format="rgb24")
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+    logger.info("\n12.1 测试单会话读取多个时间点...")
+    decoder = PyAVDecoder()
+    frames = decoder.read_frames(str(video), [3.5, 0.2, 1.5, 2.0])
+    assert [round(frame.mean() / 60) for frame in frames] == [3, 0, 1, 2]
+    assert frames[0].shape == (48, 64, 3)
+    assert len(decoder._sessions) == 1
+    logger.success("✓ 帧读取正确，同一视频只打开一次")
+
+    logger.info("\n12.2 测试进程内JPEG/GIF输出...")
+    paths = decoder.extract_screenshots(
+        str(video), [1.0, 2.0], [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")]
+    )
+    assert all(Path(path).exists() for path in paths)
+    gif_path = decoder.generate_gif(str(video), 1.0, 2.0, str(tmp_path / "clip.gif"), width=32, fps=5)
+    with Image.open(gif_path) as gif:
+        assert gif.size == (32, 24)
+        # Pillow会合并相同的相邻帧，按总时长校验帧数（10帧 x 200ms）
+        total = 0
+        for index in range(gif.n_frames):
+            gif.seek(index)
+            total += gif.info["duration"]
+        assert total == 2000
+    decoder.close()
+    assert not decoder._sessions
+    assert jpeg_quality(2) == 95 and jpeg_quality(31) == 1
+    logger.success("✓ JPEG/GIF输出正确")
+
+    return True
+
+
+def test_gif_budget(tmp_path):
+    """测试按字节预算规划GIF参数"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试13: GIF字节预算")
+    logger.info("=" * 70)
+
+    logger.info("\n13.1 测试体积估算...")
+    base = estimate_gif_bytes(100_000, 160, 10, 160, 10)
+    assert base == 100_000
+    assert estimate_gif_bytes(100_000, 160, 10, 160, 5) == 50_000
+    assert estimate_gif_bytes(100_000, 160, 10, 160, 10, colors=16) == 50_000
+    assert estimate_gif_bytes(100_000, 160, 10, 320, 10) > 200_000
+    logger.success("✓ 体积随帧率/宽度/颜色数单调变化")
+
+    logger.info("\n13.2 测试参数选择...")
+    budget = 2 * 1024 * 1024
+    plan = plan_gif_budget(100_000, 160, 10, max_bytes=budget)
+    assert (plan["width"], plan["fps"], plan["colors"]) == GIF_BUDGET_LADDER[0]
+    assert plan["fits"]
+
+    plan = plan_gif_budget(400_000, 160, 10, max_bytes=budget)
+    assert plan["fits"] and plan["estimated_bytes"] <= budget
+    assert GIF_BUDGET_LADDER.index((plan["width"], plan["fps"], plan["colors"])) > 0
+
+    plan = plan_gif_budget(50_000_000, 160, 10, max_bytes=budget)
+    assert not plan["fits"]
+    assert plan["width"] == 240 and plan["fps"] == 5 and plan["colors"] == 64
+
+    plan = plan_gif_budget(10_000, 160, 10, max_bytes=budget, max_width=320, max_fps=8)
+    assert plan["width"] == 320 and plan["fps"] == 8
+    logger.success("✓ 选出预算内画质最高的参数")
+
+    logger.info("\n13.3 测试颜色数参数...")
+    wrapper = FFmpegWrapper()
+    cmd, _ = wrapper.gif_command("test.mp4", 0, 5, "out.gif", fused_palette=True, colors=64)
+    assert "palettegen=max_colors=64" in cmd[cmd.index("-filter_complex") + 1]
+    cmd, _ = wrapper.gif_command("test.mp4", 0, 5, "out.gif", fused_palette=True)
+    assert "max_colors" not in cmd[cmd.index("-filter_complex") + 1]
+    logger.success("✓ 颜色数参数正确")
+
+    logger.info("\n13.4 测试试编码不进缓存、命中缓存时跳过试编码...")
+    processor = MediaProcessor()
+    processor.cache = MediaArtifactCache(cache_dir=str(tmp_path / "cache"))
+    processor.wrapper.keyframe_index = lambda path, probe=True: None
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\x00" * 1024)
+    commands = []
+
+    def fake_run(cmd, check=True, **kwargs):
+        commands.append(cmd)
+        for arg in cmd:
+            if arg.endswith(".gif"):
+                Path(arg).write_bytes(b"GIF89a" + b"\x00" * 1000)
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    processor.wrapper.run_command = fake_run
+    processor.generate_gif_within_budget(str(video), 10.0, 5.0, str(tmp_path / "first.gif"))
+    widths = [cmd[cmd.index("-filter_complex") + 1] for cmd in commands]
+    assert len(commands) == 2 and "scale=160" in widths[0], "应为一次试编码加一次正式编码"
+    assert len(list((tmp_path / "cache").rglob("*.gif"))) == 1, "试编码GIF不应写入缓存"
+
+    second = processor.generate_gif_within_budget(str(video), 10.0, 5.0, str(tmp_path / "second.gif"))
+    assert len(commands) == 2, "命中缓存时不应再试编码"
+    assert Path(second).read_bytes() == (tmp_path / "first.gif").read_bytes()
+
+    renditions = [RenditionSpec(name="wechat", format="gif", width=480, fps=10, max_bytes=2 * 1024 * 1024)]
+    processor.generate_renditions(str(video), 10.0, 5.0, renditions, output_dir=str(tmp_path))
+    assert len(commands) == 4, "预算规格应为一次试编码加一次正式编码"
+    processor.generate_renditions(str(video), 10.0, 5.0, renditions, output_dir=str(tmp_path / "again"))
+    assert len(commands) == 4, "预算规格命中缓存时不应再试编码"
+    logger.success("✓ 试编码绕过缓存，命中缓存时跳过试编码")
+
+    return True
+
+
+def test_rendition_command():
+    """测试一次解码生成多种输出的命令"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试14: 多规格输出")
+    logger.info("=" * 70)
+
+    wrapper = FFmpegWrapper()
+    renditions = [
+        RenditionSpec(name="report", format="gif", width=480, fps=10),
+        RenditionSpec(name="wechat", format="gif", width=400, fps=8, colors=128),
+        RenditionSpec(name="clip", format="mp4", width=480, fps=None, crf=28),
+    ]
+    outputs = ["r.gif", "w.gif", "c.mp4"]
+
+    logger.info("\n14.1 测试滤镜图结构...")
+    cmd = wrapper.rendition_command(
+        "test.mp4", 12.0, 10.0, renditions, outputs, watermark=WatermarkSpec(text="MotoStep")
+    )
+    assert cmd.count("-i") == 1, "应只解码一次"
+    filter_complex = cmd[cmd.index("-filter_complex") + 1]
+    assert filter_complex.startswith("[0:v]split=3[v0][v1][v2];")
+    assert "[v0]fps=10,scale=480:-1" in filter_complex
+    assert "palettegen=max_colors=128[p1]" in filter_complex
+    assert "[v2]scale=480:-2" in filter_complex and "format=yuv420p[o2]" in filter_complex
+    assert filter_complex.count("drawtext") == 3
+    logger.success("✓ 单输入split为三个分支")
+
+    logger.info("\n14.2 测试输出映射...")
+    maps = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-map"]
+    assert maps == ["[o0]", "[o1]", "[o2]"]
+    assert [arg for arg in cmd if arg in outputs] == outputs
+    assert cmd[cmd.index("-c:v") + 1] == "libx264" and cmd[cmd.index("-crf") + 1] == "28"
+    logger.success("✓ 每个分支映射到对应输出")
+
+    logger.info("\n14.3 测试参数校验...")
+    for bad in ([], [RenditionSpec(name="x", format="webm")]):
+        try:
+            wrapper.rendition_command("test.mp4", 0, 5, bad, ["x"] * len(bad) or ["x"])
+            assert False, "应抛出ValueError"
+        except ValueError:
+            pass
+    logger.success("✓ 参数校验正确")
+
+    return True
+
+
+def test_clip_extraction(tmp_path):
+    """测试流复制/智能剪辑的命令选择"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试15: 片段提取")
+    logger.info("=" * 70)
+
+    wrapper = FFmpegWrapper()
+
+    logger.info("\n15.1 测试剪辑命令...")
+    cmd = wrapper.clip_copy_command("test.mp4", 60.0, 10.0, "out.mp4")
+    assert cmd.index("-ss") < cmd.index("-i"), "-ss应在-i之前（输入端seek）"
+    assert cmd[cmd.index("-c") + 1] == "copy" and "-bsf:v" not in cmd
+    assert "h264_mp4toannexb" in wrapper.clip_copy_command("test.mp4", 60.0, 10.0, "out.mp4", inband_headers=True)
+    cmd = wrapper.clip_encode_command("test.mp4", 63.4, 6.6, "head.mp4", inband_headers=True)
+    assert cmd.index("-ss") < cmd.index("-i")
+    assert cmd[cmd.index("-x264-params") + 1] == "repeat-headers=1"
+    logger.success("✓ 剪辑命令正确")
+
+    logger.info("\n15.2 测试剪辑方式选择...")
+    processor = MediaProcessor()
+    processor.cache = None
+    commands = []
+
+    def fake_run(cmd, check=True, **kwargs):
+        commands.append(cmd)
+        if cmd[-1].endswith(".mp4"):
+            Path(cmd[-1]).write_bytes(b"\x00")
+
+    processor.wrapper.run_command = fake_run
+    processor.wrapper.keyframe_index = lambda path, probe=True: KeyframeIndex([0.0, 10.0, 20.0, 30.0])
+    processor.wrapper.probe = lambda path: {"codec": {"name": "h264", "pix_fmt": "yuv420p"}}
+
+    output = str(tmp_path / "clip.mp4")
+    processor.extract_clip("test.mp4", 13.0, 5.0, output_path=output)
+    assert len(commands) == 1 and commands[0][commands[0].index("-ss") + 1] == "10.0"
+    assert commands[0][commands[0].index("-t") + 1] == "8.0", "流复制终点不变"
+
+    commands.clear()
+    processor.extract_clip("test.mp4", 20.0, 5.0, output_path=output, exact=True)
+    assert len(commands) == 1 and "copy" in commands[0], "起点为关键帧时直接流复制"
+
+    commands.clear()
+    processor.extract_clip("test.mp4", 13.0, 10.0, output_path=output, exact=True)
+    assert len(commands) == 3, "智能剪辑: 编码开头 + 复制其余 + 拼接"
+    assert "libx264" in commands[0] and commands[0][commands[0].index("-t") + 1] == "7.0"
+    assert "copy" in commands[1] and commands[1][commands[1].index("-ss") + 1] == "20.0"
+    assert commands[2][:3] == ["ffmpeg", "-f", "concat"]
+    assert not list(tmp_path.glob("clip_*")), "临时片段应已清理"
+
+    commands.clear()
+    processor.extract_clip("test.mp4", 13.0, 5.0, output_path=output, exact=True)
+    assert len(commands) == 1 and "libx264" in commands[0], "不跨关键帧时整段重新编码"
+
+    processor.wrapper.probe = lambda path: {"codec": {"name": "vp9", "pix_fmt": "yuv420p"}}
+    commands.clear()
+    processor.extract_clip("test.mp4", 13.0, 10.0, output_path=output, exact=True)
+    assert len(commands) == 1 and "libx264" in commands[0], "非H.264源整段重新编码"
+    logger.success("✓ 剪辑方式选择正确")
+
+    logger.info("\n15.3 测试微信片段（480px H.264）...")
+    processor.wrapper.probe = lambda path: {"codec": {"name": "vp9", "pix_fmt": "yuv420p", "width": 1920}}
+    commands.clear()
+    processor.extract_wechat_clip("test.mp4", 20.0, 10.0, output_path=output)
+    cmd = commands[0]
+    assert len(commands) == 1 and cmd.index("-ss") < cmd.index("-i"), "不满足规格时重新编码（输入端seek）"
+    assert cmd[cmd.index("-vf") + 1].startswith("scale=480:-2")
+    assert cmd[cmd.index("-c:v") + 1] == "libx264" and cmd[cmd.index("-crf") + 1] == "28"
+    assert cmd[cmd.index("-pix_fmt") + 1] == "yuv420p" and cmd[cmd.index("-ss") + 1] == "20.0"
+
+    processor.wrapper.probe = lambda path: {"codec": {"name": "h264", "pix_fmt": "yuv420p", "width": 1280}}
+    commands.clear()
+    processor.extract_wechat_clip("test.mp4", 20.0, 10.0, output_path=output)
+    assert len(commands) == 1 and "copy" not in commands[0], "宽度超过480时重新编码"
+
+    processor.wrapper.probe = lambda path: {"codec": {"name": "h264", "pix_fmt": "yuv420p", "width": 480}}
+    commands.clear()
+    processor.extract_wechat_clip("test.mp4", 20.0, 10.0, output_path=output)
+    assert len(commands) == 1 and "copy" in commands[0], "源已满足规格且起点为关键帧时流复制"
+
+    commands.clear()
+    processor.extract_wechat_clip("test.mp4", 13.0, 10.0, output_path=output)
+    assert len(commands) == 3 and commands[2][:3] == ["ffmpeg", "-f", "concat"], "起点不是关键帧时智能剪辑"
+
+    commands.clear()
+    processor.extract_wechat_clip("test.mp4", 13.0, 5.0, output_path=output)
+    assert len(commands) == 1 and "-vf" in commands[0], "不跨关键帧时按规格重新编码"
+    logger.success("✓ 微信片段规格正确")
+
+    return True
+
+
+def test_window_merge(tmp_path):
+    """测试重叠GIF窗口合并解码"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试16: 重叠窗口合并")
+    logger.info("=" * 70)
+
+    wrapper = FFmpegWrapper()
+
+    logger.info("\n16.1 测试窗口分组...")
+    windows = [(40.0, 10.0), (10.0, 10.0), (13.0, 10.0), (23.0, 10.0), (60.0, 10.0)]
+    assert wrapper.merge_windows(windows) == [[1, 2, 3], [0], [4]]
+    assert wrapper.merge_windows(windows, max_gap=7.0) == [[1, 2, 3, 0], [4]]
+    assert wrapper.merge_windows(windows, max_size=2) == [[1, 2], [3], [0], [4]]
+    logger.success("✓ 重叠窗口分组正确")
+
+    logger.info("\n16.2 测试合并命令...")
+    cmd = wrapper.window_gif_command("test.mp4", 10.0, 13.0, [(0.0, 10.0), (3.0, 10.0)], ["a.gif", "b.gif"])
+    assert cmd.count("-i") == 1 and cmd[cmd.index("-t") + 1] == "13.0"
+    filter_complex = cmd[cmd.index("-filter_complex") + 1]
+    assert filter_complex.startswith("[0:v]split=2[v0][v1];")
+    assert "[v1]trim=start=3.000:duration=10.000,setpts=PTS-STARTPTS,fps=10" in filter_complex
+    assert [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-map"] == ["[o0]", "[o1]"]
+    logger.success("✓ 合并命令结构正确")
+
+    logger.info("\n16.3 测试批量GIF合并与节省统计...")
+    processor = MediaProcessor()
+    processor.cache = None
+    processor.wrapper.keyframe_index = lambda path, probe=True: None
+    commands = []
+
+    def fake_run(cmd, check=True, **kwargs):
+        commands.append(cmd)
+        for i, arg in enumerate(cmd):
+            if arg == "-y":
+                Path(cmd[i + 1]).write_bytes(b"GIF89a")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    processor.wrapper.run_command = fake_run
+    paths = processor.batch_process_gifs("test.mp4", [(10.0, 10.0), (13.0, 10.0), (40.0, 10.0)], str(tmp_path))
+    assert len(paths) == 3 and all(Path(path).exists() for path in paths)
+    assert len(commands) == 2, "重叠的两个GIF共用一次解码"
+    assert processor.window_stats == {"requested_seconds": 30.0, "decoded_seconds": 23.0}
+    assert processor.saved_decode_seconds == 7.0
+    logger.success("✓ 节省解码7.0秒")
+
+    logger.info("\n16.4 测试残留文件不算作输出...")
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\x00" * 1024)
+    processor.cache = MediaArtifactCache(cache_dir=str(tmp_path / "cache"))
+    clips = [(10.0, 10.0), (13.0, 10.0)]
+    outputs = [str(tmp_path / "stale_a.gif"), str(tmp_path / "stale_b.gif")]
+    for output in outputs:
+        Path(output).write_bytes(b"stale")
+
+    def partial_run(cmd, check=True, **kwargs):
+        # 只写出第一个GIF，第二个窗口没有产出
+        Path(cmd[cmd.index("-y") + 1]).write_bytes(b"GIF89a")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    processor.wrapper.run_command = partial_run
+    done = processor._generate_gifs_merged(str(video), clips, outputs, 480, 10, None, 0.0)
+    assert done == {0}, "上次运行残留的文件不应视为成功"
+    assert not Path(outputs[1]).exists()
+    stale_key = processor._gif_cache_key(str(video), 13.0, 10.0, 480, 10, True, True, None, 256)
+    assert not processor.cache.fetch(stale_key, str(tmp_path / "check.gif")), "残留文件不应写入缓存"
+    logger.success("✓ 运行前清除目标路径")
+
+    return True
+
+
+def test_subprocess_runner(tmp_path):
+    """测试受管子进程：超时、取消、进程组清理与stderr尾部"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试17: 受管子进程")
+    logger.info("=" * 70)
+
+    runner = SubprocessRunner(poll_interval=0.05)
+    python = sys.executable
+
+    logger.info("\n17.1 测试输出与stderr尾部...")
+    result = runner.run([python, "-c", "import sys; print('ok'); sys.stderr.write('x' * 10000 + 'END')"])
+    assert result.stdout.strip() == "ok"
+    assert len(result.stderr) == 4000 and result.stderr.endswith("END")
+    try:
+        runner.run([python, "-c", "import sys; sys.exit(3)"])
+        assert False, "应抛出CalledProcessError"
+    except subprocess.CalledProcessError as e:
+        assert e.returncode == 3
+    assert runner.run([python, "-c", "import sys; sys.exit(3)"], check=False).returncode == 3
+    logger.success("✓ 输出与返回码正确")
+
+    logger.info("\n17.2 测试超时终止整个进程组...")
+    pid_file = tmp_path / "child.pid"
+    script = (
+        "import subprocess, sys, time; "
+        f"child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+        f"open({str(pid_file)!r}, 'w').write(str(child.pid)); time.sleep(30)"
+    )
+    start = time.perf_counter()
+    try:
+        runner.run([python, "-c", script], timeout=1.0)
+        assert False, "应抛出TimeoutExpired"
+    except subprocess.TimeoutExpired:
+        pass
+    assert time.perf_counter() - start < 5
+    child_pid = int(pid_file.read_text())
+    time.sleep(0.2)
+    if os.name != "nt":
+        # 孙进程被init接管后可能短暂处于僵尸状态
+        stat = Path(f"/proc/{child_pid}/stat")
+        assert not stat.exists() or stat.read_text().split()[2] == "Z", "孙进程应随进程组一起终止"
+    logger.success("✓ 超时后进程组已终止")
+
+    logger.info("\n17.3 测试任务截止时间与取消...")
+    with job_scope(timeout=0.5):
+        try:
+            runner.run([python, "-c", "import time; time.sleep(30)"], timeout=60)
+            assert False, "任务截止时间应优先于命令时限"
+        except subprocess.TimeoutExpired:
+            pass
+
+    token = CancelToken()
+    threading.Timer(0.3, token.cancel).start()
+    try:
+        runner.run([python, "-c", "import time; time.sleep(30)"], cancel=token)
+        assert False, "应抛出SubprocessCancelled"
+    except SubprocessCancelled:
+        pass
+
+    executor = MediaJobExecutor(max_workers=1, cpu_budget=1)
+    results = executor.run([MediaJob(kind="noop", func=lambda: "done")], cancel=token)
+    assert results[0].error == "已取消"
+    logger.success("✓ 截止时间与取消生效")
+
+    if os.name != "nt":
+        logger.info("\n17.4 测试父进程收到信号时终止运行中的子进程...")
+        import signal
+        for signum in (signal.SIGTERM, signal.SIGKILL):
+            pid_dir = tmp_path / f"signal_{signum}"
+            pid_dir.mkdir()
+            elapsed, child_pids = run_signalled_jobs(pid_dir, signum)
+            assert elapsed < 3, f"{signal.Signals(signum).name}后父进程应立即退出"
+            assert len(child_pids) == 2, "未开始的任务不应再启动"
+            time.sleep(0.3)
+            for child_pid in child_pids:
+                stat = Path(f"/proc/{child_pid}/stat")
+                assert not stat.exists() or stat.read_text().split()[2] == "Z", \
+                    f"{signal.Signals(signum).name}后子进程应已终止"
+        logger.success("✓ SIGTERM/SIGKILL后运行中的子进程均已终止")
+
+    return True
+
+
+def run_signalled_jobs(pid_dir: Path, signum: int) -> tuple:
+    """
+    在子Python进程中用2并发执行4个长时子进程任务，待2个开始后向其发送信号
+
+    Args:
+        pid_dir: 任务子进程写入自身pid的目录
+        signum: 发送给父进程的信号
+
+    Returns:
+        (发送信号到父进程退出的耗时, 已启动的任务子进程pid列表)
+    """
+    root = Path(__file__).resolve().parents[2]
+    child = f"import os, time; open(os.path.join({str(pid_dir)!r}, str(os.getpid())), 'w').close(); time.sleep(4)"
+    script = (
+        "import signal, sys\n"
+        f"sys.path.insert(0, {str(root)!r})\n"
+        "signal.signal(signal.SIGINT, signal.default_int_handler)\n"
+        "from src.media_processor import MediaJob, MediaJobExecutor\n"
+        "from src.media_processor.subprocess_runner import runner\n"
+        f"cmd = [sys.executable, '-c', {child!r}]\n"
+        "jobs = [MediaJob(kind='sleep', func=runner.run, kwargs={'cmd': cmd}) for _ in range(4)]\n"
+        "MediaJobExecutor(max_workers=2, cpu_budget=2).run(jobs)\n"
+    )
+    parent = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 15
+        while len(list(pid_dir.iterdir())) < 2:
+            assert time.monotonic() < deadline, "任务子进程未启动"
+            assert parent.poll() is None, "父进程提前退出"
+            time.sleep(0.05)
+
+        start = time.perf_counter()
+        parent.send_signal(signum)
+        parent.wait(timeout=15)
+        elapsed = time.perf_counter() - start
+    finally:
+        if parent.poll() is None:
+            parent.kill()
+    return elapsed, [int(path.name) for path in pid_dir.iterdir()]
+
+
+def test_progress_telemetry():
+    """测试FFmpeg进度解析与汇总"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试18: 进度遥测")
+    logger.info("=" * 70)
+
+    logger.info("\n18.1 测试 -progress 输出解析...")
+    parser = FFmpegProgressParser()
+    block = [
+        "frame=120", "fps=59.87", "stream_0_0_q=-0.0", "out_time_us=4000000",
+        "out_time=00:00:04.000000", "speed=1.99x", "progress=continue"
+    ]
+    snapshots = [parser.feed(line + "\n") for line in block]
+    assert snapshots[:-1] == [None] * (len(block) - 1)
+    assert snapshots[-1] == {"frame": 120, "fps": 59.87, "speed": 1.99, "out_time": 4.0, "progress": "continue"}
+    snapshot = [parser.feed(line) for line in ("frame=0", "fps=N/A", "out_time_us=N/A", "speed=N/A", "progress=end")][-1]
+    assert snapshot == {"frame": 0, "fps": 0.0, "speed": 0.0, "out_time": 0.0, "progress": "end"}
+    assert parse_out_time("01:02:03.500000") == 3723.5 and parse_out_time("N/A") is None
+    logger.success("✓ 进度快照解析正确")
+
+    logger.info("\n18.2 测试批量汇总...")
+    received = []
+    tracker = ProgressTracker(callback=lambda label, snap: received.append(label), log_interval=None)
+    a, b = tracker.start("a.gif"), tracker.start("b.gif")
+    tracker.update(a, {"frame": 50, "fps": 20.0, "speed": 2.0, "out_time": 5.0})
+    tracker.update(b, {"frame": 30, "fps": 10.0, "speed": 1.0, "out_time": 3.0})
+    tracker.finish(a)
+    stats = tracker.summary()
+    assert (stats["jobs"], stats["running"], stats["finished"]) == (2, 1, 1)
+    assert stats["frames"] == 80 and stats["out_time"] == 8.0
+    assert stats["fps"] == 10.0 and stats["speed"] == 1.0, "实时吞吐只计运行中任务"
+    assert received == ["a.gif", "b.gif"]
+    assert "1/2 完成" in tracker.readout()
+    logger.success("✓ 汇总正确")
+
+    logger.info("\n18.3 测试运行期间逐行回调...")
+    lines = []
+    runner = SubprocessRunner(poll_interval=0.05)
+    result = runner.run(
+        [sys.executable, "-c", "import sys; print('frame=1'); print('progress=end'); sys.stderr.write('log')"],
+        on_stdout_line=lines.append
+    )
+    assert [line.strip() for line in lines] == ["frame=1", "progress=end"]
+    assert result.stdout == "" and result.stderr == "log"
+    logger.success("✓ 逐行回调正确")
+
+    return True
+
+
+def test_resource_ledger(tmp_path):
+    """测试子进程资源记录"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试19: 子进程资源记录")
+    logger.info("=" * 70)
+
+    runner = SubprocessRunner(poll_interval=0.05)
+    runner.ledger = ResourceLedger(str(tmp_path / "resources" / "run.jsonl"))
+
+    logger.info("\n19.1 测试单条记录...")
+    busy = "import time; data = bytearray(64 * 1024 * 1024); end = time.process_time() + 0.3\nwhile time.process_time() < end: pass"
+    runner.run([sys.executable, "-c", busy], operation="gif")
+    runner.run([sys.executable, "-c", "import sys; sys.exit(1)"], check=False, operation="probe")
+    records = [json.loads(line) for line in runner.ledger.path.read_text(encoding="utf-8").splitlines()]
+    assert [record["operation"] for record in records] == ["gif", "probe"]
+    assert records[1]["status"] == "failed" and records[1]["returncode"] == 1
+    if os.name != "nt":
+        assert records[0]["user_cpu"] + records[0]["sys_cpu"] >= 0.25, "应记录子进程CPU时间"
+        assert records[0]["peak_rss_mb"] >= 64, "应记录子进程峰值内存"
+    assert records[0]["wall_time"] >= 0.3
+    logger.success("✓ 记录耗时、CPU与峰值内存")
+
+    logger.info("\n19.2 测试汇总表...")
+    summary = runner.ledger.summary()
+    assert summary["gif"]["count"] == 1 and summary["probe"]["failed"] == 1
+    table = runner.ledger.summary_table()
+    assert table.splitlines()[2].startswith("gif") and table.splitlines()[-1].startswith("合计")
+    logger.success("✓ 汇总正确")
+
+    return True
+
+
+def test_async_runner(tmp_path):
+    """测试asyncio子进程执行与异步媒体接口"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试20: asyncio子进程")
+    logger.info("=" * 70)
+
+    runner = SubprocessRunner()
+    python = sys.executable
+    sleep = [python, "-c", "import time; time.sleep(0.3)"]
+
+    logger.info("\n20.1 测试输出、返回码与超时...")
+
+    async def basics():
+        result = await runner.run_async([python, "-c", "import sys; print('ok'); sys.stderr.write('err')"])
+        assert result.stdout.strip() == "ok" and result.stderr == "err"
+        try:
+            await runner.run_async([python, "-c", "import sys; sys.exit(2)"])
+            assert False, "应抛出CalledProcessError"
+        except subprocess.CalledProcessError as e:
+            assert e.returncode == 2
+        try:
+            await runner.run_async([python, "-c", "import time; time.sleep(30)"], timeout=0.3)
+            assert False, "应抛出TimeoutExpired"
+        except subprocess.TimeoutExpired:
+            pass
+
+    start = time.perf_counter()
+    asyncio.run(basics())
+    assert time.perf_counter() - start < 5
+    logger.success("✓ 输出、返回码与超时正确")
+
+    logger.info("\n20.2 测试信号量并发上限与取消...")
+
+    async def limited():
+        semaphore = asyncio.Semaphore(2)
+        start = time.perf_counter()
+        await asyncio.gather(*(runner.run_async(sleep, semaphore=semaphore) for _ in range(4)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(limited()) >= 0.6, "4个任务2并发应分两轮"
+
+    async def cancelled():
+        task = asyncio.ensure_future(runner.run_async([python, "-c", "import time; time.sleep(30)"]))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        try:
+            await task
+            assert False, "应被取消"
+        except asyncio.CancelledError:
+            pass
+        assert not runner._active, "取消后子进程应已终止"
+
+    asyncio.run(cancelled())
+
+    async def token_cancelled():
+        token = CancelToken()
+        with job_scope(cancel=token):
+            task = asyncio.ensure_future(runner.run_async([python, "-c", "import time; time.sleep(30)"]))
+        await asyncio.sleep(0.3)
+        token.cancel()
+        try:
+            await task
+            assert False, "应抛出SubprocessCancelled"
+        except SubprocessCancelled:
+            pass
+        assert not runner._active, "令牌取消后子进程应已终止"
+
+    start = time.perf_counter()
+    asyncio.run(token_cancelled())
+    assert time.perf_counter() - start < 5, "运行中的子进程应及时响应取消令牌"
+    logger.success("✓ 并发上限与取消正确")
+
+    logger.info("\n20.3 测试异步截图/GIF...")
+    processor = MediaProcessor(max_workers=2, cpu_budget=2)
+    processor.cache = None
+    processor.wrapper.keyframe_index = lambda path, probe=True: None
+    running = {"now": 0, "max": 0}
+
+    async def fake_run_async(cmd, check=True, operation="ffmpeg", threads=None, semaphore=None):
+        async with semaphore:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.05)
+            Path(cmd[-1]).write_bytes(b"\x00")
+            running["now"] -= 1
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    processor.wrapper.run_command_async = fake_run_async
+
+    async def media():
+        shots = [
+            processor.extract_screenshot_async("test.mp4", t, output_path=str(tmp_path / f"{t}.jpg"))
+            for t in range(6)
+        ]
+        gif = processor.generate_gif_async("test.mp4", 10.0, 5.0, output_path=str(tmp_path / "a.gif"))
+        return await asyncio.gather(*shots, gif)
+
+    paths = asyncio.run(media())
+    assert len(paths) == 7 and all(Path(path).exists() for path in paths)
+    assert running["max"] == 2, "并发数应受max_workers限制"
+    logger.success("✓ 异步媒体接口正确")
+
+    return True
+
+
+def test_watermark_overlay(tmp_path):
+    """测试预渲染水印叠加层"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试21: 预渲染水印叠加层")
+    logger.info("=" * 70)
+
+    import numpy as np
+    from PIL import Image, ImageFont
+
+    watermark = WatermarkSpec(text="FreeSoloDirtbike", opacity=0.5)
+    # 测试字体：Pillow内置的TrueType字体写成文件（与系统字体无关）
+    font_path = tmp_path / "test_font.ttf"
+    font_path.write_bytes(ImageFont.load_default(size=16).font_bytes)
+
+    logger.info("\n21.1 测试按参数缓存与宽度适配...")
+    overlays = WatermarkOverlayCache(cache_dir=str(tmp_path / "overlays"), font_path=str(font_path))
+    path = overlays.path(watermark, 480)
+    assert Path(path).exists() and overlays.path(watermark, 480) == path
+    assert overlays.image(watermark, 480) is overlays.image(watermark, 480)
+    assert overlays.renders == 1
+    position_only = WatermarkSpec(text="FreeSoloDirtbike", opacity=0.5, position="top-right")
+    assert overlays.key(position_only, 480) == overlays.key(watermark, 480)
+    assert overlays.key(watermark, 320) != overlays.key(watermark, 480)
+
+    image = overlays.image(watermark, 480)
+    assert image.mode == "RGBA"
+    assert max(image.getchannel("A").getdata()) == round(255 * 0.5)
+    assert overlays.image(watermark, 80).width <= 80 - 2 * 10, "文字超宽时应缩小字号"
+    logger.success("✓ 叠加层只渲染一次，超宽时缩小")
+
+    logger.info("\n21.2 测试进程内alpha混合...")
+    frame = Image.new("RGB", (200, 100), (0, 0, 0))
+    blended = overlays.blend(frame, watermark)
+    changed = np.argwhere(np.asarray(blended).sum(axis=2) > 0)
+    assert changed.size and changed[:, 1].min() >= 10 and changed[:, 0].max() < 90
+    assert np.asarray(frame).sum() == 0, "不应修改输入图像"
+    right = np.argwhere(np.asarray(overlays.blend(frame, position_only)).sum(axis=2) > 0)
+    assert right[:, 1].max() < 190 and right[:, 0].min() >= 10
+    logger.success("✓ 混合位置正确")
+
+    logger.info("\n21.3 测试overlay命令...")
+    wrapper = FFmpegWrapper()
+    cmd = wrapper.watermark_command("in.gif", "out.gif", "FreeSoloDirtbike", overlay_path="wm.png")
+    assert cmd[cmd.index("-filter_complex") + 1] == "[0:v][1:v]overlay=x=10:y=H-h-10:format=auto[o0]"
+    cmd = wrapper.batch_watermark_command(["a.gif", "b.jpg"], ["a_wm.gif", "b_wm.jpg"], "wm.png", "bottom-right")
+    filter_complex = cmd[cmd.index("-filter_complex") + 1]
+    assert filter_complex.startswith("[2:v]split=2[w0][w1];")
+    assert "[1:v][w1]overlay=x=W-w-10:y=H-h-10" in filter_complex
+    assert cmd[-3:] == ["[o1]", "-y", "b_wm.jpg"]
+    logger.success("✓ overlay命令正确")
+
+    logger.info("\n21.4 测试批量水印（按宽度分组，一组一个进程）...")
+    for name, size in [("a.gif", (64, 48)), ("b.gif", (64, 48)), ("c.gif", (96, 48))]:
+        Image.new("RGB", size, (0, 0, 0)).save(tmp_path / name)
+    processor = MediaProcessor(max_workers=1)
+    processor.overlays = overlays
+    commands = []
+
+    def fake_run(cmd, check=True, **kwargs):
+        commands.append(cmd)
+        for index in [i + 1 for i, arg in enumerate(cmd) if arg == "-map"]:
+            Path(cmd[index + 2]).write_bytes(b"\x00")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    processor.wrapper.run_command = fake_run
+    media = [str(tmp_path / name) for name in ("a.gif", "b.gif", "c.gif")]
+    outputs = processor.batch_add_watermarks(media, output_dir=str(tmp_path / "out"))
+    assert [Path(path).name for path in outputs] == ["a_wm.gif", "b_wm.gif", "c_wm.gif"]
+    assert len(commands) == 2 and commands[0].count("-map") == 2
+    logger.success("✓ 批量水印分组正确")
+
+    logger.info("\n21.5 测试drawtext与叠加层使用同一字体...")
+    from config import settings
+    configured = settings.watermark_font
+    settings.watermark_font = str(font_path)
+    try:
+        assert resolve_watermark_font() == str(font_path)
+        assert f"fontfile='{font_path}'" in wrapper.drawtext_filter(watermark)
+        assert WatermarkOverlayCache(cache_dir=str(tmp_path / "overlays")).font_path == str(font_path)
+    finally:
+        settings.watermark_font = configured
+    logger.success("✓ 两条路径字体一致")
+
+    return True
+
+
+def test_jpeg_budget(tmp_path):
+    """测试按字节预算编码截图"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试22: JPEG字节预算")
+    logger.info("=" * 70)
+
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8)
+    image = Image.fromarray(frame)
+
+    logger.info("\n22.1 测试二分查找质量...")
+    budget = len(encode_jpeg(image, 60)) + 100
+    plan = fit_jpeg_to_budget(image, max_bytes=budget)
+    assert plan["fits"] and len(plan["data"]) <= budget
+    assert len(encode_jpeg(image, plan["quality"] + 1)) > budget, "应选择预算内的最高质量"
+    assert plan["encodes"] <= 8
+    assert fit_jpeg_to_budget(image, max_bytes=10 ** 7)["quality"] == 95
+    assert fit_jpeg_to_budget(image, max_bytes=10 ** 7, max_quality=80)["encodes"] == 1
+    small = fit_jpeg_to_budget(image, max_bytes=len(encode_jpeg(image, MIN_JPEG_QUALITY)) // 2)
+    assert small["fits"] and small["width"] < 320, "质量下限仍超出时应缩小尺寸"
+    logger.success(f"✓ 预算 {budget} 字节选定质量 {plan['quality']}")
+
+    logger.info("\n22.2 测试截图只解码一次、只写最终文件...")
+    wrapper = FFmpegWrapper()
+    cmd = wrapper.frame_command("test.mp4", 12.5)
+    assert cmd[-5:] == ["-f", "image2pipe", "-c:v", "ppm", "-"]
+    assert cmd[cmd.index("-ss") + 1] == "12.5" and cmd.index("-ss") < cmd.index("-i")
+
+    processor = MediaProcessor()
+    processor.cache = None
+    processor.wrapper.keyframe_index = lambda path, probe=True: None
+    reads = []
+    processor.wrapper.read_frame = lambda path, timestamp, keyframe_only=False: reads.append(timestamp) or frame
+    processor.wrapper.run_command = lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("不应调用FFmpeg编码"))
+
+    output_path = str(tmp_path / "shot.jpg")
+    processor.extract_screenshot("test.mp4", 12.5, output_path=output_path, max_bytes=budget)
+    assert reads == [12.5]
+    assert Path(output_path).stat().st_size <= budget
+    assert list(tmp_path.iterdir()) == [Path(output_path)]
+    record = processor.screenshot_budgets[-1]
+    assert record["quality"] == plan["quality"] and record["output_path"] == output_path
+    logger.success(f"✓ 截图质量 {record['quality']}，{record['bytes']} 字节")
+
+    return True
+
+
+def test_contact_sheet(tmp_path):
+    """测试联系表与帧索引"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试23: 联系表与帧索引")
+    logger.info("=" * 70)
+
+    # 60秒、每秒2帧的无损视频，第n帧的灰度为2n（时间 = 灰度 / 4）
+    video = tmp_path / "lum.mkv"
+    subprocess.run([
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", "nullsrc=size=32x32:rate=2,format=rgb24,geq=r='2*N':g='2*N':b='2*N'",
+        "-t", "60", "-c:v", "ffv1", "-y", str(video)
+    ], check=True)
+
+    logger.info("\n23.1 测试解析帧时间...")
+    text = "frame:0    pts:0       pts_time:0\nsheet=1\nframe:1    pts:153600  pts_time:10.5\nsheet=1\n"
+    assert parse_frame_times(text) == [0.0, 10.5]
+    logger.success("✓ 帧时间解析正确")
+
+    logger.info("\n23.2 测试一次解码生成联系表...")
+    processor = MediaProcessor()
+    index = processor.build_contact_sheet(str(video), interval=10, tile_width=32, columns=4, rows=1)
+    assert index.times == [0.0, 10.0, 20.0, 30.0, 40.0, 50.0]
+    assert index.data["sheets"] == ["sheet_001.jpg", "sheet_002.jpg"]
+    assert index.nearest(14)["time"] == 10.0 and index.nearest(16)["time"] == 20.0
+    assert index.nearest(41) == {"time": 40.0, "sheet": 1, "x": 0, "y": 0}
+    for timestamp in (0, 14, 16, 41, 58):
+        crop = index.crop(timestamp)
+        assert crop.size == (32, 32)
+        assert abs(crop.getpixel((16, 16))[0] / 4 - index.nearest(timestamp)["time"]) <= 1, "应为区间起点处的帧"
+    assert (sheet_dir(str(video)) / "index.json").exists()
+    logger.success("✓ 联系表与索引正确")
+
+    logger.info("\n23.3 测试复用与裁剪预览...")
+    reused = MediaProcessor()
+    reused.wrapper.run_command = lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("不应重新解码"))
+    index = reused.build_contact_sheet(str(video), interval=10, tile_width=32, columns=4, rows=1)
+    assert len(index.times) == 6
+    preview = reused.preview_frame(str(video), 33.0, output_path=str(tmp_path / "preview.jpg"))
+    assert Path(preview).exists()
+    try:
+        reused.preview_frame(str(video), 75.0)
+        assert False, "超出视频范围应报错"
+    except Exception as e:
+        assert "超出视频范围" in str(e)
+    logger.success("✓ 联系表复用，预览只需裁剪")
+
+    return True
+
+
+def test_scene_index(tmp_path):
+    """测试镜头切换索引与吸附"""
+    logger.info("\n" + "=" * 70)
+    logger.info("测试24: 镜头切换索引与吸附")
+    logger.info("=" * 70)
+
+    # 三个2秒纯色镜头（亮度不同，场景分数只看亮度），切点在2秒和4秒
+    video = tmp_path / "cuts.mp4"
+    subprocess.run([
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", "color=c=black:size=64x64:rate=25:duration=2",
+        "-f", "lavfi", "-i", "color=c=white:size=64x64:rate=25:duration=2",
+        "-f", "lavfi", "-i", "color=c=gray:size=64x64:rate=25:duration=2",
+        "-filter_complex", "[0:v][1:v][2:v]concat=n=3:v=1:a=0",
+        "-pix_fmt", "yuv420p", "-y", str(video)
+    ], check=True)
+
+    logger.info("\n24.1 测试解析切点...")
+    text = "frame:1    pts:4000    pts_time:4\nlavfi.scene_score=0.8\nframe:0    pts:2000    pts_time:2\nlavfi.scene_score=0.5\n"
+    assert parse_scene_cuts(text) == [(2.0, 0.5), (4.0, 0.8)]
+    logger.success("✓ 切点解析正确")
+
+    logger.info("\n24.2 测试一次解码检测切点...")
+    processor = MediaProcessor()
+    index = processor.scene_index(str(video))
+    assert [round(cut, 2) for cut in index.cuts] == [2.0, 4.0], index.cuts
+    assert scene_sidecar(str(video)).exists()
+    assert processor.snap_to_scene(str(video), 2.6) == index.cuts[0]
+    assert processor.snap_to_scene(str(video), 3.1, tolerance=0.5) == 3.1, "容差外不吸附"
+    logger.success("✓ 切点检测与吸附正确")
+
+    logger.info("\n24.3 测试持久化复用...")
+    reused = MediaProcessor()
+    reused.wrapper.run_command = lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("不应重新解码"))
+    assert reused.scene_index(str(video)).cuts == index.cuts
+    logger.success("✓ 索引从视频旁的文件读取")
+
+    return True
+
+
 def test_command_execution():
     """测试FFmpeg命令执行"""
     logger.info("\n" + "=" * 70)
@@ -298,6 +1544,9 @@ def test_command_execution():
 
 
 if __name__ == "__main__":
+    import inspect
+    import tempfile
+
     logger.info("=" * 70)
     logger.info("MotoStep - 媒体处理模块测试套件")
     logger.info("=" * 70)
@@ -307,13 +1556,38 @@ if __name__ == "__main__":
         ("FFmpegWrapper", test_ffmpeg_wrapper),
         ("MediaProcessor", test_media_processor),
         ("批量处理", test_batch_processing),
+        ("单次解码多截图", test_multi_screenshot_command),
+        ("合并调色板GIF", test_fused_palette_gif_command),
+        ("水印合并编码", test_fused_watermark_commands),
+        ("并行任务执行器", test_job_executor),
+        ("媒体产物缓存", test_artifact_cache),
+        ("视频元数据缓存", test_probe_cache),
+        ("关键帧索引", test_keyframe_index),
+        ("PyAV进程内解码后端", test_pyav_backend),
+        ("GIF字节预算", test_gif_budget),
+        ("多规格输出", test_rendition_command),
+        ("片段提取", test_clip_extraction),
+        ("重叠窗口合并", test_window_merge),
+        ("受管子进程", test_subprocess_runner),
+        ("进度遥测", test_progress_telemetry),
+        ("子进程资源记录", test_resource_ledger),
+        ("asyncio子进程", test_async_runner),
+        ("预渲染水印叠加层", test_watermark_overlay),
+        ("JPEG字节预算", test_jpeg_budget),
+        ("联系表与帧索引", test_contact_sheet),
+        ("镜头切换索引与吸附", test_scene_index),
         ("命令执行", test_command_execution),
     ]
 
     results = []
     for name, test_func in tests:
         try:
-            result = test_func()
+            # 带tmp_path参数的测试在独立的临时目录中运行（与pytest一致）
+            if "tmp_path" in inspect.signature(test_func).parameters:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    result = test_func(Path(tmp_dir))
+            else:
+                result = test_func()
             results.append((name, result))
         except Exception as e:
             logger.error(f"\n测试异常: {name} - {e}")